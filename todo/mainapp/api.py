@@ -0,0 +1,192 @@
+"""JSON API for tasks.
+
+Reads are ``.values()`` projections, never model instances. Every list
+response carries an ETag built from the id of the user's newest change feed
+entry, which every task write moves on, so a client polling with
+If-None-Match gets a 304 after one indexed lookup as long as nothing
+changed, whichever worker process answers.
+"""
+import json
+from functools import wraps
+
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views.decorators.http import require_http_methods
+
+from django.db.models import Max, Min
+
+from .models import CalendarEvent, ChangeLogEntry, Tasks
+from .page_cache import data_version
+from .sharding import current_db, shard_floor
+from .views import apply_reorder, keyset_page
+
+TASK_FIELDS = ('id', 'task', 'completed', 'created_at', 'completed_at', 'order_field')
+EVENT_FIELDS = ('id', 'title', 'description', 'start_date', 'start_time', 'end_date', 'end_time',
+                'priority', 'all_day', 'rrule', 'exdates', 'updated_at')
+CHANGES_PAGE_SIZE = 500
+
+
+def api_login_required(view):
+    """Like login_required, but answers 401 instead of redirecting"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'success': False, 'error': 'Authentication required'}, status=401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def task_json(user, pk):
+    return Tasks.objects.filter(user=user, id=pk).values(*TASK_FIELDS).first()
+
+
+def get_task(request, pk):
+    return Tasks.objects.filter(user=request.user, id=pk).first()
+
+
+def not_found():
+    return JsonResponse({'success': False, 'error': 'Task not found'}, status=404)
+
+
+@api_login_required
+@require_http_methods(['GET', 'POST'])
+def tasks(request):
+    """GET lists pending (or ``?list=completed``) tasks; POST creates one"""
+    if request.method == 'POST':
+        try:
+            text = json.loads(request.body).get('task', '').strip()
+        except (ValueError, AttributeError):
+            text = ''
+        if not text:
+            return JsonResponse({'success': False, 'error': 'Task text is required'}, status=400)
+        task = Tasks.add(request.user, text)
+        return JsonResponse({'success': True, 'task': task_json(request.user, task.id)}, status=201)
+
+    task_list = request.GET.get('list', 'pending')
+    if task_list not in ('pending', 'completed'):
+        return JsonResponse({'success': False, 'error': 'list must be pending or completed'}, status=400)
+    cursor = request.GET.get('cursor', '')
+
+    etag = f'"tasks-{task_list}-{cursor}-{data_version(request.user.pk)}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        if task_list == 'pending':
+            items = list(Tasks.objects.filter(user=request.user, completed=False)
+                         .order_by('order_field').values(*TASK_FIELDS))
+            next_cursor = None
+        else:
+            try:
+                items, next_cursor = keyset_page(
+                    Tasks.objects.filter(user=request.user, completed=True), cursor, TASK_FIELDS)
+            except ValueError:
+                return JsonResponse({'success': False, 'error': 'Invalid cursor'}, status=400)
+        response = JsonResponse({'success': True, 'tasks': items, 'next_cursor': next_cursor})
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@api_login_required
+@require_http_methods(['GET', 'DELETE'])
+def task_detail(request, pk):
+    task = get_task(request, pk)
+    if task is None:
+        return not_found()
+    if request.method == 'DELETE':
+        task.remove()
+        return JsonResponse({'success': True})
+    return JsonResponse({'success': True, 'task': task_json(request.user, pk)})
+
+
+@api_login_required
+@require_http_methods(['POST'])
+def complete_task(request, pk):
+    task = get_task(request, pk)
+    if task is None:
+        return not_found()
+    task.mark_done()
+    return JsonResponse({'success': True, 'task': task_json(request.user, pk)})
+
+
+@api_login_required
+@require_http_methods(['POST'])
+def undo_task(request, pk):
+    task = get_task(request, pk)
+    if task is None:
+        return not_found()
+    task.mark_pending()
+    return JsonResponse({'success': True, 'task': task_json(request.user, pk)})
+
+
+@api_login_required
+@require_http_methods(['POST'])
+def reorder_tasks(request):
+    """Same payloads as the todo page's reorder endpoint: task_order or moves"""
+    try:
+        updated = apply_reorder(request.user, json.loads(request.body))
+    except Tasks.DoesNotExist as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=404)
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return JsonResponse({'success': False, 'error': 'Invalid reorder payload'}, status=400)
+    return JsonResponse({'success': True, 'updated': updated})
+
+
+@api_login_required
+@require_http_methods(['GET'])
+def changes(request):
+    """Task and event changes after the ``since`` cursor.
+
+    Each object appears once with its current data, or as a tombstone if it
+    was deleted. ``reset`` means the client must reload everything through
+    the list endpoints and continue from the returned cursor: either it had
+    no cursor yet, or entries it never saw were compacted away.
+    """
+    try:
+        since = int(request.GET['since']) if 'since' in request.GET else None
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid cursor'}, status=400)
+
+    # Entry ids are never reused, so a gap below the oldest retained entry
+    # means compaction removed something this client has not seen. A cursor
+    # past the newest entry was handed out by a shard the user has since
+    # been moved off (see sharding.py). An empty feed's cursor is the
+    # shard's id floor, below whatever id it hands out first.
+    # (Separate queries: SQLite only answers a lone MIN or MAX from the index.)
+    oldest = ChangeLogEntry.objects.aggregate(oldest=Min('id'))['oldest']
+    latest = ChangeLogEntry.objects.aggregate(latest=Max('id'))['latest'] or shard_floor(current_db())
+    if since is None or (oldest is not None and since < oldest - 1) or since > latest:
+        return JsonResponse({'success': True, 'reset': True, 'cursor': latest,
+                             'has_more': False, 'changes': []})
+
+    entries = list(ChangeLogEntry.objects.filter(user=request.user, id__gt=since)
+                   .values_list('id', 'kind', 'object_id', 'deleted')[:CHANGES_PAGE_SIZE + 1])
+    has_more = len(entries) > CHANGES_PAGE_SIZE
+    entries = entries[:CHANGES_PAGE_SIZE]
+
+    # Only the last change per object matters
+    latest_change = {}
+    for entry_id, kind, object_id, deleted in entries:
+        latest_change.pop((kind, object_id), None)
+        latest_change[(kind, object_id)] = deleted
+
+    current = {'task': {}, 'event': {}}
+    for kind, model, fields in (('task', Tasks, TASK_FIELDS), ('event', CalendarEvent, EVENT_FIELDS)):
+        ids = [object_id for (change_kind, object_id), deleted in latest_change.items()
+               if change_kind == kind and not deleted]
+        if ids:
+            current[kind] = {row['id']: row for row in
+                             model.objects.filter(user=request.user, id__in=ids).values(*fields)}
+
+    results = []
+    for (kind, object_id), deleted in latest_change.items():
+        data = None if deleted else current[kind].get(object_id)
+        results.append({'kind': kind, 'id': object_id, 'deleted': data is None, 'data': data})
+
+    return JsonResponse({
+        'success': True,
+        'reset': False,
+        'cursor': entries[-1][0] if entries else since,
+        'has_more': has_more,
+        'changes': results,
+    })
+
@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class MainappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'mainapp'
+
+    def ready(self):
+        # Hook into database connections before the first one opens
+        from . import db, metrics  # noqa: F401
+        from .sharding import reserve_id_ranges
+        post_migrate.connect(reserve_id_ranges, sender=self)
@@ -0,0 +1,134 @@
+"""Fingerprinted, precompressed static files.
+
+collectstatic with CompressedManifestStaticFilesStorage writes every file
+under a name carrying a hash of its content (app.3f2a9c1b7e4d.css) and
+rewrites the url() references in stylesheets to match. Text files also get
+gzip and, when the brotli package is installed, Brotli copies next to them,
+compressed once at deploy time instead of on every request.
+
+StaticAssetMiddleware serves STATIC_ROOT when DEBUG is off (runserver's
+static view covers development): the smallest variant the client accepts,
+and hashed names cached forever since their content can never change.
+"""
+import gzip
+import os
+import re
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import Http404
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.static import serve
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.html', '.txt', '.json', '.map', '.ttf', '.ico')
+MIN_COMPRESS_SIZE = 512
+
+# The 12 hex digits ManifestStaticFilesStorage puts before the extension
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+ACCEPTS_BR = re.compile(r'\bbr\b')
+ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+
+
+def compress_variants(content):
+    """(suffix, bytes) for each encoding that makes ``content`` smaller"""
+    variants = [('.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(content, quality=11)))
+    return [(suffix, data) for suffix, data in variants if len(data) < len(content)]
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage that also writes .gz and .br copies"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        names = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run=dry_run, **options):
+            if isinstance(hashed_name, str):
+                names.update((name, hashed_name))
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+        for name in sorted(names):
+            if name.endswith(COMPRESSIBLE):
+                self.compress(name)
+
+    def compress(self, name):
+        path = self.path(name)
+        with open(path, 'rb') as f:
+            content = f.read()
+        if len(content) < MIN_COMPRESS_SIZE:
+            return
+        stat = os.stat(path)
+        for suffix, data in compress_variants(content):
+            with open(path + suffix, 'wb') as f:
+                f.write(data)
+            # Same Last-Modified whichever variant a client gets
+            os.utime(path + suffix, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+
+class StaticAssetMiddleware:
+    """Serves collected static files, precompressed when the client allows.
+
+    Goes right after SecurityMiddleware, so static requests skip sessions
+    and authentication. Not used with DEBUG on.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if settings.DEBUG or not settings.STATIC_ROOT:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = settings.STATIC_URL if settings.STATIC_URL.startswith('/') else '/' + settings.STATIC_URL
+        self.root = str(settings.STATIC_ROOT)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.handles(request):
+            return self.get_response(request)
+        return self.serve(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        if not self.handles(request):
+            return await self.get_response(request)
+        return await sync_to_async(self.serve)(request) or await self.get_response(request)
+
+    def handles(self, request):
+        return request.method in ('GET', 'HEAD') and request.path_info.startswith(self.prefix)
+
+    def serve(self, request):
+        """The file's response, or None to let the URLconf 404"""
+        path = request.path_info[len(self.prefix):]
+        accept = request.headers.get('Accept-Encoding', '')
+        variants = [path]
+        if path.endswith(COMPRESSIBLE):
+            if ACCEPTS_GZIP.search(accept):
+                variants.insert(0, path + '.gz')
+            if ACCEPTS_BR.search(accept):
+                variants.insert(0, path + '.br')
+        for variant in variants:
+            if variant == path or os.path.isfile(os.path.join(self.root, variant)):
+                try:
+                    response = serve(request, variant, document_root=self.root)
+                except Http404:
+                    return None
+                if variant != path:
+                    del response['Content-Disposition']
+                break
+        if path.endswith(COMPRESSIBLE):
+            patch_vary_headers(response, ['Accept-Encoding'])
+        if HASHED_NAME.search(path):
+            patch_cache_control(response, public=True, max_age=60 * 60 * 24 * 365, immutable=True)
+        else:
+            patch_cache_control(response, public=True, max_age=60)
+        return response
@@ -0,0 +1,139 @@
+"""Async variants of the calendar and task-order JSON endpoints.
+
+Under an ASGI server these run on the event loop and use the async ORM
+(``aget``, ``asave``, ``async for`` ...) instead of paying a thread hop per
+request. urls.py routes to them when settings.ASYNC_JSON_VIEWS is on.
+Behaviour and payloads match the sync views in views.py.
+"""
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, quote_etag
+from django.views.decorators.csrf import csrf_exempt
+
+from .live import EVICTED, broker
+from .models import CalendarEvent
+from .views import (
+    CALENDAR_ETAG_AGGREGATES, apply_calendar_event_update, apply_reorder, calendar_etag_from_stats,
+    calendar_events_in_window, calendar_events_json, new_calendar_event,
+)
+
+
+async def get_user_event(user, event_id):
+    try:
+        return await CalendarEvent.objects.aget(id=event_id, user=user)
+    except CalendarEvent.DoesNotExist:
+        raise Http404('No CalendarEvent matches the given query.')
+
+
+@login_required
+async def get_calendar_events(request):
+    """API to get calendar events as JSON for FullCalendar"""
+    user = await request.auser()
+    calendar_events = calendar_events_in_window(user, request.GET)
+
+    stats = await calendar_events.aaggregate(**CALENDAR_ETAG_AGGREGATES)
+    etag = quote_etag(calendar_etag_from_stats(user, stats))
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        events = calendar_events_json([event async for event in calendar_events], request.GET)
+        response = JsonResponse(events, safe=False)
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@login_required
+async def add_calendar_event(request):
+    """Add a new calendar event"""
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            await new_calendar_event(await request.auser(), data).asave()
+            return JsonResponse({'success': True, 'message': 'Event added successfully'})
+        except Exception as e:
+            return JsonResponse({'success': False, 'error': str(e)})
+
+    return JsonResponse({'success': False, 'error': 'Invalid request method'})
+
+
+@login_required
+async def update_calendar_event(request, event_id):
+    """Update a calendar event"""
+    if request.method == 'POST':
+        try:
+            event = await get_user_event(await request.auser(), event_id)
+            data = json.loads(request.body)
+            apply_calendar_event_update(event, data)
+            await event.asave()
+            return JsonResponse({'success': True, 'message': 'Event updated successfully'})
+        except Exception as e:
+            return JsonResponse({'success': False, 'error': str(e)})
+
+    return JsonResponse({'success': False, 'error': 'Invalid request method'})
+
+
+@login_required
+async def delete_calendar_event(request, event_id):
+    """Delete a calendar event"""
+    if request.method == 'DELETE':
+        try:
+            event = await get_user_event(await request.auser(), event_id)
+            await event.adelete()
+            return JsonResponse({'success': True, 'message': 'Event deleted successfully'})
+        except Exception as e:
+            return JsonResponse({'success': False, 'error': str(e)})
+
+    return JsonResponse({'success': False, 'error': 'Invalid request method'})
+
+
+@login_required
+@csrf_exempt
+async def update_task_order(request):
+    """Handle AJAX request to update task order after drag and drop"""
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            user = await request.auser()
+            # The async ORM has no transactions, so the atomic write runs in
+            # the sync thread; reading and validating the request does not.
+            await sync_to_async(apply_reorder)(user, {'task_order': data.get('task_order', [])})
+            return JsonResponse({'success': True})
+        except Exception as e:
+            return JsonResponse({'success': False, 'error': str(e)})
+
+    return JsonResponse({'success': False, 'error': 'Invalid request'})
+
+
+@login_required
+async def live_events(request):
+    """Server-sent events stream of the user's task and event changes"""
+    user = await request.auser()
+    subscriber = broker.subscribe(user.pk)
+    heartbeat = getattr(settings, 'LIVE_HEARTBEAT_SECONDS', 15)
+
+    async def stream():
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscriber.queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+                    continue
+                if message is EVICTED:
+                    # The page fell behind; it reloads and reconnects
+                    yield 'event: evicted\ndata: {}\n\n'
+                    return
+                yield f'event: change\ndata: {json.dumps(message)}\n\n'
+        finally:
+            broker.unsubscribe(subscriber)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Keep nginx from buffering the stream
+    return response
@@ -0,0 +1,43 @@
+"""Default avatars: the user's initials on a colored circle, rendered as SVG.
+
+Everything about an avatar follows from the username, so its URL (color
+index and initials) fully determines the image and can be cached forever.
+"""
+import functools
+import hashlib
+from xml.sax.saxutils import escape
+
+from django.urls import reverse
+
+AVATAR_COLORS = [
+    '#3273dc', '#23d160', '#ff3860', '#ffdd57', '#209cee',
+    '#9b59b6', '#e67e22', '#1abc9c', '#34495e', '#e84393',
+]
+
+
+def avatar_initials(username):
+    return username[:2].upper()
+
+
+def avatar_color(username):
+    """Stable palette index for the username (hash() varies per process)"""
+    return hashlib.md5(username.encode()).digest()[0] % len(AVATAR_COLORS)
+
+
+def avatar_url(username):
+    return reverse('avatar', args=[avatar_color(username), avatar_initials(username)])
+
+
+@functools.lru_cache(maxsize=1024)
+def render_avatar(color, initials):
+    """SVG document for an avatar; raises ValueError for anything we'd never link to"""
+    if not 0 <= color < len(AVATAR_COLORS) or not 0 < len(initials) <= 2:
+        raise ValueError('Unknown avatar')
+    text_color = '#363636' if AVATAR_COLORS[color] == '#ffdd57' else '#ffffff'
+    return (
+        '<svg xmlns="http://www.w3.org/2000/svg" width="150" height="150" viewBox="0 0 150 150">'
+        f'<circle cx="75" cy="75" r="75" fill="{AVATAR_COLORS[color]}"/>'
+        f'<text x="75" y="75" dy=".35em" text-anchor="middle" fill="{text_color}" '
+        'font-family="Segoe UI, Tahoma, Geneva, Verdana, sans-serif" font-size="60" font-weight="600">'
+        f'{escape(initials)}</text></svg>'
+    )
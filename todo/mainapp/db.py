@@ -0,0 +1,71 @@
+"""SQLite tuning: connection pragmas and retried write transactions.
+
+The pragmas in settings.SQLITE_PRAGMAS (WAL, synchronous, cache and mmap
+sizes, busy timeout ...) are applied to every SQLite connection as it
+opens. The production profile in settings.py turns them on.
+
+write_transaction runs a function in a transaction and reruns it, with a
+bounded exponential backoff, when SQLite still reports the database as
+locked after its busy timeout.
+"""
+import functools
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .sharding import current_db
+
+WRITE_RETRIES = 4
+WRITE_RETRY_DELAY = 0.02
+WRITE_RETRY_MAX_DELAY = 0.5
+
+# Retry counter of this process
+stats = {'retries': 0}
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    if pragmas:
+        with connection.cursor() as cursor:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def is_lock_error(error):
+    message = str(error).lower()
+    return 'database is locked' in message or 'database is busy' in message
+
+
+def write_transaction(func):
+    """Run ``func`` atomically, retrying it while the database is locked.
+
+    Only an outermost transaction can be retried. Inside an enclosing
+    atomic block the error propagates, so the outer block can be retried
+    as a whole. The transaction is on the current user's shard.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        using = current_db()
+        if transaction.get_connection(using).in_atomic_block:
+            with transaction.atomic(using=using):
+                return func(*args, **kwargs)
+        attempt = 0
+        while True:
+            try:
+                with transaction.atomic(using=using):
+                    return func(*args, **kwargs)
+            except OperationalError as e:
+                if attempt >= WRITE_RETRIES or not is_lock_error(e):
+                    raise
+            stats['retries'] += 1
+            # Full jitter keeps retrying writers from colliding in step
+            time.sleep(random.uniform(0, min(WRITE_RETRY_MAX_DELAY, WRITE_RETRY_DELAY * 2 ** attempt)))
+            attempt += 1
+    return wrapper
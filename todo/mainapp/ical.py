@@ -0,0 +1,293 @@
+"""iCalendar (.ics) export and import of calendar events.
+
+Export writes one VEVENT per CalendarEvent as the rows stream from the
+database, so a large calendar is never held in memory. Import reads the
+upload line by line, turns each VEVENT into an unsaved CalendarEvent and
+inserts them with bulk_create in batches, skipping UIDs that already
+exist. Events with a bad or unsupported field are reported and skipped.
+"""
+import re
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.db import transaction
+from django.utils import timezone
+
+from .importers import RowError
+from .models import CalendarEvent, ChangeLogEntry
+from .recurrence import format_rrule, parse_rrule, series_end
+from .sharding import db_for_user
+
+ICS_BATCH_SIZE = 500
+ICS_CHUNK_SIZE = 2000
+
+PRODID = '-//WebToDo//Calendar//EN'
+# UID of an event that did not come from an import, and how to read it back
+LOCAL_UID = 'event-{}@webtodo'
+LOCAL_UID_RE = re.compile(r'^event-(\d+)@webtodo$')
+
+# iCalendar PRIORITY is 1 (highest) to 9 (lowest); 0 means undefined
+PRIORITY_VALUES = {'high': 1, 'medium': 5, 'low': 9}
+
+
+def priority_from_ics(value):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return 'medium'
+    if 1 <= value <= 4:
+        return 'high'
+    if 6 <= value <= 9:
+        return 'low'
+    return 'medium'
+
+
+# Export
+
+def _escape(text):
+    return (text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def _fold(line):
+    """Content line split into CRLF-terminated pieces of at most 75 octets"""
+    pieces = []
+    current, size = '', 0
+    for char in line:
+        width = len(char.encode())
+        if size + width > 75:
+            pieces.append(current)
+            current, size = ' ', 1
+        current += char
+        size += width
+    pieces.append(current)
+    return '\r\n'.join(pieces) + '\r\n'
+
+
+def _when(day, at=None):
+    if at is None:
+        return f';VALUE=DATE:{day:%Y%m%d}'
+    # Events are stored in local wall-clock time, so they export as floating times
+    return f':{datetime.combine(day, at):%Y%m%dT%H%M%S}'
+
+
+def event_to_ics(event):
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:{_escape(event.uid or LOCAL_UID.format(event.pk))}',
+        f'DTSTAMP:{event.updated_at.astimezone(dt_timezone.utc):%Y%m%dT%H%M%SZ}',
+    ]
+    if event.all_day:
+        # DTEND of an all-day event is the (exclusive) day after it ends
+        lines.append('DTSTART' + _when(event.start_date))
+        lines.append('DTEND' + _when((event.end_date or event.start_date) + timedelta(days=1)))
+    else:
+        lines.append('DTSTART' + _when(event.start_date, event.start_time or time.min))
+        if event.end_date and event.end_time:
+            lines.append('DTEND' + _when(event.end_date, event.end_time))
+    lines.append(f'SUMMARY:{_escape(event.title)}')
+    if event.description:
+        lines.append(f'DESCRIPTION:{_escape(event.description)}')
+    lines.append(f'PRIORITY:{PRIORITY_VALUES.get(event.priority, 0)}')
+    if event.rrule:
+        lines.append(f'RRULE:{event.rrule}')
+        for value in event.exdates:
+            day = date.fromisoformat(value)
+            lines.append('EXDATE' + _when(day, None if event.all_day else event.start_time or time.min))
+    lines.append('END:VEVENT')
+    return ''.join(_fold(line) for line in lines)
+
+
+def export_events(events):
+    """Yield an iCalendar document for ``events`` piece by piece"""
+    yield f'BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:{PRODID}\r\nCALSCALE:GREGORIAN\r\n'
+    for event in events:
+        yield event_to_ics(event)
+    yield 'END:VCALENDAR\r\n'
+
+
+# Import
+
+def _unfolded(lines):
+    """Logical content lines of an iCalendar stream (bytes or str lines)"""
+    current = None
+    for raw in lines:
+        if isinstance(raw, str):
+            raw = raw.encode()
+        raw = raw.rstrip(b'\r\n')
+        if raw[:1] in (b' ', b'\t') and current is not None:
+            current += raw[1:]
+            continue
+        if current:
+            yield current.decode('utf-8-sig', errors='replace')
+        current = raw
+    if current:
+        yield current.decode('utf-8-sig', errors='replace')
+
+
+def _split_line(line):
+    """``(NAME, params, value)`` of a content line, or None if it has no value"""
+    in_quotes = False
+    for index, char in enumerate(line):
+        if char == '"':
+            in_quotes = not in_quotes
+        elif char == ':' and not in_quotes:
+            break
+    else:
+        return None
+    name, *params = line[:index].split(';')
+    params = {key.upper(): value.strip('"')
+              for key, _, value in (param.partition('=') for param in params)}
+    return name.upper(), params, line[index + 1:]
+
+
+def _unescape(text):
+    return re.sub(r'\\([\\;,nN])', lambda m: '\n' if m[1] in 'nN' else m[1], text)
+
+
+def _parse_when(value, params):
+    """``(date, time or None)`` of a DATE or DATE-TIME value, in local time"""
+    value = value.strip()
+    try:
+        if params.get('VALUE') == 'DATE' or len(value) == 8:
+            return datetime.strptime(value, '%Y%m%d').date(), None
+        moment = datetime.strptime(value.rstrip('Z'), '%Y%m%dT%H%M%S')
+    except ValueError:
+        raise RowError(f'Invalid date {value!r}')
+
+    if value.endswith('Z'):
+        moment = timezone.localtime(moment.replace(tzinfo=dt_timezone.utc))
+    elif 'TZID' in params:
+        try:
+            moment = timezone.localtime(moment.replace(tzinfo=ZoneInfo(params['TZID'])))
+        except (ZoneInfoNotFoundError, ValueError):
+            pass  # Unknown zone: keep the wall-clock time
+    return moment.date(), moment.time().replace(tzinfo=None)
+
+
+def parse_events(lines):
+    """Yield ``(number, CalendarEvent)`` or ``(number, RowError)`` per VEVENT"""
+    number = 0
+    properties = None
+    nested = 0
+    for line in _unfolded(lines):
+        parts = _split_line(line)
+        if parts is None:
+            continue
+        name, params, value = parts
+        if name == 'BEGIN':
+            if value.upper() == 'VEVENT' and properties is None:
+                properties = {}
+                number += 1
+            elif properties is not None:
+                nested += 1  # VALARM and the like: not imported
+        elif name == 'END' and properties is not None:
+            if nested:
+                nested -= 1
+            elif value.upper() == 'VEVENT':
+                try:
+                    yield number, _event_from_properties(properties)
+                except RowError as e:
+                    yield number, e
+                properties = None
+        elif properties is not None and not nested:
+            properties.setdefault(name, []).append((params, value))
+
+
+def _event_from_properties(properties):
+    def first(name):
+        values = properties.get(name)
+        return values[0] if values else (None, None)
+
+    if 'RECURRENCE-ID' in properties:
+        raise RowError('Changed occurrences of a recurring event are not supported')
+    title = _unescape(first('SUMMARY')[1] or '').strip()
+    if not title:
+        raise RowError('Event has no SUMMARY')
+    params, value = first('DTSTART')
+    if value is None:
+        raise RowError('Event has no DTSTART')
+
+    start_date, start_time = _parse_when(value, params)
+    all_day = start_time is None
+    end_date = end_time = None
+    params, value = first('DTEND')
+    if value is not None:
+        end_date, end_time = _parse_when(value, params)
+        if all_day:
+            end_date = max(end_date - timedelta(days=1), start_date)
+            end_time = None
+
+    rrule = ''
+    exdates = []
+    if 'RRULE' in properties:
+        try:
+            rrule = format_rrule(*parse_rrule(first('RRULE')[1]))
+        except ValueError as e:
+            raise RowError(str(e))
+        for params, value in properties.get('EXDATE', []):
+            exdates += [_parse_when(part, params)[0].isoformat() for part in value.split(',')]
+
+    return CalendarEvent(
+        uid=_unescape(first('UID')[1] or '').strip()[:255],
+        title=title[:200],
+        description=_unescape(first('DESCRIPTION')[1] or ''),
+        start_date=start_date,
+        start_time=start_time,
+        end_date=end_date,
+        end_time=end_time,
+        priority=priority_from_ics(first('PRIORITY')[1]),
+        all_day=all_day,
+        rrule=rrule,
+        exdates=sorted(set(exdates)),
+    )
+
+
+def _insert_new(user, batch):
+    """bulk_create the events of ``batch`` whose UID the user does not have yet"""
+    uids = {event.uid for event in batch if event.uid}
+    existing = set(CalendarEvent.objects.filter(user=user, uid__in=uids).exclude(uid='')
+                   .values_list('uid', flat=True))
+    # Events exported from this app carry their id instead of a stored UID
+    local_ids = {int(match[1]) for match in map(LOCAL_UID_RE.match, uids) if match}
+    if local_ids:
+        existing |= {LOCAL_UID.format(pk) for pk in CalendarEvent.objects.filter(
+            user=user, id__in=local_ids, uid='').values_list('id', flat=True)}
+
+    new = [event for event in batch if event.uid not in existing]
+    for event in new:
+        event.user = user
+        # bulk_create skips save(), which sets this
+        event.recurrence_end = series_end(event) if event.rrule else None
+    return [event.id for event in CalendarEvent.objects.bulk_create(new)]
+
+
+def import_events(user, events):
+    """Insert parsed events for ``user``; returns ``(created, duplicates, errors)``"""
+    created_ids = []
+    errors = []
+    seen = set()
+    total = 0
+
+    with transaction.atomic(using=db_for_user(user)):
+        batch = []
+        for number, event in events:
+            if isinstance(event, RowError):
+                errors.append({'event': number, 'error': str(event)})
+                continue
+            total += 1
+            if event.uid:
+                if event.uid in seen:
+                    continue
+                seen.add(event.uid)
+            batch.append(event)
+            if len(batch) >= ICS_BATCH_SIZE:
+                created_ids += _insert_new(user, batch)
+                batch = []
+        if batch:
+            created_ids += _insert_new(user, batch)
+
+        if created_ids:
+            # bulk_create skips the signals that keep the feed current
+            ChangeLogEntry.record_many(user.pk, 'event', created_ids)
+    return len(created_ids), total - len(created_ids), errors
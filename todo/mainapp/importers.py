@@ -0,0 +1,137 @@
+"""Bulk task import from pasted lines, CSV or JSON.
+
+Rows are parsed one at a time; a bad row is reported and skipped instead of
+failing the import. Good rows get consecutive ranks after the user's last
+pending task (one aggregate query) and are inserted with bulk_create in
+batches, all in one transaction.
+"""
+import csv
+import io
+import json
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ORDER_GAP, ChangeLogEntry, Tasks, TaskStats
+from .sharding import db_for_user
+
+IMPORT_FORMATS = ('lines', 'csv', 'json')
+IMPORT_BATCH_SIZE = 500
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'x', 'done'}
+FALSE_VALUES = {'', '0', 'false', 'no', 'n'}
+
+
+class RowError(ValueError):
+    pass
+
+
+def parse_rows(text, format):
+    """Yield ``(row_number, task_text, completed)`` or ``(row_number, RowError)``"""
+    if format == 'lines':
+        rows = ({'task': line} for line in text.splitlines() if line.strip())
+    elif format == 'csv':
+        rows = _csv_rows(text)
+    elif format == 'json':
+        rows = _json_rows(text)
+    else:
+        raise ValueError(f'Unknown format {format!r}')
+
+    for number, row in enumerate(rows, start=1):
+        try:
+            yield number, *_clean_row(row)
+        except RowError as e:
+            yield number, e
+
+
+def _csv_rows(text):
+    reader = csv.reader(io.StringIO(text))
+    first = next(reader, None)
+    if first is None:
+        return
+    header = [column.strip().lower() for column in first]
+    if 'task' in header:
+        task_column = header.index('task')
+        completed_column = header.index('completed') if 'completed' in header else None
+    else:
+        # No header: commas are part of the task text ("Buy milk, 2 liters")
+        task_column = completed_column = None
+        yield _csv_row(first, task_column, completed_column)
+    for values in reader:
+        if any(value.strip() for value in values):
+            yield _csv_row(values, task_column, completed_column)
+
+
+def _csv_row(values, task_column, completed_column):
+    if task_column is None:
+        return {'task': ','.join(values)}
+    row = {'task': values[task_column] if task_column < len(values) else ''}
+    if completed_column is not None and completed_column < len(values):
+        row['completed'] = values[completed_column]
+    return row
+
+
+def _json_rows(text):
+    try:
+        items = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f'Invalid JSON: {e}')
+    if not isinstance(items, list):
+        raise ValueError('JSON import must be a list')
+    for item in items:
+        yield {'task': item} if isinstance(item, str) else item
+
+
+def _clean_row(row):
+    if not isinstance(row, dict):
+        raise RowError('Expected a string or an object with a "task" field')
+    task = row.get('task')
+    if not isinstance(task, str) or not task.strip():
+        raise RowError('Task text is missing')
+
+    completed = row.get('completed', False)
+    if isinstance(completed, str):
+        value = completed.strip().lower()
+        if value in TRUE_VALUES:
+            completed = True
+        elif value in FALSE_VALUES:
+            completed = False
+        else:
+            raise RowError(f'Invalid completed value {completed!r}')
+    elif not isinstance(completed, bool):
+        raise RowError(f'Invalid completed value {completed!r}')
+    return task.strip(), completed
+
+
+def import_tasks(user, rows):
+    """Insert parsed rows for ``user``; returns ``(created, errors)``"""
+    completed_count = 0
+    created_ids = []
+    errors = []
+    now = timezone.now()
+
+    with transaction.atomic(using=db_for_user(user)):
+        order = Tasks.next_order(user)
+        batch = []
+        for number, *parsed in rows:
+            if isinstance(parsed[0], RowError):
+                errors.append({'row': number, 'error': str(parsed[0])})
+                continue
+            task, completed = parsed
+            batch.append(Tasks(user=user, task=task, order_field=order,
+                               completed=completed, completed_at=now if completed else None))
+            order += ORDER_GAP
+            completed_count += completed
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                created_ids += [task.id for task in Tasks.objects.bulk_create(batch)]
+                batch = []
+        if batch:
+            created_ids += [task.id for task in Tasks.objects.bulk_create(batch)]
+        created = len(created_ids)
+
+        if created:
+            # bulk_create skips save() and its signals
+            TaskStats.track(user, total=created, completed=completed_count,
+                            today=created - completed_count)
+            ChangeLogEntry.record_many(user.pk, 'task', created_ids)
+    return created, errors
@@ -0,0 +1,82 @@
+"""In-process pub/sub pushing task and event changes to open pages.
+
+Each server-sent-events connection subscribes with a bounded queue. Writes
+publish once their transaction commits; a subscriber that falls behind
+until its queue is full is evicted and told so, and its page reconnects
+and reloads. Subscribers only see changes made in the same process, so run
+the ASGI server with one worker (or put a shared broker behind this).
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+from .sharding import current_db
+
+LIVE_QUEUE_SIZE = getattr(settings, 'LIVE_QUEUE_SIZE', 100)
+
+EVICTED = object()
+
+
+class Subscriber:
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(LIVE_QUEUE_SIZE)
+        self.evicted = False
+
+    def offer(self, message):
+        """Queue a message; runs on the subscriber's event loop"""
+        if self.evicted:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Slow consumer: drop its backlog and tell it to start over
+            self.evicted = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(EVICTED)
+
+
+class Broker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = defaultdict(set)
+
+    def subscribe(self, user_id):
+        subscriber = Subscriber(user_id)
+        with self.lock:
+            self.subscribers[user_id].add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            subscribers = self.subscribers.get(subscriber.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self.subscribers[subscriber.user_id]
+
+    def publish(self, user_id, message):
+        """Hand ``message`` to every subscriber of the user; safe from any thread"""
+        with self.lock:
+            subscribers = list(self.subscribers.get(user_id, ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.offer, message)
+            except RuntimeError:
+                self.unsubscribe(subscriber)  # Its event loop is gone
+
+
+broker = Broker()
+
+
+def publish_change(user_id, kind, object_ids, deleted=False):
+    """Announce a change to the user's open pages once the transaction commits"""
+    if not broker.subscribers.get(user_id):
+        return
+    message = {'kind': kind, 'ids': list(object_ids), 'deleted': deleted}
+    transaction.on_commit(lambda: broker.publish(user_id, message), using=current_db())
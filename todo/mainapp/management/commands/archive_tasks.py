@@ -0,0 +1,42 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from mainapp.models import Tasks, ArchivedTask
+from mainapp.sharding import db_for_user, shard_aliases, using_shard
+
+class Command(BaseCommand):
+    help = 'Move completed tasks older than N days into the archive table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90, help='Archive tasks completed more than this many days ago')
+        parser.add_argument('--batch-size', type=int, default=500, help='Tasks moved per transaction')
+        parser.add_argument('--user', help='Only archive tasks of this username')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        tasks = Tasks.objects.filter(completed=True, completed_at__lt=cutoff).order_by('id')
+        shards = shard_aliases()
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f"No user named {options['user']}")
+            tasks = tasks.filter(user=user)
+            shards = [db_for_user(user)]
+
+        # Each batch commits on its own, so an interrupted run can simply be
+        # started again and carries on with whatever is left.
+        moved = 0
+        for alias in shards:
+            with using_shard(alias):
+                last_id = 0
+                while True:
+                    ids = list(tasks.filter(id__gt=last_id).values_list('id', flat=True)[:options['batch_size']])
+                    if not ids:
+                        break
+                    moved += ArchivedTask.archive(ids)
+                    last_id = ids[-1]
+                    self.stdout.write(f"Archived {moved} tasks (up to id {last_id} on {alias})")
+
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} tasks completed before {cutoff:%Y-%m-%d}"))
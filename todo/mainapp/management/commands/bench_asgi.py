@@ -0,0 +1,157 @@
+import json
+import os
+import shlex
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from mainapp.models import Tasks
+from mainapp.seeding import seed_events, seed_tasks, seed_users
+from mainapp.sharding import user_shard
+
+BENCH_PREFIX = 'bench-asgi'
+
+class Command(BaseCommand):
+    help = ('Compare throughput of the sync views under a WSGI server with the async views '
+            'under an ASGI server at several concurrency levels, for the calendar feed and '
+            'task reordering; the bench user and its data are removed afterwards')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', default='1,8,32', help='Comma separated concurrency levels')
+        parser.add_argument('--requests', type=int, default=300, help='Requests per concurrency level')
+        parser.add_argument('--events', type=int, default=200, help='Calendar events to seed for the bench user')
+        parser.add_argument('--tasks', type=int, default=50, help='Tasks to seed for the bench user')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--wsgi-cmd', help='WSGI server command; {port} is substituted')
+        parser.add_argument('--asgi-cmd', help='ASGI server command; {port} is substituted')
+
+    def handle(self, *args, **options):
+        levels = [int(level) for level in options['concurrency'].split(',')]
+        servers = [
+            ('wsgi/sync', options['wsgi_cmd'] or self.default_wsgi_cmd(), '0'),
+            ('asgi/async', options['asgi_cmd'] or self.default_asgi_cmd(), '1'),
+        ]
+        # The servers use the real database, so everything seeded here is
+        # removed again however the run ends
+        user, session = self.seed(options['events'], options['tasks'])
+        try:
+            self.run(servers, levels, self.endpoints(user, options['port']), session, options)
+        finally:
+            session.delete()
+            user.delete()
+
+    def run(self, servers, levels, endpoints, session, options):
+        cookie = f'{settings.SESSION_COOKIE_NAME}={session.session_key}'
+        self.stdout.write(f"{'server':12} {'endpoint':9} {'conc':>5} {'req/s':>9} {'p50 ms':>8} "
+                          f"{'p95 ms':>8} {'errors':>7}")
+        for name, command, async_views in servers:
+            process = self.start_server(command.format(port=options['port']), options['port'], async_views)
+            try:
+                for endpoint, url, bodies in endpoints:
+                    for level in levels:
+                        result = self.load(url, cookie, level, options['requests'], bodies)
+                        self.stdout.write(
+                            f"{name:12} {endpoint:9} {level:5} {result['throughput']:9.1f} "
+                            f"{result['p50']:8.1f} {result['p95']:8.1f} {result['errors']:7}")
+            finally:
+                process.terminate()
+                process.wait(timeout=10)
+
+    def default_wsgi_cmd(self):
+        if shutil.which('gunicorn'):
+            return 'gunicorn todo.wsgi:application -b 127.0.0.1:{port} --workers 1 --threads 8'
+        return f'{sys.executable} manage.py runserver 127.0.0.1:{{port}} --noreload'
+
+    def default_asgi_cmd(self):
+        if not shutil.which('uvicorn'):
+            raise CommandError('No ASGI server found; pip install uvicorn or pass --asgi-cmd')
+        return 'uvicorn todo.asgi:application --host 127.0.0.1 --port {port} --workers 1 --no-access-log'
+
+    def seed(self, events, tasks):
+        """Create the bench user with ``events`` events and ``tasks`` tasks, and a session for it"""
+        user, = seed_users(1, prefix=BENCH_PREFIX)
+        try:
+            seed_events([user], events)
+            seed_tasks([user], tasks, completed_ratio=0)
+
+            session = SessionStore()
+            session[SESSION_KEY] = str(user.pk)
+            session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+            session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+            session.create()
+        except BaseException:
+            user.delete()
+            raise
+        return user, session
+
+    def endpoints(self, user, port):
+        """``(name, url, bodies)`` of each benchmarked endpoint; bodies are POSTed in turn"""
+        base = f'http://127.0.0.1:{port}'
+        year = timezone.localdate().year
+        with user_shard(user):
+            order = list(Tasks.objects.filter(user=user, completed=False)
+                         .order_by('order_field').values_list('id', flat=True))
+        # Each body moves one more task from the bottom to the top, as a drag would
+        bodies = [json.dumps({'task_order': order[-shift:] + order[:-shift]}).encode()
+                  for shift in range(1, len(order))] or None
+        endpoints = [('events', f'{base}/calendar/events/?start={year}-01-01&end={year + 1}-01-01', None)]
+        if bodies:
+            endpoints.append(('reorder', f'{base}/todo/update-order/', bodies))
+        return endpoints
+
+    def start_server(self, command, port, async_views):
+        env = {**os.environ, 'TODO_ASYNC_VIEWS': async_views}
+        process = subprocess.Popen(shlex.split(command), cwd=settings.BASE_DIR, env=env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+                return process
+            except OSError:
+                if process.poll() is not None:
+                    raise CommandError(f'Server exited: {command}')
+                time.sleep(0.2)
+        process.terminate()
+        raise CommandError(f'Server did not start: {command}')
+
+    def load(self, url, cookie, concurrency, total, bodies=None):
+        def fetch(number):
+            headers = {'Cookie': cookie}
+            body = None
+            if bodies:
+                body = bodies[number % len(bodies)]
+                headers['Content-Type'] = 'application/json'
+            request = urllib.request.Request(url, data=body, headers=headers)
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=30) as response:
+                    # The JSON endpoints report failures with a 200
+                    ok = response.status == 200 and b'"success": false' not in response.read()
+            except OSError:
+                ok = False
+            return time.perf_counter() - started, ok
+
+        fetch(0)  # Warm up the server
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(fetch, range(total)))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency * 1000 for latency, ok in results)
+        return {
+            'throughput': total / elapsed,
+            'p50': statistics.median(latencies),
+            'p95': latencies[int(len(latencies) * 0.95) - 1],
+            'errors': sum(not ok for latency, ok in results),
+        }
@@ -0,0 +1,189 @@
+import json
+import math
+import platform
+import statistics
+import time
+import tracemalloc
+from contextlib import ExitStack
+from datetime import date
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from mainapp.models import Tasks
+from mainapp.page_cache import page_cache
+from mainapp.seeding import seed_events, seed_tasks, seed_users
+from mainapp.sharding import db_for_user, user_shard
+
+VIEWS = ('home', 'todo_page_view', 'get_calendar_events', 'update_task_order')
+
+class Command(BaseCommand):
+    help = ('Time the main views through the test client at several data sizes, in a throwaway '
+            'test database; optionally compare with a baseline JSON and fail on regressions')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='100,1000,5000',
+                            help='Comma separated tasks per user; each user also gets a fifth as many events')
+        parser.add_argument('--users', type=int, default=5, help='Users seeded alongside the measured one')
+        parser.add_argument('--repeat', type=int, default=30, help='Timed requests per view and size')
+        parser.add_argument('--views', default=','.join(VIEWS), help='Comma separated subset of ' + ', '.join(VIEWS))
+        parser.add_argument('--warm-cache', action='store_true',
+                            help='Keep the page cache between requests instead of measuring full renders')
+        parser.add_argument('--output', default='bench_views.json', help='Where to write the results')
+        parser.add_argument('--baseline', help='Results JSON of an earlier run to compare with')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed relative increase of p95 latency and peak memory')
+        parser.add_argument('--min-delta-ms', type=float, default=2.0,
+                            help='Latency increases smaller than this are never regressions')
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        views = options['views'].split(',')
+        unknown = set(views) - set(VIEWS)
+        if unknown:
+            raise CommandError(f"Unknown views: {', '.join(sorted(unknown))}")
+
+        setup_test_environment()
+        # Every shard gets a throwaway database too, or seeded users placed
+        # on a shard would land in its real file
+        old_names = {}
+        try:
+            for alias in settings.DATABASE_SHARDS:
+                old_names[alias] = connections[alias].settings_dict['NAME']
+                connections[alias].creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            results = self.run(sizes, views, options)
+        finally:
+            for alias, old_name in old_names.items():
+                connections[alias].creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            'meta': {
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'repeat': options['repeat'],
+                'users': options['users'],
+                'warm_cache': options['warm_cache'],
+            },
+            'results': results,
+        }
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(f"Results written to {options['output']}")
+
+        if options['baseline']:
+            self.compare(results, options)
+
+    def run(self, sizes, views, options):
+        users = seed_users(options['users'] + 1, prefix='bench')
+        user = users[0]
+        client = Client()
+        client.force_login(user)
+
+        # Sessions and users are on 'default', the user's own rows on its shard
+        aliases = {DEFAULT_DB_ALIAS, db_for_user(user.pk)}
+        results = {}
+        self.stdout.write(f"{'view':22} {'tasks':>6} {'p50 ms':>8} {'p95 ms':>8} {'queries':>8} {'peak KiB':>9}")
+        seeded = 0
+        for size in sizes:
+            # Sizes grow, so each one only adds the difference
+            started = time.monotonic()
+            seed_tasks(users, size - seeded, seed=size)
+            seed_events(users, (size - seeded) // 5, seed=size)
+            seeded = size
+            self.stderr.write(f"Seeded {size} tasks per user in {time.monotonic() - started:.1f}s")
+
+            for view in views:
+                request = getattr(self, f'request_{view}')(client, user)
+                result = self.measure(request, aliases, options['repeat'], options['warm_cache'])
+                results[f'{view}@{size}'] = result
+                self.stdout.write(f"{view:22} {size:6} {result['p50_ms']:8.1f} {result['p95_ms']:8.1f} "
+                                  f"{result['queries']:8} {result['peak_kib']:9.0f}")
+        return results
+
+    def measure(self, request, aliases, repeat, warm_cache):
+        def call():
+            if not warm_cache:
+                page_cache().clear()
+            response = request()
+            if response.status_code != 200:
+                raise CommandError(f'{response.status_code} from {response.request["PATH_INFO"]}')
+
+        call()  # Warm-up: imports, template loading, first-time caches
+        latencies = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            call()
+            latencies.append((time.perf_counter() - started) * 1000)
+
+        # Queries and memory from one more request, outside the timed ones
+        with ExitStack() as stack:
+            captured = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in aliases]
+            tracemalloc.start()
+            call()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        latencies.sort()
+        return {
+            'p50_ms': round(statistics.median(latencies), 3),
+            'p95_ms': round(latencies[math.ceil(len(latencies) * 0.95) - 1], 3),
+            'queries': sum(len(queries) for queries in captured),
+            'peak_kib': round(peak / 1024, 1),
+        }
+
+    def request_home(self, client, user):
+        return lambda: client.get(reverse('home'))
+
+    def request_todo_page_view(self, client, user):
+        return lambda: client.get(reverse('todolist'))
+
+    def request_get_calendar_events(self, client, user):
+        # A month view in the middle of the seeded year
+        year = date.today().year
+        params = {'start': f'{year}-06-01T00:00:00', 'end': f'{year}-07-06T00:00:00'}
+        return lambda: client.get(reverse('get_calendar_events'), params)
+
+    def request_update_task_order(self, client, user):
+        # Move the last pending task to the top, as one drag would
+        with user_shard(user.pk):
+            order = list(Tasks.objects.filter(user=user, completed=False)
+                         .order_by('order_field').values_list('id', flat=True))
+
+        def request():
+            order.insert(0, order.pop())
+            return client.post(reverse('update_task_order'), json.dumps({'task_order': order}),
+                               content_type='application/json')
+        return request
+
+    def compare(self, results, options):
+        with open(options['baseline']) as f:
+            baseline = json.load(f)['results']
+
+        tolerance = 1 + options['tolerance']
+        regressions = []
+        self.stdout.write(f"\n{'benchmark':30} {'p95 ms':>17} {'queries':>11} {'peak KiB':>19}")
+        for name, result in results.items():
+            base = baseline.get(name)
+            if base is None:
+                continue
+            self.stdout.write(
+                f"{name:30} {base['p95_ms']:7.1f} -> {result['p95_ms']:7.1f} "
+                f"{base['queries']:4} -> {result['queries']:4} "
+                f"{base['peak_kib']:8.0f} -> {result['peak_kib']:8.0f}")
+            if (result['p95_ms'] > base['p95_ms'] * tolerance
+                    and result['p95_ms'] - base['p95_ms'] >= options['min_delta_ms']):
+                regressions.append(f"{name}: p95 {base['p95_ms']:.1f} -> {result['p95_ms']:.1f} ms")
+            if result['queries'] > base['queries']:
+                regressions.append(f"{name}: {base['queries']} -> {result['queries']} queries")
+            if result['peak_kib'] > base['peak_kib'] * tolerance:
+                regressions.append(f"{name}: peak memory {base['peak_kib']:.0f} -> {result['peak_kib']:.0f} KiB")
+
+        if regressions:
+            raise CommandError('Regressions against ' + options['baseline'] + ':\n  ' + '\n  '.join(regressions))
+        self.stdout.write(self.style.SUCCESS('No regressions against ' + options['baseline']))
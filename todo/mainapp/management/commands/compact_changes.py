@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from mainapp.models import ChangeLogEntry
+from mainapp.sharding import shard_aliases, using_shard
+
+class Command(BaseCommand):
+    help = 'Delete change feed entries older than N days'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Keep entries from the last this many days')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Entries deleted per statement')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+
+        # Oldest first: the changes endpoint treats any cursor below the oldest
+        # remaining entry as lost and tells that client to reload everything.
+        deleted = 0
+        for alias in shard_aliases():
+            with using_shard(alias):
+                while True:
+                    ids = list(ChangeLogEntry.objects.filter(created_at__lt=cutoff)
+                               .order_by('id').values_list('id', flat=True)[:options['batch_size']])
+                    if not ids:
+                        break
+                    deleted += ChangeLogEntry.objects.filter(id__in=ids).delete()[0]
+                    self.stdout.write(f"Deleted {deleted} entries")
+
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} change entries older than {cutoff:%Y-%m-%d}"))
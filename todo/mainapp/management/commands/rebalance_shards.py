@@ -0,0 +1,63 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from mainapp.sharding import count_user_rows, home_shard, move_user, shard_aliases, users_by_shard
+
+class Command(BaseCommand):
+    help = ("Move users' tasks, events and profiles to their home shard while the site stays up. "
+            "Run it after adding shards to TODO_SHARDS")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only move this username')
+        parser.add_argument('--to', help='Move the user (--user) to this alias instead of their home shard; '
+                                         'a later full run moves them back')
+        parser.add_argument('--dry-run', action='store_true', help='List the moves without making them')
+        parser.add_argument('--settle', type=float, default=1.0,
+                            help='Seconds to wait before sweeping up writes that raced a move')
+
+    def handle(self, *args, **options):
+        shards = shard_aliases()
+        if options['to'] and not options['user']:
+            raise CommandError('--to needs --user')
+        if options['to'] and options['to'] not in shards:
+            raise CommandError(f"{options['to']} is not one of the shards: {', '.join(shards)}")
+
+        users = User.objects.order_by('id')
+        if options['user']:
+            users = users.filter(username=options['user'])
+            if not users.exists():
+                raise CommandError(f"No user named {options['user']}")
+
+        moves = []
+        for source, shard_users in users_by_shard(list(users)).items():
+            for user in shard_users:
+                target = options['to'] or home_shard(user.pk)
+                if target != source:
+                    moves.append((user, source, target))
+
+        if options['dry_run']:
+            for user, source, target in moves:
+                self.stdout.write(f"{user.username}: {source} -> {target}")
+            self.stdout.write(self.style.SUCCESS(f"{len(moves)} users to move"))
+            return
+
+        started = time.monotonic()
+        rows = 0
+        for user, source, target in moves:
+            moved = move_user(user.pk, source, target)
+            rows += moved
+            self.stdout.write(f"{user.username}: {source} -> {target} ({moved} rows)")
+
+        # Requests that looked up a user's shard just before the switch may
+        # still have written to the old one; move whatever they left behind.
+        if moves:
+            time.sleep(options['settle'])
+        for user, source, target in moves:
+            if count_user_rows(user.pk, source):
+                moved = move_user(user.pk, source, target)
+                rows += moved
+                self.stdout.write(f"{user.username}: swept {moved} late rows from {source}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Moved {len(moves)} users ({rows} rows) in {time.monotonic() - started:.1f}s"))
@@ -0,0 +1,41 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from mainapp.models import TaskStats
+from mainapp.sharding import users_by_shard, using_shard
+
+class Command(BaseCommand):
+    help = 'Recompute the per-user task counters and repair any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only check this username')
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without saving')
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('id')
+        if options['user']:
+            users = users.filter(username=options['user'])
+
+        checked = drifted = 0
+        for alias, shard_users in users_by_shard(list(users)).items():
+            with using_shard(alias):
+                # auth_user may be on another database, so no join here
+                counters = TaskStats.objects.all()
+                if options['user']:
+                    counters = counters.filter(user__in=shard_users)
+                stored = {row.user_id: row for row in counters}
+
+                for user in shard_users:
+                    checked += 1
+                    stats = stored.get(user.id)
+                    before = (stats.total, stats.completed, stats.today) if stats else None
+                    counts = TaskStats.count(user)
+                    after = (counts['total'], counts['completed'], counts['today_pending'])
+
+                    if before != after:
+                        drifted += 1
+                        self.stdout.write(f"{user.username}: total/completed/today {before} -> {after}")
+                        if not options['dry_run']:
+                            TaskStats.recompute(user)
+
+        action = 'found' if options['dry_run'] else 'repaired'
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} users, {action} {drifted} with drift"))
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+from mainapp.seeding import SEED_PASSWORD, seed_events, seed_tasks, seed_users
+
+class Command(BaseCommand):
+    help = 'Create N users with M tasks and K calendar events each, using bulk inserts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--tasks', type=int, default=1000, help='Tasks added per user')
+        parser.add_argument('--events', type=int, default=200, help='Calendar events added per user')
+        parser.add_argument('--completed-ratio', type=float, default=0.3, help='Share of tasks created done')
+        parser.add_argument('--prefix', default='seed', help='Usernames are <prefix>-<n>')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the generated text')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        users = seed_users(options['users'], options['prefix'])
+        seed_tasks(users, options['tasks'], options['completed_ratio'], options['seed'])
+        seed_events(users, options['events'], seed=options['seed'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(users)} users with {options['tasks']} tasks and {options['events']} events each "
+            f"in {time.monotonic() - started:.1f}s (password: {SEED_PASSWORD})"))
@@ -0,0 +1,136 @@
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from mainapp import db
+from mainapp.models import Tasks
+from mainapp.seeding import seed_tasks, seed_users
+from mainapp.views import apply_reorder
+
+# What each profile changes on the default database; "stock" is the plain
+# SQLite setup without write retries, as the app ran before the profile
+PROFILES = {
+    'stock': {'options': {}, 'conn_max_age': 0, 'pragmas': {}, 'retries': 0},
+    'production': {
+        'options': {'transaction_mode': 'IMMEDIATE'},
+        'conn_max_age': 600,
+        'pragmas': {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'cache_size': -32000,
+                    'mmap_size': 256 * 1024 * 1024, 'busy_timeout': 5000, 'temp_store': 'MEMORY'},
+        'retries': db.WRITE_RETRIES,
+    },
+}
+
+class Command(BaseCommand):
+    help = ('Hammer a scratch SQLite file with concurrent task reorders and reads, once per DB '
+            'profile, and report lock errors, retries and throughput')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', default='stock,production', help='Comma separated: stock, production')
+        parser.add_argument('--writers', type=int, default=8, help='Threads doing drag-and-drop reorders')
+        parser.add_argument('--readers', type=int, default=4, help='Threads reading task lists')
+        parser.add_argument('--seconds', type=float, default=10.0, help='Duration per profile')
+        parser.add_argument('--tasks', type=int, default=200, help='Pending tasks per writer')
+
+    def handle(self, *args, **options):
+        scratch = Path(tempfile.mkdtemp(prefix='stress-db-'))
+        setup_test_environment()
+        self.stdout.write(f"{'profile':11} {'writes/s':>9} {'ok':>7} {'locked':>7} {'retries':>8} "
+                          f"{'write p95':>10} {'reads/s':>9} {'read p95':>9}")
+        try:
+            for name in options['profiles'].split(','):
+                result = self.run_profile(name, PROFILES[name], scratch / f'{name}.sqlite3', options)
+                self.stdout.write(
+                    f"{name:11} {result['writes_per_s']:9.1f} {result['writes']:7} {result['locked']:7} "
+                    f"{result['retries']:8} {result['write_p95_ms']:8.1f}ms "
+                    f"{result['reads_per_s']:9.1f} {result['read_p95_ms']:7.1f}ms")
+        finally:
+            teardown_test_environment()
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    def run_profile(self, name, profile, path, options):
+        database = settings.DATABASES['default']
+        saved = {key: database.get(key) for key in ('NAME', 'OPTIONS', 'CONN_MAX_AGE', 'TEST')}
+        saved_pragmas, saved_retries = settings.SQLITE_PRAGMAS, db.WRITE_RETRIES
+        # New connections in every thread read these same dicts
+        database.update({'OPTIONS': profile['options'], 'CONN_MAX_AGE': profile['conn_max_age'],
+                         'TEST': {**(saved['TEST'] or {}), 'NAME': str(path)}})
+        settings.SQLITE_PRAGMAS = profile['pragmas']
+        db.WRITE_RETRIES = profile['retries']
+        connection.close()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            users = seed_users(options['writers'], prefix='stress')
+            seed_tasks(users, options['tasks'], completed_ratio=0)
+            connection.close()
+            return self.hammer(users, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            database.update(saved)
+            settings.SQLITE_PRAGMAS, db.WRITE_RETRIES = saved_pragmas, saved_retries
+
+    def hammer(self, users, options):
+        deadline = time.monotonic() + options['seconds']
+        lock = threading.Lock()
+        writes, reads, locked = [], [], [0]
+        retries_before = db.stats['retries']
+
+        def writer(user):
+            rng = random.Random(user.pk)
+            task_ids = list(Tasks.objects.filter(user=user).values_list('id', flat=True))
+            try:
+                while time.monotonic() < deadline:
+                    moved, after = rng.sample(task_ids, 2)
+                    started = time.perf_counter()
+                    try:
+                        apply_reorder(user, {'moves': [{'id': moved, 'after': after}]})
+                    except OperationalError as e:
+                        if not db.is_lock_error(e):
+                            raise
+                        with lock:
+                            locked[0] += 1
+                        continue
+                    with lock:
+                        writes.append(time.perf_counter() - started)
+            finally:
+                connection.close()
+
+        def reader(user):
+            try:
+                while time.monotonic() < deadline:
+                    started = time.perf_counter()
+                    list(Tasks.objects.filter(user=user, completed=False).order_by('order_field'))
+                    with lock:
+                        reads.append(time.perf_counter() - started)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=writer, args=(user,)) for user in users]
+        threads += [threading.Thread(target=reader, args=(users[number % len(users)],))
+                    for number in range(options['readers'])]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        def p95(latencies):
+            return statistics.quantiles(latencies, n=20)[-1] * 1000 if len(latencies) > 1 else 0.0
+
+        return {
+            'writes': len(writes),
+            'writes_per_s': len(writes) / elapsed,
+            'locked': locked[0],
+            'retries': db.stats['retries'] - retries_before,
+            'write_p95_ms': p95(writes),
+            'reads_per_s': len(reads) / elapsed,
+            'read_p95_ms': p95(reads),
+        }
@@ -0,0 +1,216 @@
+"""Request instrumentation: latency, database and template time per view.
+
+MetricsMiddleware times every request and collects, through a ContextVar
+that follows the request into sync_to_async threads:
+
+- the number of queries and their total time, via an execute wrapper
+  installed on each database connection when it opens;
+- template render time, via the TimedDjangoTemplates backend.
+
+Each response gets a ``Server-Timing`` header with the breakdown. The
+totals per URL name go into in-process counters and a latency histogram,
+and metrics_text() renders them in Prometheus text format. Every worker
+process keeps its own counters.
+
+With METRICS_SLOW_QUERY_MS set, each request logs its slowest queries
+above that threshold.
+"""
+import bisect
+import contextvars
+import heapq
+import logging
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.backends.django import DjangoTemplates, Template
+
+from .page_cache import stats as page_cache_stats
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SERVER_TIMING = getattr(settings, 'METRICS_SERVER_TIMING', True)
+SLOW_QUERY_MS = getattr(settings, 'METRICS_SLOW_QUERY_MS', None)
+SLOW_QUERIES_LOGGED = 5
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('queries', 'db_time', 'template_time', 'slow_queries')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.slow_queries = []
+
+
+class ViewMetrics:
+    __slots__ = ('buckets', 'count', 'duration', 'queries', 'db_time', 'template_time')
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.duration = 0.0
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+
+
+_views = {}
+_lock = threading.Lock()
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        metrics.queries += 1
+        metrics.db_time += duration
+        if SLOW_QUERY_MS is not None and duration * 1000 >= SLOW_QUERY_MS:
+            metrics.slow_queries.append((duration, sql))
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    # Runs again whenever the connection reopens; add the wrapper only once
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, with render time counted per request"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, metrics, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, metrics, time.perf_counter() - started)
+        return response
+
+    def finish(self, request, response, metrics, duration):
+        match = request.resolver_match
+        key = (match.view_name if match and match.view_name else 'unmatched', request.method)
+        with _lock:
+            view = _views.get(key)
+            if view is None:
+                view = _views[key] = ViewMetrics()
+            view.buckets[bisect.bisect_left(LATENCY_BUCKETS, duration)] += 1
+            view.count += 1
+            view.duration += duration
+            view.queries += metrics.queries
+            view.db_time += metrics.db_time
+            view.template_time += metrics.template_time
+
+        if SERVER_TIMING:
+            response['Server-Timing'] = (
+                f'app;dur={duration * 1000:.1f}, '
+                f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} queries", '
+                f'tpl;dur={metrics.template_time * 1000:.1f}')
+        if metrics.slow_queries:
+            for query_time, sql in heapq.nlargest(SLOW_QUERIES_LOGGED, metrics.slow_queries):
+                logger.warning('Slow query in %s %s (%.1f ms): %s',
+                               request.method, request.path, query_time * 1000, sql)
+
+
+def _label_value(value):
+    # Backslash first, so the escapes added after it are not doubled
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(view, method, **extra):
+    labels = {'view': view, 'method': method, **extra}
+    return ','.join(f'{name}="{_label_value(value)}"' for name, value in labels.items())
+
+
+def metrics_text():
+    """All counters of this process in Prometheus text exposition format"""
+    with _lock:
+        views = {key: (list(view.buckets), view.count, view.duration, view.queries,
+                       view.db_time, view.template_time)
+                 for key, view in sorted(_views.items())}
+
+    lines = [
+        '# HELP todo_request_duration_seconds Request latency by URL name.',
+        '# TYPE todo_request_duration_seconds histogram',
+    ]
+    for (view, method), (buckets, count, duration, *_) in views.items():
+        cumulative = 0
+        for bound, bucket in zip(LATENCY_BUCKETS + ('+Inf',), buckets):
+            cumulative += bucket
+            lines.append(f'todo_request_duration_seconds_bucket{{{_labels(view, method, le=bound)}}} {cumulative}')
+        lines.append(f'todo_request_duration_seconds_sum{{{_labels(view, method)}}} {duration:.6f}')
+        lines.append(f'todo_request_duration_seconds_count{{{_labels(view, method)}}} {count}')
+
+    for name, index, kind, help_text in (
+            ('todo_db_queries_total', 3, 'counter', 'Database queries run by requests.'),
+            ('todo_db_query_seconds_total', 4, 'counter', 'Time spent in database queries.'),
+            ('todo_template_render_seconds_total', 5, 'counter', 'Time spent rendering templates.')):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+        for (view, method), values in views.items():
+            value = values[index]
+            lines.append(f'{name}{{{_labels(view, method)}}} {value if index == 3 else f"{value:.6f}"}')
+
+    lines += [
+        '# HELP todo_page_cache_requests_total Page cache lookups by result.',
+        '# TYPE todo_page_cache_requests_total counter',
+        f'todo_page_cache_requests_total{{result="hit"}} {page_cache_stats["hits"]}',
+        f'todo_page_cache_requests_total{{result="miss"}} {page_cache_stats["misses"]}',
+    ]
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,46 @@
+from django.db import migrations, models
+
+ORDER_GAP = 1 << 16
+
+
+def spread_task_order(apps, schema_editor):
+    """Turn the old 1, 2, 3 ... ranks into gap-separated ones per user"""
+    Tasks = apps.get_model('mainapp', 'Tasks')
+    batch = []
+    user_id = None
+    rank = 0
+    tasks = (Tasks.objects.filter(completed=False)
+             .order_by('user_id', 'order_field', 'id').only('id', 'user_id', 'order_field'))
+    for task in tasks.iterator(chunk_size=2000):
+        if task.user_id != user_id:
+            user_id = task.user_id
+            rank = 0
+        rank += ORDER_GAP
+        task.order_field = rank
+        batch.append(task)
+        if len(batch) >= 2000:
+            Tasks.objects.bulk_update(batch, ['order_field'])
+            batch = []
+    if batch:
+        Tasks.objects.bulk_update(batch, ['order_field'])
+
+
+def compact_task_order(apps, schema_editor):
+    Tasks = apps.get_model('mainapp', 'Tasks')
+    Tasks.objects.filter(completed=False).update(order_field=models.F('order_field') / ORDER_GAP)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0004_userprofile'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tasks',
+            name='order_field',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.RunPython(spread_task_order, compact_task_order),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0005_gap_task_order'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='calendarevent',
+            index=models.Index(fields=['user', 'start_date', 'end_date'], name='calevent_user_window_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0006_calendarevent_window_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tasks',
+            index=models.Index(condition=models.Q(('completed', False)), fields=['user', 'order_field'], name='tasks_user_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tasks',
+            index=models.Index(condition=models.Q(('completed', True)), fields=['user', '-completed_at'], name='tasks_user_done_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tasks',
+            index=models.Index(fields=['user', 'created_at'], name='tasks_user_created_idx'),
+        ),
+    ]
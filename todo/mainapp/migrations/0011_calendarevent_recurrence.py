@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0010_changelogentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='calendarevent',
+            name='exdates',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='calendarevent',
+            name='recurrence_end',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='calendarevent',
+            name='rrule',
+            field=models.CharField(blank=True, max_length=200),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0011_calendarevent_recurrence'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='calendarevent',
+            name='uid',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddConstraint(
+            model_name='calendarevent',
+            constraint=models.UniqueConstraint(condition=models.Q(('uid', ''), _negated=True), fields=('user', 'uid'), name='calevent_user_uid_uniq'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+from django.db import migrations
+
+# See mainapp/search.py. Rowids: task id * 2, event id * 2 + 1.
+CREATE_SQL = [
+    """CREATE VIRTUAL TABLE mainapp_search USING fts5(
+        owner, title, body,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )""",
+    """CREATE TRIGGER mainapp_search_task_insert AFTER INSERT ON mainapp_tasks BEGIN
+        INSERT INTO mainapp_search (rowid, owner, title, body)
+        VALUES (new.id * 2, 'u' || new.user_id, new.task, '');
+    END""",
+    """CREATE TRIGGER mainapp_search_task_update AFTER UPDATE OF task, user_id ON mainapp_tasks BEGIN
+        UPDATE mainapp_search SET owner = 'u' || new.user_id, title = new.task WHERE rowid = old.id * 2;
+    END""",
+    """CREATE TRIGGER mainapp_search_task_delete AFTER DELETE ON mainapp_tasks BEGIN
+        DELETE FROM mainapp_search WHERE rowid = old.id * 2;
+    END""",
+    """CREATE TRIGGER mainapp_search_event_insert AFTER INSERT ON mainapp_calendarevent BEGIN
+        INSERT INTO mainapp_search (rowid, owner, title, body)
+        VALUES (new.id * 2 + 1, 'u' || new.user_id, new.title, COALESCE(new.description, ''));
+    END""",
+    """CREATE TRIGGER mainapp_search_event_update AFTER UPDATE OF title, description, user_id
+        ON mainapp_calendarevent BEGIN
+        UPDATE mainapp_search SET owner = 'u' || new.user_id, title = new.title,
+            body = COALESCE(new.description, '') WHERE rowid = old.id * 2 + 1;
+    END""",
+    """CREATE TRIGGER mainapp_search_event_delete AFTER DELETE ON mainapp_calendarevent BEGIN
+        DELETE FROM mainapp_search WHERE rowid = old.id * 2 + 1;
+    END""",
+    "INSERT INTO mainapp_search (rowid, owner, title, body) "
+    "SELECT id * 2, 'u' || user_id, task, '' FROM mainapp_tasks",
+    "INSERT INTO mainapp_search (rowid, owner, title, body) "
+    "SELECT id * 2 + 1, 'u' || user_id, title, COALESCE(description, '') FROM mainapp_calendarevent",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER mainapp_search_task_insert",
+    "DROP TRIGGER mainapp_search_task_update",
+    "DROP TRIGGER mainapp_search_task_delete",
+    "DROP TRIGGER mainapp_search_event_insert",
+    "DROP TRIGGER mainapp_search_event_update",
+    "DROP TRIGGER mainapp_search_event_delete",
+    "DROP TABLE mainapp_search",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0012_calendarevent_uid'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_SQL, DROP_SQL),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:12
+
+from importlib import import_module
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# SQLite rebuilds a table to drop a foreign key constraint, which drops its
+# triggers too; put the search index triggers back after the rebuilds.
+SEARCH_TRIGGERS_SQL = import_module('mainapp.migrations.0013_search_index').CREATE_SQL[1:7]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0013_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunSQL(migrations.RunSQL.noop, SEARCH_TRIGGERS_SQL),
+        migrations.AlterField(
+            model_name='archivedtask',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='archived_tasks', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='calendarevent',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='calendar_events', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='changelogentry',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='changes', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='tasks',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='tasks', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='taskstats',
+            name='user',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='task_stats', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='user',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='profile', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.CreateModel(
+            name='UserShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alias', models.CharField(max_length=100)),
+                ('placed_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='shard', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunSQL(SEARCH_TRIGGERS_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:36
+
+import mainapp.sharding
+from django.db import migrations
+
+# The column stays the same; only how Django picks new ids changes, so
+# leave the tables alone rather than have SQLite rebuild them.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0014_sharding'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AlterField(
+                model_name='archivedtask',
+                name='id',
+                field=mainapp.sharding.ShardAutoField(primary_key=True, serialize=False, verbose_name='ID'),
+            ),
+            migrations.AlterField(
+                model_name='calendarevent',
+                name='id',
+                field=mainapp.sharding.ShardAutoField(primary_key=True, serialize=False, verbose_name='ID'),
+            ),
+            migrations.AlterField(
+                model_name='changelogentry',
+                name='id',
+                field=mainapp.sharding.ShardAutoField(primary_key=True, serialize=False, verbose_name='ID'),
+            ),
+            migrations.AlterField(
+                model_name='tasks',
+                name='id',
+                field=mainapp.sharding.ShardAutoField(primary_key=True, serialize=False, verbose_name='ID'),
+            ),
+            migrations.AlterField(
+                model_name='taskstats',
+                name='id',
+                field=mainapp.sharding.ShardAutoField(primary_key=True, serialize=False, verbose_name='ID'),
+            ),
+            migrations.AlterField(
+                model_name='userprofile',
+                name='id',
+                field=mainapp.sharding.ShardAutoField(primary_key=True, serialize=False, verbose_name='ID'),
+            ),
+        ]),
+    ]
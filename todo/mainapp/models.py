@@ -1,38 +1,327 @@
-from django.db import models
+from django.db import DEFAULT_DB_ALIAS, models, transaction
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver  # Add this import
+from django.utils import timezone
+from .photos import photo_name
+from .avatars import avatar_url
+from .live import publish_change
+from .recurrence import forget_series, series_end
+from .db import write_transaction
+from .sharding import ShardAutoField, current_db, db_for_user, delete_user_rows, home_shard, shard_aliases
+
+# Pending tasks are ranked with gaps between neighbours so that moving one
+# task only rewrites that task's row. When two neighbours run out of room the
+# user's list is rebalanced back to evenly spaced ranks.
+ORDER_GAP = 1 << 16
+
 
 class Tasks(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tasks')
+    id = ShardAutoField(primary_key=True, verbose_name='ID')
+    # No database constraint on the user: with shards, auth_user lives elsewhere
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tasks', db_constraint=False)
     task = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
-    order_field = models.PositiveIntegerField(default=0)
+    order_field = models.PositiveBigIntegerField(default=0)
     completed = models.BooleanField(default=False)  # Add this field
     completed_at = models.DateTimeField(null=True, blank=True)  # Add this field
 
     class Meta:
         ordering = ['completed', 'order_field']  # Show pending first
+        indexes = [
+            # Todo list pending section and Tasks.next_order(). Partial, because
+            # completed=False is emitted as NOT "completed", which a plain
+            # (user, completed, order_field) index can't seek on.
+            models.Index(fields=['user', 'order_field'], condition=models.Q(completed=False),
+                         name='tasks_user_pending_idx'),
+            # Todo list completed section
+            models.Index(fields=['user', '-completed_at'], condition=models.Q(completed=True),
+                         name='tasks_user_done_idx'),
+            # Dashboard recent and today queries
+            models.Index(fields=['user', 'created_at'], name='tasks_user_created_idx'),
+        ]
 
     def __str__(self):
         return self.task
 
     def save(self, *args, **kwargs):
         if not self.pk:  # New task
-            max_order = Tasks.objects.filter(user=self.user, completed=False).aggregate(
-                models.Max('order_field'))['order_field__max']
-            self.order_field = (max_order or 0) + 1
+            self.order_field = Tasks.next_order(self.user)
         super().save(*args, **kwargs)
 
+    @staticmethod
+    def next_order(user):
+        """Rank that places a task after every pending task of the user"""
+        max_order = Tasks.objects.filter(user=user, completed=False).aggregate(
+            models.Max('order_field'))['order_field__max']
+        return (max_order or 0) + ORDER_GAP
+
+    @staticmethod
+    def apply_order(user, task_ids):
+        """Make the pending tasks follow ``task_ids`` rewriting as few rows as possible.
+
+        Returns the number of rows written.
+        """
+        ranks = dict(Tasks.objects.filter(user=user, completed=False, id__in=task_ids)
+                     .values_list('id', 'order_field'))
+        if len(ranks) != len(task_ids):
+            raise Tasks.DoesNotExist('Unknown task in order')
+        return Tasks._write_ranks(user, _plan_order(ranks, task_ids))
+
+    @staticmethod
+    def apply_moves(user, moves):
+        """Apply ``(task_id, after_id)`` moves to the user's pending list.
+
+        ``after_id`` is the task the moved task should sit right after, or
+        ``None`` to move it to the top. Moves are applied in the given order.
+        Returns the number of rows written.
+        """
+        ranks = dict(Tasks.objects.filter(user=user, completed=False)
+                     .order_by('order_field', 'id').values_list('id', 'order_field'))
+        task_ids = list(ranks)
+        for task_id, after_id in moves:
+            if task_id not in ranks or (after_id is not None and after_id not in ranks):
+                raise Tasks.DoesNotExist('Unknown task in move')
+            if task_id == after_id:
+                continue
+            task_ids.remove(task_id)
+            position = 0 if after_id is None else task_ids.index(after_id) + 1
+            task_ids.insert(position, task_id)
+        return Tasks._write_ranks(user, _plan_order(ranks, task_ids))
+
+    @staticmethod
+    def _write_ranks(user, new_ranks):
+        tasks = [Tasks(id=task_id, order_field=order) for task_id, order in new_ranks.items()]
+        if tasks:
+            Tasks.objects.bulk_update(tasks, ['order_field'])
+            ChangeLogEntry.record_many(user.pk, 'task', new_ranks)
+        return len(tasks)
+
+    @property
+    def created_today(self):
+        return timezone.localdate(self.created_at) == timezone.localdate()
+
+    @staticmethod
+    @write_transaction
+    def add(user, text):
+        """Create a pending task at the end of the list and count it"""
+        task = Tasks.objects.create(user=user, task=text)
+        TaskStats.track(user, total=1, today=1)
+        return task
+
+    def mark_done(self):
+        if self.completed:
+            return
+        self.completed = True
+        self.completed_at = timezone.now()
+        with transaction.atomic(using=self._state.db):
+            self.save(update_fields=['completed', 'completed_at'])
+            TaskStats.track(self.user, completed=1, today=-1 if self.created_today else 0)
+
+    def mark_pending(self):
+        """Undo completion, putting the task back at the end of pending tasks"""
+        if not self.completed:
+            return
+        self.completed = False
+        self.completed_at = None
+        self.order_field = Tasks.next_order(self.user)
+        with transaction.atomic(using=self._state.db):
+            self.save(update_fields=['completed', 'completed_at', 'order_field'])
+            TaskStats.track(self.user, completed=-1, today=1 if self.created_today else 0)
+
+    def remove(self):
+        """Delete the task and uncount it"""
+        with transaction.atomic(using=self._state.db):
+            self.delete()
+            TaskStats.track(self.user, total=-1, completed=-1 if self.completed else 0,
+                            today=-1 if not self.completed and self.created_today else 0)
+
+
+def _plan_order(ranks, task_ids):
+    """New ranks that make ``task_ids`` sorted, keyed by the tasks that change.
+
+    The tasks whose current ranks already increase along the new order (the
+    longest such run) keep their rank; only the others get a midpoint rank
+    between their neighbours. If there is no room left between two neighbours
+    the whole list is rebalanced to evenly spaced ranks.
+    """
+    current = [ranks[task_id] for task_id in task_ids]
+    keep = _longest_increasing_run(current)
+
+    new_ranks = {}
+    index = 0
+    while index < len(task_ids):
+        if index in keep:
+            index += 1
+            continue
+        # Re-rank the block of moved tasks between two kept neighbours
+        start = index
+        while index < len(task_ids) and index not in keep:
+            index += 1
+        low = current[start - 1] if start > 0 else 0
+        if index < len(task_ids):
+            high = current[index]
+        else:
+            high = max(ranks.values()) + ORDER_GAP * (index - start + 1)
+        step = (high - low) // (index - start + 1)
+        if step < 1:
+            return {task_id: position * ORDER_GAP
+                    for position, task_id in enumerate(task_ids, start=1)}
+        for offset, position in enumerate(range(start, index), start=1):
+            new_ranks[task_ids[position]] = low + step * offset
+            current[position] = low + step * offset
+    return new_ranks
+
+
+def _longest_increasing_run(values):
+    """Indexes of one longest strictly increasing subsequence of ``values``"""
+    tails = []  # index into values of the smallest tail per subsequence length
+    previous = [-1] * len(values)
+    for index, value in enumerate(values):
+        low, high = 0, len(tails)
+        while low < high:
+            middle = (low + high) // 2
+            if values[tails[middle]] < value:
+                low = middle + 1
+            else:
+                high = middle
+        if low > 0:
+            previous[index] = tails[low - 1]
+        if low == len(tails):
+            tails.append(index)
+        else:
+            tails[low] = index
+
+    keep = set()
+    index = tails[-1] if tails else -1
+    while index != -1:
+        keep.add(index)
+        index = previous[index]
+    return keep
+
+# Completed tasks moved out of the hot Tasks table by the archive_tasks command
+class ArchivedTask(models.Model):
+    id = ShardAutoField(primary_key=True, verbose_name='ID')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_tasks',
+                             db_constraint=False)
+    task = models.TextField()
+    created_at = models.DateTimeField()
+    completed_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-completed_at', '-id']
+        indexes = [
+            models.Index(fields=['user', '-completed_at'], name='archived_user_done_idx'),
+        ]
+
+    def __str__(self):
+        return self.task
+
+    @staticmethod
+    def archive(task_ids):
+        """Move the given completed tasks into the archive in one transaction.
+
+        Returns the number of tasks moved. The dashboard counters are left
+        alone: archived tasks still count as completed.
+        """
+        with transaction.atomic(using=current_db()):
+            tasks = list(Tasks.objects.select_for_update()
+                         .filter(id__in=task_ids, completed=True, completed_at__isnull=False)
+                         .only('id', 'user_id', 'task', 'created_at', 'completed_at'))
+            ArchivedTask.objects.bulk_create([
+                ArchivedTask(user_id=task.user_id, task=task.task,
+                             created_at=task.created_at, completed_at=task.completed_at)
+                for task in tasks
+            ])
+            Tasks.objects.filter(id__in=[task.id for task in tasks]).delete()
+        return len(tasks)
+
+
+# Denormalized per-user task counters read by the dashboard
+class TaskStats(models.Model):
+    id = ShardAutoField(primary_key=True, verbose_name='ID')
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='task_stats',
+                                db_constraint=False)
+    total = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    # Pending tasks created on today_date; stale once the date rolls over
+    today_date = models.DateField(null=True, blank=True)
+    today_pending = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user.username}'s Task Stats"
+
+    @property
+    def pending(self):
+        return self.total - self.completed
+
+    @property
+    def today(self):
+        return self.today_pending if self.today_date == timezone.localdate() else 0
+
+    @staticmethod
+    def for_user(user):
+        """The user's counters, computed from their tasks the first time"""
+        stats, created = TaskStats.objects.get_or_create(user=user)
+        if created:
+            stats = TaskStats.recompute(user)
+        return stats
+
+    @staticmethod
+    def count(user):
+        """Counter values recounted from the user's tasks, without saving"""
+        today_start = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        counts = Tasks.objects.filter(user=user).aggregate(
+            total=models.Count('id'),
+            done=models.Count('id', filter=models.Q(completed=True)),
+            today_pending=models.Count('id', filter=models.Q(completed=False, created_at__gte=today_start)),
+        )
+        # Archived tasks still count as completed ones
+        archived = ArchivedTask.objects.filter(user=user).count()
+        counts['total'] += archived
+        counts['completed'] = counts.pop('done') + archived
+        return counts
+
+    @staticmethod
+    def recompute(user):
+        """Recount the user's tasks and store the result"""
+        stats, created = TaskStats.objects.update_or_create(
+            user=user, defaults=dict(TaskStats.count(user), today_date=timezone.localdate()))
+        return stats
+
+    @staticmethod
+    def track(user, total=0, completed=0, today=0):
+        """Apply counter deltas in one UPDATE; call inside the task write's transaction.
+
+        ``today`` is the change in pending tasks created today.
+        """
+        current_day = timezone.localdate()
+        updated = TaskStats.objects.filter(user=user).update(
+            total=models.F('total') + total,
+            completed=models.F('completed') + completed,
+            today_pending=models.Case(
+                models.When(today_date=current_day, then=models.F('today_pending') + today),
+                default=models.Value(max(today, 0)),
+            ),
+            today_date=current_day,
+        )
+        if not updated:
+            # First write for this user: count everything, including this change
+            TaskStats.recompute(user)
+
+
 # New Model for Calendar Events
 class CalendarEvent(models.Model):
+    id = ShardAutoField(primary_key=True, verbose_name='ID')
     PRIORITY_CHOICES = [
         ('low', 'Low'),
         ('medium', 'Medium'),
         ('high', 'High'),
     ]
     
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='calendar_events')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='calendar_events',
+                             db_constraint=False)
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True, null=True)
     start_date = models.DateField()
@@ -41,18 +330,39 @@ class CalendarEvent(models.Model):
     end_time = models.TimeField(null=True, blank=True)
     priority = models.CharField(max_length=10, choices=PRIORITY_CHOICES, default='medium')
     all_day = models.BooleanField(default=False)
+    # Recurring series (see recurrence.py); the occurrences are not stored
+    rrule = models.CharField(max_length=200, blank=True)
+    exdates = models.JSONField(default=list, blank=True)
+    # Last day any occurrence covers; None for one-off and endless events
+    recurrence_end = models.DateField(null=True, blank=True)
+    # iCalendar UID of an imported event (see ical.py); blank otherwise
+    uid = models.CharField(max_length=255, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['start_date', 'start_time']
+        indexes = [
+            # Calendar feed: overlap query on the visible window
+            models.Index(fields=['user', 'start_date', 'end_date'], name='calevent_user_window_idx'),
+        ]
+        constraints = [
+            # Import dedupes on UID; the unique index also serves that lookup
+            models.UniqueConstraint(fields=['user', 'uid'], condition=~models.Q(uid=''),
+                                    name='calevent_user_uid_uniq'),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.start_date}"
 
+    def save(self, *args, **kwargs):
+        self.recurrence_end = series_end(self) if self.rrule else None
+        super().save(*args, **kwargs)
+
 # New Model for User Profile
 class UserProfile(models.Model):
-    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
+    id = ShardAutoField(primary_key=True, verbose_name='ID')
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile', db_constraint=False)
     profile_photo = models.ImageField(upload_to='profile_photos/', null=True, blank=True)
     bio = models.TextField(max_length=500, blank=True)
     phone = models.CharField(max_length=15, blank=True)
@@ -60,23 +370,136 @@ class UserProfile(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Fields whose changes make save() write; anything else is left alone
+    TRACKED_FIELDS = ('profile_photo', 'bio', 'phone', 'date_of_birth')
+
     def __str__(self):
         return f"{self.user.username}'s Profile"
 
-    def get_profile_photo_url(self):
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_values = instance._snapshot()
+        return instance
+
+    def _snapshot(self):
+        return {name: self._meta.get_field(name).get_prep_value(
+                    self._meta.get_field(name).value_from_object(self))
+                for name in self.TRACKED_FIELDS}
+
+    def changed_fields(self):
+        """Tracked fields that differ from what was loaded from the database"""
+        saved = getattr(self, '_saved_values', None)
+        if saved is None:
+            return list(self.TRACKED_FIELDS)
+        current = self._snapshot()
+        return [name for name in self.TRACKED_FIELDS if current[name] != saved[name]]
+
+    def save(self, *args, **kwargs):
+        """Write only the fields that changed, and nothing if none did"""
+        if not self._state.adding and 'update_fields' not in kwargs:
+            changed = self.changed_fields()
+            if not changed:
+                return
+            kwargs['update_fields'] = changed + ['updated_at']
+        super().save(*args, **kwargs)
+        self._saved_values = self._snapshot()
+
+    @staticmethod
+    def for_user(user):
+        """The user's profile, created on first use; safe to call concurrently"""
+        profile, created = UserProfile.objects.get_or_create(user=user)
+        return profile
+
+    def get_profile_photo_srcset(self):
+        return f"{self.get_profile_photo_url('medium')} 1x, {self.get_profile_photo_url('large')} 2x"
+
+    def get_profile_photo_url(self, size='medium'):
+        """URL of the photo rendition for ``size`` (a key of photos.PHOTO_SIZES)"""
         if self.profile_photo:
-            return self.profile_photo.url
-        return "https://via.placeholder.com/150x150/3273dc/fff?text=" + self.user.username[:2].upper()
+            name = photo_name(self.profile_photo.name, size)
+            # Photos uploaded before processing existed only have the original
+            return self.profile_photo.storage.url(name) if name else self.profile_photo.url
+        return avatar_url(self.user.username)
 
-# Signal to create profile when user is created
-@receiver(post_save, sender=User)
-def create_user_profile(sender, instance, created, **kwargs):
-    if created:
-        UserProfile.objects.create(user=instance)
+# Per-user feed of task and event changes, read by the delta-sync API
+class ChangeLogEntry(models.Model):
+    id = ShardAutoField(primary_key=True, verbose_name='ID')
+    KIND_CHOICES = [
+        ('task', 'Task'),
+        ('event', 'Calendar event'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='changes', db_constraint=False)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)  # Tombstone
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['user', 'id'], name='changelog_user_cursor_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} {'deleted' if self.deleted else 'changed'}"
+
+    @staticmethod
+    def record_many(user_id, kind, object_ids, deleted=False):
+        """Log changes made without model signals (bulk_create, bulk_update)"""
+        ChangeLogEntry.objects.bulk_create([
+            ChangeLogEntry(user_id=user_id, kind=kind, object_id=object_id, deleted=deleted)
+            for object_id in object_ids
+        ])
+        publish_change(user_id, kind, object_ids, deleted)
+
+
+# Users placed on a shard by signup or rebalance_shards (see sharding.py).
+# Kept on 'default'; users without a row have their data there too.
+class UserShard(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='shard')
+    alias = models.CharField(max_length=100)
+    placed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id} on {self.alias}"
+
+
+CHANGE_KINDS = {Tasks: 'task', CalendarEvent: 'event'}
+
+# Every write to these models goes into the change feed, which also makes
+# the user's cached pages stale (see page_cache.py)
+@receiver(post_save, sender=Tasks)
+@receiver(post_delete, sender=Tasks)
+@receiver(post_save, sender=CalendarEvent)
+@receiver(post_delete, sender=CalendarEvent)
+def record_user_change(sender, instance, using, **kwargs):
+    deleted = 'created' not in kwargs
+    ChangeLogEntry.objects.using(using).create(user_id=instance.user_id, kind=CHANGE_KINDS[sender],
+                                  object_id=instance.pk, deleted=deleted)
+    publish_change(instance.user_id, CHANGE_KINDS[sender], [instance.pk], deleted)
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    if hasattr(instance, 'profile'):
-        instance.profile.save()
-    else:
-        UserProfile.objects.create(user=instance)
\ No newline at end of file
+def place_new_user(sender, instance, created, **kwargs):
+    # New users go straight to their home shard
+    if created and len(shard_aliases()) > 1:
+        UserShard.objects.create(user=instance, alias=home_shard(instance.pk))
+
+@receiver(pre_delete, sender=User)
+def note_user_shard(sender, instance, **kwargs):
+    instance._shard = db_for_user(instance)
+
+@receiver(post_delete, sender=User)
+def delete_sharded_user_data(sender, instance, using, **kwargs):
+    # Deleting a user only cascades on 'default'; their data on another
+    # shard goes once the deletion is committed
+    user_id, alias = instance.pk, getattr(instance, '_shard', DEFAULT_DB_ALIAS)
+    if alias != DEFAULT_DB_ALIAS:
+        transaction.on_commit(lambda: delete_user_rows(user_id, alias), using=using)
+
+# Drop the cached occurrences of an edited or deleted series
+@receiver(post_save, sender=CalendarEvent)
+@receiver(post_delete, sender=CalendarEvent)
+def forget_expanded_series(sender, instance, **kwargs):
+    forget_series(instance.pk)
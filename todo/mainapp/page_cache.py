@@ -0,0 +1,61 @@
+"""Per-user cache of rendered pages, invalidated by a data version.
+
+Every write to a user's tasks or events adds an entry to their change feed,
+so the id of the newest entry is a data version that every worker process
+reads from the database alike; a version kept in the cache itself would be
+per process with the default local memory cache. A cached page is only
+served while nothing it shows has changed.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Max
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+
+PAGE_CACHE_TIMEOUT = getattr(settings, 'PAGE_CACHE_TIMEOUT', 60 * 60)
+
+# Hit/miss counters for this process
+stats = {'hits': 0, 'misses': 0}
+
+
+def page_cache():
+    return caches[getattr(settings, 'PAGE_CACHE_ALIAS', 'default')]
+
+
+def data_version(user_id):
+    """Id of the user's newest change feed entry (one lookup on the (user, id) index)"""
+    from .models import ChangeLogEntry
+
+    return ChangeLogEntry.objects.filter(user_id=user_id).aggregate(latest=Max('id'))['latest'] or 0
+
+
+def cached_page(request, name, render_page, *key_parts):
+    """Serve the user's cached ``name`` page, or render and cache it.
+
+    ``render_page`` is called without arguments on a miss and must return the
+    response. ``key_parts`` are anything else the page depends on, such as
+    the current date. The CSRF secret is part of the key because the page
+    embeds tokens derived from it, and so is the user's name, which pages
+    show but the change feed does not track.
+    """
+    get_token(request)
+    csrf_secret = request.META.get('CSRF_COOKIE', '')
+    user = request.user
+    variant = hashlib.sha256('|'.join(
+        [csrf_secret, user.get_full_name(), user.username, *map(str, key_parts)]).encode()).hexdigest()[:16]
+
+    cache = page_cache()
+    page_key = f'page:{name}:{user.pk}:{variant}'
+    version = data_version(user.pk)
+    cached = cache.get(page_key)
+    if cached is not None and cached[0] == version:
+        stats['hits'] += 1
+        return HttpResponse(cached[1])
+
+    stats['misses'] += 1
+    response = render_page()
+    if response.status_code == 200:
+        cache.set(page_key, (version, response.content), PAGE_CACHE_TIMEOUT)
+    return response
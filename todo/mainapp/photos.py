@@ -0,0 +1,78 @@
+"""Profile photo processing: normalize uploads into fixed-size WebP renditions.
+
+Every upload is decoded once, rotated upright, cropped square and saved in
+each of PHOTO_SIZES without its EXIF data. File names carry a hash of the
+content, so a URL never changes meaning and can be cached forever.
+"""
+import hashlib
+import io
+import re
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+PHOTO_DIR = 'profile_photos'
+PHOTO_SIZES = {'small': 48, 'medium': 150, 'large': 300}
+PHOTO_QUALITY = 82
+# Larger images are refused rather than decoded; JPEGs are measured after
+# the decoder's downscaling, so big camera photos still fit
+MAX_PHOTO_PIXELS = 4096 * 4096
+
+# profile_photos/<hash>-<pixels>.webp
+HASHED_NAME = re.compile(r'^(?P<base>.+/[0-9a-f]{16})-(?P<pixels>\d+)\.webp$')
+
+
+def save_profile_photo(upload):
+    """Store every rendition of ``upload`` and return the largest one's name.
+
+    Raises ValueError if the upload is not an image Pillow can read, or is
+    too large to decode.
+    """
+    data = upload.read()
+    digest = hashlib.sha256(data).hexdigest()[:16]
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        largest = max(PHOTO_SIZES.values())
+        # Let the JPEG decoder downscale while decoding, much cheaper than a resize
+        image.draft('RGB', (largest * 2, largest * 2))
+        if image.width * image.height > MAX_PHOTO_PIXELS:
+            raise ValueError('Image is too large')
+        image = ImageOps.exif_transpose(image)
+    except Image.DecompressionBombError as e:
+        raise ValueError('Image is too large') from e
+    except (UnidentifiedImageError, OSError) as e:
+        raise ValueError('Not a valid image') from e
+    image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+
+    name = None
+    for pixels in sorted(PHOTO_SIZES.values()):
+        name = f'{PHOTO_DIR}/{digest}-{pixels}.webp'
+        if default_storage.exists(name):
+            continue  # Same upload seen before
+        rendition = ImageOps.fit(image, (pixels, pixels), Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        rendition.save(buffer, 'WEBP', quality=PHOTO_QUALITY, method=6)
+        default_storage.save(name, ContentFile(buffer.getvalue()))
+    return name
+
+
+def photo_name(name, size):
+    """Name of the ``size`` rendition of a stored photo, or None for raw uploads"""
+    match = HASHED_NAME.match(name)
+    if not match:
+        return None
+    return f"{match['base']}-{PHOTO_SIZES[size]}.webp"
+
+
+def delete_profile_photo(name):
+    """Remove every rendition of a stored photo"""
+    for size in PHOTO_SIZES:
+        rendition = photo_name(name, size) or name
+        if default_storage.exists(rendition):
+            default_storage.delete(rendition)
+
+
+def is_hashed_photo(path):
+    return HASHED_NAME.match(path) is not None
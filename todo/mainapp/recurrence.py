@@ -0,0 +1,193 @@
+"""Recurring calendar events: a subset of the iCalendar RRULE.
+
+A series is one CalendarEvent row whose ``rrule`` is set, for example
+``FREQ=WEEKLY;INTERVAL=2;UNTIL=20261231`` or ``FREQ=DAILY;COUNT=10``.
+Supported are FREQ=DAILY/WEEKLY/MONTHLY, INTERVAL, and UNTIL or COUNT;
+the event's ``exdates`` lists skipped occurrence dates.
+
+Occurrences are never stored. They are generated on demand and only within
+the requested window: the first occurrence in it is found arithmetically,
+however far the window is from the series start. Each series keeps its
+parsed rule and the dates of the last window asked for in a small
+per-process cache, which is dropped when the series is saved or deleted.
+"""
+import calendar
+import itertools
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+FREQUENCIES = ('DAILY', 'WEEKLY', 'MONTHLY')
+MAX_COUNT = 1000
+SERIES_CACHE_SIZE = 1024
+
+
+def parse_rrule(rrule):
+    """``(freq, interval, until, count)`` of an RRULE; ValueError if unsupported"""
+    parts = {}
+    for part in rrule.upper().removeprefix('RRULE:').split(';'):
+        name, sep, value = part.partition('=')
+        if not sep:
+            raise ValueError(f'Invalid recurrence rule: {rrule}')
+        parts[name.strip()] = value.strip()
+
+    freq = parts.pop('FREQ', None)
+    if freq not in FREQUENCIES:
+        raise ValueError('Events can repeat daily, weekly or monthly')
+    interval = int(parts.pop('INTERVAL', 1))
+    until = parts.pop('UNTIL', None)
+    if until:
+        until = datetime.strptime(until[:8], '%Y%m%d').date()
+    count = parts.pop('COUNT', None)
+    if count is not None:
+        count = int(count)
+
+    if parts:
+        raise ValueError(f'Unsupported recurrence rule parts: {", ".join(sorted(parts))}')
+    if interval < 1:
+        raise ValueError('Recurrence interval must be at least 1')
+    if count is not None and not 1 <= count <= MAX_COUNT:
+        raise ValueError(f'Recurrence count must be between 1 and {MAX_COUNT}')
+    if until and count:
+        raise ValueError('A recurrence rule can have UNTIL or COUNT, not both')
+    return freq, interval, until, count
+
+
+def format_rrule(freq, interval=1, until=None, count=None):
+    parts = [f'FREQ={freq}']
+    if interval != 1:
+        parts.append(f'INTERVAL={interval}')
+    if until:
+        parts.append(f'UNTIL={until:%Y%m%d}')
+    if count:
+        parts.append(f'COUNT={count}')
+    return ';'.join(parts)
+
+
+def parse_exdates(values):
+    """Sorted, de-duplicated ISO dates; ValueError on anything else"""
+    return sorted({date.fromisoformat(value).isoformat() for value in values})
+
+
+def _candidate_starts(start, freq, interval, first=None):
+    """Start dates of an unbounded series, in order, from around ``first`` on"""
+    if freq == 'MONTHLY':
+        skip = 0
+        if first and first > start:
+            # The period containing ``first``; earlier days in it are left to the caller
+            skip = ((first.year - start.year) * 12 + first.month - start.month) // interval * interval
+        for months in itertools.count(skip, interval):
+            year, month = divmod(start.month - 1 + months, 12)
+            year += start.year
+            if year > date.max.year:
+                return
+            # Months too short for the start day (the 31st ...) are skipped
+            if start.day <= calendar.monthrange(year, month + 1)[1]:
+                yield date(year, month + 1, start.day)
+    else:
+        days = interval * (7 if freq == 'WEEKLY' else 1)
+        try:
+            day = start
+            if first and first > start:
+                day += timedelta(days=-(-(first - start).days // days) * days)
+            while True:
+                yield day
+                day += timedelta(days=days)
+        except OverflowError:
+            return
+
+
+def _series_starts(event):
+    freq, interval, until, count = parse_rrule(event.rrule)
+    starts = _candidate_starts(event.start_date, freq, interval)
+    if count:
+        starts = itertools.islice(starts, count)
+    if until:
+        starts = itertools.takewhile(lambda day: day <= until, starts)
+    return starts
+
+
+def event_span(event):
+    """How many days past its start an occurrence ends"""
+    return (event.end_date - event.start_date) if event.end_date else timedelta(0)
+
+
+def series_end(event):
+    """Last day covered by the series, or None if it never ends"""
+    freq, interval, until, count = parse_rrule(event.rrule)
+    if count:
+        last = None
+        for last in _series_starts(event):
+            pass
+        return last + event_span(event) if last else event.start_date
+    if until:
+        return max(until, event.start_date) + event_span(event)
+    return None
+
+
+class Series:
+    """One series' rule and skipped dates, with the last window it was asked for"""
+
+    def __init__(self, event):
+        self.start = event.start_date
+        self.freq, self.interval, self.until, self.count = parse_rrule(event.rrule)
+        self.skipped = {date.fromisoformat(value) for value in event.exdates}
+        self.window = None
+
+    def starts_from(self, first):
+        """Start dates on or after ``first``, in order"""
+        if self.count:
+            # COUNT numbers occurrences from the series start; there are at most MAX_COUNT
+            starts = itertools.islice(_candidate_starts(self.start, self.freq, self.interval), self.count)
+        else:
+            starts = _candidate_starts(self.start, self.freq, self.interval, first)
+            if self.until:
+                starts = itertools.takewhile(lambda day: day <= self.until, starts)
+        return itertools.dropwhile(lambda day: day < first, starts)
+
+    def between(self, first, last=None):
+        """Start dates from ``first`` to ``last`` (up to MAX_COUNT if open-ended)"""
+        window = self.window
+        if window is not None and window[0] == (first, last):
+            return list(window[1])
+        starts = self.starts_from(first)
+        if last is not None:
+            starts = itertools.takewhile(lambda day: day <= last, starts)
+        days = [day for day in itertools.islice(starts, MAX_COUNT) if day not in self.skipped]
+        self.window = ((first, last), days)
+        return list(days)
+
+
+_series = OrderedDict()
+_series_lock = threading.Lock()
+
+
+def _series_for(event):
+    # The key covers everything expansion reads, so a row edited by another
+    # process is not served from this process's stale copy
+    version = (event.start_date, event.rrule, tuple(event.exdates))
+    with _series_lock:
+        cached = _series.get(event.pk)
+        if cached and cached[0] == version:
+            _series.move_to_end(event.pk)
+            return cached[1]
+    series = Series(event)
+    with _series_lock:
+        _series[event.pk] = (version, series)
+        _series.move_to_end(event.pk)
+        while len(_series) > SERIES_CACHE_SIZE:
+            _series.popitem(last=False)
+    return series
+
+
+def forget_series(event_id):
+    with _series_lock:
+        _series.pop(event_id, None)
+
+
+def occurrences(event, window_start=None, window_end=None):
+    """Start dates of the event's occurrences overlapping the window (end exclusive)"""
+    # An occurrence that starts before the window can still run into it
+    first = window_start - event_span(event) if window_start else event.start_date
+    last = window_end - timedelta(days=1) if window_end else None
+    return _series_for(event).between(first, last)
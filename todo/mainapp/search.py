@@ -0,0 +1,131 @@
+"""Full-text search over tasks and calendar events (SQLite FTS5).
+
+``mainapp_search`` is an FTS5 table with one row per task and per event,
+kept in sync by triggers on both tables (created in migration 0013), so
+bulk_create, bulk_update and queryset deletes are covered too. The rowid
+encodes the source row: ``id * 2`` for a task, ``id * 2 + 1`` for an event.
+The owner is indexed as a token (``u<user id>``), so a query intersects
+with the user's rows inside the index instead of filtering afterwards.
+"""
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils.html import escape
+
+from .models import CalendarEvent, Tasks
+from .sharding import db_for_user
+
+SEARCH_PAGE_SIZE = 20
+TITLE_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+
+# Triggers keeping the index in sync, first created by migration 0013.
+# SQLite drops a table's triggers when a migration rebuilds the table;
+# rebuild_index() puts them back.
+TRIGGERS_SQL = [
+    """CREATE TRIGGER IF NOT EXISTS mainapp_search_task_insert AFTER INSERT ON mainapp_tasks BEGIN
+        INSERT INTO mainapp_search (rowid, owner, title, body)
+        VALUES (new.id * 2, 'u' || new.user_id, new.task, '');
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS mainapp_search_task_update AFTER UPDATE OF task, user_id ON mainapp_tasks BEGIN
+        UPDATE mainapp_search SET owner = 'u' || new.user_id, title = new.task WHERE rowid = old.id * 2;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS mainapp_search_task_delete AFTER DELETE ON mainapp_tasks BEGIN
+        DELETE FROM mainapp_search WHERE rowid = old.id * 2;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS mainapp_search_event_insert AFTER INSERT ON mainapp_calendarevent BEGIN
+        INSERT INTO mainapp_search (rowid, owner, title, body)
+        VALUES (new.id * 2 + 1, 'u' || new.user_id, new.title, COALESCE(new.description, ''));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS mainapp_search_event_update AFTER UPDATE OF title, description, user_id
+        ON mainapp_calendarevent BEGIN
+        UPDATE mainapp_search SET owner = 'u' || new.user_id, title = new.title,
+            body = COALESCE(new.description, '') WHERE rowid = old.id * 2 + 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS mainapp_search_event_delete AFTER DELETE ON mainapp_calendarevent BEGIN
+        DELETE FROM mainapp_search WHERE rowid = old.id * 2 + 1;
+    END""",
+]
+
+REBUILD_SQL = [
+    "DELETE FROM mainapp_search",
+    "INSERT INTO mainapp_search (rowid, owner, title, body) "
+    "SELECT id * 2, 'u' || user_id, task, '' FROM mainapp_tasks",
+    "INSERT INTO mainapp_search (rowid, owner, title, body) "
+    "SELECT id * 2 + 1, 'u' || user_id, title, COALESCE(description, '') FROM mainapp_calendarevent",
+    "INSERT INTO mainapp_search (mainapp_search) VALUES ('optimize')",
+]
+
+# Snippet markers that cannot occur in user text; replaced after escaping
+MARK_START, MARK_END = '\x02', '\x03'
+
+
+def match_expression(query, prefix=False):
+    """FTS5 query matching every word of ``query``, or None if it has none.
+
+    Words are quoted, so FTS5 operators typed by the user are plain text.
+    With ``prefix`` the last word also matches longer words
+    (search-as-you-type).
+    """
+    words = re.findall(r'\w+', query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    if prefix:
+        terms[-1] += '*'
+    return ' AND '.join(terms)
+
+
+def rebuild_index(using=DEFAULT_DB_ALIAS):
+    """Fill the shard's index again from its tasks and events; returns the row count"""
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        for statement in TRIGGERS_SQL + REBUILD_SQL:
+            cursor.execute(statement)
+        cursor.execute("SELECT count(*) FROM mainapp_search")
+        return cursor.fetchone()[0]
+
+
+def search(user, query, prefix=False, page=1):
+    """One page of the user's tasks and events matching ``query``, best first.
+
+    Returns ``(results, has_more)``; each result is a dict with ``kind``
+    (task or event), ``id``, ``title`` and an HTML ``snippet`` with the
+    matches in <mark>.
+    """
+    expression = match_expression(query, prefix)
+    if expression is None:
+        return [], False
+    with connections[db_for_user(user)].cursor() as cursor:
+        cursor.execute(
+            "SELECT rowid, snippet(mainapp_search, 1, %s, %s, '…', 12), "
+            "snippet(mainapp_search, 2, %s, %s, '…', 12) FROM mainapp_search "
+            "WHERE mainapp_search MATCH %s "
+            "ORDER BY bm25(mainapp_search, 0.0, %s, %s) LIMIT %s OFFSET %s",
+            [MARK_START, MARK_END, MARK_START, MARK_END, f'owner:"u{user.pk}" AND ({expression})',
+             TITLE_WEIGHT, BODY_WEIGHT, SEARCH_PAGE_SIZE + 1, (page - 1) * SEARCH_PAGE_SIZE])
+        rows = cursor.fetchall()
+    has_more = len(rows) > SEARCH_PAGE_SIZE
+    rows = rows[:SEARCH_PAGE_SIZE]
+
+    task_ids = [row[0] // 2 for row in rows if row[0] % 2 == 0]
+    event_ids = [row[0] // 2 for row in rows if row[0] % 2 == 1]
+    tasks = Tasks.objects.filter(user=user, id__in=task_ids).only('id', 'task').in_bulk() if task_ids else {}
+    events = (CalendarEvent.objects.filter(user=user, id__in=event_ids).only('id', 'title').in_bulk()
+              if event_ids else {})
+
+    results = []
+    for rowid, title_snippet, body_snippet in rows:
+        # Show the description excerpt when the match is in there
+        snippet = body_snippet if MARK_START in body_snippet else title_snippet
+        if rowid % 2 == 0 and rowid // 2 in tasks:
+            results.append({'kind': 'task', 'id': rowid // 2, 'title': tasks[rowid // 2].task,
+                            'snippet': _marked(snippet)})
+        elif rowid % 2 == 1 and rowid // 2 in events:
+            results.append({'kind': 'event', 'id': rowid // 2, 'title': events[rowid // 2].title,
+                            'snippet': _marked(snippet)})
+    return results, has_more
+
+
+def _marked(snippet):
+    return escape(snippet).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
@@ -0,0 +1,96 @@
+"""Bulk-created sample data for benchmarks and load tests.
+
+Everything is inserted with bulk_create in batches, so seeding bypasses
+model signals: TaskStats are recomputed at the end, and seeded rows do not
+appear in the change feed, so pages cached before seeding stay cached
+(seed fresh databases). Each shard's users are seeded in their own
+transaction.
+"""
+import random
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ORDER_GAP, CalendarEvent, Tasks, TaskStats, UserShard
+from .sharding import home_shard, shard_aliases, users_by_shard, using_shard
+
+SEED_BATCH_SIZE = 2000
+SEED_PASSWORD = 'seed-password'
+
+WORDS = ('call', 'email', 'review', 'plan', 'write', 'fix', 'buy', 'book', 'clean', 'read',
+         'report', 'budget', 'meeting', 'groceries', 'dentist', 'invoice', 'design', 'release')
+
+
+def _text(rng, words=4):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def seed_users(count, prefix='seed'):
+    """``count`` users named ``<prefix>-<n>``, created if missing; all share SEED_PASSWORD"""
+    names = [f'{prefix}-{number}' for number in range(count)]
+    existing = set(User.objects.filter(username__in=names).values_list('username', flat=True))
+    password = make_password(SEED_PASSWORD)  # Hashing is slow; do it once
+    User.objects.bulk_create([User(username=name, password=password)
+                              for name in names if name not in existing],
+                             batch_size=SEED_BATCH_SIZE)
+    users = list(User.objects.filter(username__in=names).order_by('id'))
+    if len(shard_aliases()) > 1:
+        # bulk_create skips the signal that places new users
+        UserShard.objects.bulk_create([UserShard(user=user, alias=home_shard(user.pk))
+                                       for user in users if user.username not in existing],
+                                      ignore_conflicts=True)
+    return users
+
+
+def seed_tasks(users, per_user, completed_ratio=0.3, seed=0):
+    """Give every user ``per_user`` more tasks, about ``completed_ratio`` of them done"""
+    rng = random.Random(seed)
+    now = timezone.now()
+    for alias, shard_users in users_by_shard(users).items():
+        with using_shard(alias), transaction.atomic(using=alias):
+            _seed_tasks(rng, now, shard_users, per_user, completed_ratio)
+
+
+def _seed_tasks(rng, now, users, per_user, completed_ratio):
+    batch = []
+    for user in users:
+        order = Tasks.next_order(user)
+        for _ in range(per_user):
+            completed = rng.random() < completed_ratio
+            batch.append(Tasks(
+                user=user, task=_text(rng), completed=completed, order_field=order,
+                completed_at=now - timedelta(minutes=rng.randrange(60 * 24 * 365)) if completed else None))
+            order += ORDER_GAP
+            if len(batch) >= SEED_BATCH_SIZE:
+                Tasks.objects.bulk_create(batch)
+                batch = []
+    Tasks.objects.bulk_create(batch)
+    for user in users:
+        TaskStats.recompute(user)
+
+
+def seed_events(users, per_user, start=None, seed=0):
+    """Give every user ``per_user`` more events spread over the year from ``start``"""
+    rng = random.Random(seed)
+    start = start or date(timezone.localdate().year, 1, 1)
+    for alias, shard_users in users_by_shard(users).items():
+        with using_shard(alias), transaction.atomic(using=alias):
+            _seed_events(rng, start, shard_users, per_user)
+
+
+def _seed_events(rng, start, users, per_user):
+    batch = []
+    for user in users:
+        for _ in range(per_user):
+            day = start + timedelta(days=rng.randrange(365))
+            batch.append(CalendarEvent(
+                user=user, title=_text(rng, 3), description=_text(rng, 8), start_date=day,
+                end_date=day + timedelta(days=rng.choice((0, 0, 0, 1, 2))),
+                all_day=True, priority=rng.choice(('low', 'medium', 'high'))))
+            if len(batch) >= SEED_BATCH_SIZE:
+                CalendarEvent.objects.bulk_create(batch)
+                batch = []
+    CalendarEvent.objects.bulk_create(batch)
@@ -0,0 +1,344 @@
+"""Per-user database shards.
+
+settings.DATABASE_SHARDS lists the database aliases that hold user data;
+the first is 'default', which also keeps the central tables (auth, sessions,
+the UserShard placements). Each user's tasks, events, profile, counters,
+archive and change feed live together on one shard.
+
+A user's home shard is a stable hash of their id. New users are placed on
+it when they sign up; users created before sharding was turned on have no
+placement and stay on 'default' until rebalance_shards moves them.
+
+Queries have no user to route on, so the shard comes from context: the
+middleware sets the request user's shard for the whole request, and
+commands wrap per-user work in user_shard() or per-shard work in
+using_shard(). Saving or deleting a loaded object uses the shard it came
+from. Outside any context, sharded queries go to 'default'.
+
+Every shard hands out primary keys from its own range (SHARD_ID_RANGE
+apart), so rows keep their ids when a user is moved between shards. The
+change feed is the exception: its ids are the clients' cursors and must
+keep growing on the new shard, so moved entries are numbered afresh there.
+"""
+import zlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, models, router, transaction
+from django.db.models.signals import pre_save
+
+SHARDED_MODELS = frozenset({
+    'mainapp.tasks', 'mainapp.archivedtask', 'mainapp.taskstats',
+    'mainapp.calendarevent', 'mainapp.userprofile', 'mainapp.changelogentry',
+})
+SHARD_ID_RANGE = 1 << 40
+MOVE_BATCH_SIZE = 2000
+
+# (user id or None, alias) of the shard queries run against
+_current = ContextVar('shard', default=None)
+
+
+def shard_aliases():
+    return list(getattr(settings, 'DATABASE_SHARDS', [DEFAULT_DB_ALIAS]))
+
+
+def is_sharded(model):
+    """Whether the model (or an instance of it) lives on the user shards"""
+    return model._meta.label_lower in SHARDED_MODELS
+
+
+def home_shard(user_id):
+    """Shard the user belongs on, by a hash that is the same in every process"""
+    shards = shard_aliases()
+    return shards[zlib.crc32(str(user_id).encode()) % len(shards)]
+
+
+def db_for_user(user):
+    """Alias of the shard that holds the user's data"""
+    from .models import UserShard
+
+    user_id = getattr(user, 'pk', user)
+    current = _current.get()
+    if current is not None and current[0] == user_id:
+        return current[1]
+    if len(shard_aliases()) == 1:
+        return DEFAULT_DB_ALIAS
+    alias = (UserShard.objects.filter(user_id=user_id)
+             .values_list('alias', flat=True).first())
+    return alias or DEFAULT_DB_ALIAS
+
+
+def users_by_shard(users):
+    """The users grouped by the alias of their shard"""
+    from .models import UserShard
+
+    placed = {}
+    if len(shard_aliases()) > 1:
+        for start in range(0, len(users), 500):
+            placed.update(UserShard.objects.filter(user_id__in=[user.pk for user in users[start:start + 500]])
+                          .values_list('user_id', 'alias'))
+    groups = {}
+    for user in users:
+        groups.setdefault(placed.get(user.pk, DEFAULT_DB_ALIAS), []).append(user)
+    return groups
+
+
+def current_db():
+    """Shard of the current context, for transactions and on_commit hooks"""
+    current = _current.get()
+    return current[1] if current is not None else DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def user_shard(user):
+    """Run the block's sharded queries on the user's shard"""
+    user_id = getattr(user, 'pk', user)
+    token = _current.set((user_id, db_for_user(user_id)))
+    try:
+        yield _current.get()[1]
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def using_shard(alias):
+    """Run the block's sharded queries on ``alias``, for work across users"""
+    token = _current.set((None, alias))
+    try:
+        yield alias
+    finally:
+        _current.reset(token)
+
+
+class UserShardRouter:
+    """Sends sharded models to the current shard and everything else to 'default'"""
+
+    def _db(self, model, hints):
+        if not is_sharded(model):
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is not None:
+            if instance._state.db and is_sharded(instance):
+                return instance._state.db
+            # A related manager of the user, or a new row being tied to one
+            user_id = instance.pk if not is_sharded(instance) else instance.user_id
+            if user_id is not None:
+                return db_for_user(user_id)
+        return current_db()
+
+    def db_for_read(self, model, **hints):
+        return self._db(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._db(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Sharded rows point at central users across databases
+        if is_sharded(obj1) != is_sharded(obj2):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db not in shard_aliases():
+            return None
+        if model_name is not None:
+            if f'{app_label}.{model_name}' in SHARDED_MODELS:
+                return True
+        elif app_label == 'mainapp':
+            # RunSQL and RunPython: the search index and data fixes for sharded tables
+            return True
+        return db == DEFAULT_DB_ALIAS
+
+
+def _sharded_tables():
+    from django.apps import apps
+
+    for label in sorted(SHARDED_MODELS):
+        meta = apps.get_model(label)._meta
+        yield meta.db_table, [field.column for field in meta.concrete_fields]
+
+
+def shard_floor(alias):
+    """The id just below every id allocated on ``alias``"""
+    return shard_aliases().index(alias) * SHARD_ID_RANGE
+
+
+def reset_sequences(cursor, alias):
+    """Give each sharded table a sequence inside the shard's own range.
+
+    A sequence outside it (set before sharding, or by an older move) is
+    moved to the highest id in the range.
+    """
+    floor = shard_floor(alias)
+    for table, columns in _sharded_tables():
+        cursor.execute('INSERT INTO sqlite_sequence (name, seq) SELECT %s, %s '
+                       'WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = %s)',
+                       [table, floor, table])
+        cursor.execute(f'UPDATE sqlite_sequence SET seq = (SELECT coalesce(max(id), %s) FROM {table} '
+                       f'WHERE id >= %s AND id < %s) WHERE name = %s AND (seq < %s OR seq >= %s)',
+                       [floor, floor, floor + SHARD_ID_RANGE, table, floor, floor + SHARD_ID_RANGE])
+
+
+def reserve_id_ranges(using, **kwargs):
+    """Keep each sharded table's sequence inside the shard's range (post_migrate)"""
+    shards = shard_aliases()
+    if using not in shards or len(shards) == 1:
+        return
+    with connections[using].cursor() as cursor:
+        reset_sequences(cursor, using)
+
+
+def next_id(alias, table):
+    """Take the next id of ``table`` from the shard's sequence"""
+    with connections[alias].cursor() as cursor:
+        cursor.execute('UPDATE sqlite_sequence SET seq = seq + 1 WHERE name = %s RETURNING seq', [table])
+        row = cursor.fetchone()
+        if row is None:
+            # Shards not migrated since sharding was turned on
+            reset_sequences(cursor, alias)
+            cursor.execute('UPDATE sqlite_sequence SET seq = seq + 1 WHERE name = %s RETURNING seq', [table])
+            row = cursor.fetchone()
+    return row[0]
+
+
+class ShardAutoField(models.BigAutoField):
+    """Primary key of sharded models.
+
+    With several shards, ids are taken from the shard's own sequence before
+    the insert rather than left to SQLite, which numbers new rows after the
+    largest id in the table, including ids of rows moved in from other
+    shards. In a transaction (write_transaction) the sequence and the row
+    are written under the same lock, so ids still follow commit order.
+    """
+
+    def contribute_to_class(self, cls, name, **kwargs):
+        super().contribute_to_class(cls, name, **kwargs)
+        # pre_save is told the database save() writes to
+        pre_save.connect(self.take_id, sender=cls, weak=False)
+
+    def has_default(self):
+        # save() then inserts straight away instead of trying an UPDATE first
+        return len(shard_aliases()) > 1
+
+    def get_default(self):
+        return None
+
+    def take_id(self, sender, instance, using, **kwargs):
+        if instance.pk is None and len(shard_aliases()) > 1:
+            instance.pk = next_id(using, sender._meta.db_table)
+
+    def get_pk_value_on_save(self, instance):
+        # Reached from bulk_create, which writes to the router's choice
+        if len(shard_aliases()) == 1:
+            return None
+        return next_id(router.db_for_write(type(instance)), instance._meta.db_table)
+
+
+def count_user_rows(user_id, alias):
+    """Rows of the user's data on ``alias``"""
+    count = 0
+    with connections[alias].cursor() as cursor:
+        for table, columns in _sharded_tables():
+            cursor.execute(f'SELECT count(*) FROM {table} WHERE user_id = %s', [user_id])
+            count += cursor.fetchone()[0]
+    return count
+
+
+def delete_user_rows(user_id, alias):
+    """Delete all of the user's data on ``alias``"""
+    with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+        for table, columns in _sharded_tables():
+            cursor.execute(f'DELETE FROM {table} WHERE user_id = %s', [user_id])
+
+
+def move_user(user_id, source, target):
+    """Move the user's rows from ``source`` to ``target``; returns the rows moved.
+
+    The source's write lock is held from the first read until the rows are
+    gone, so the user's writes wait instead of landing behind the copy;
+    readers and the other shards carry on. The rows are copied as stored,
+    ids and timestamps included, and an id already taken on the target
+    fails the move instead of dropping a row.
+
+    While the user is still placed on ``source``, any rows of theirs on the
+    target are leftovers of an interrupted move and are replaced. Once the
+    placement points at the target (a sweep of writes that raced the move),
+    the target is authoritative: the late rows are added to it and the
+    counters recounted. Change feed entries get new ids on the target, in
+    their original order. The placement switches to the target before the
+    source rows are deleted.
+    """
+    from django.contrib.auth.models import User
+
+    from .models import ChangeLogEntry, TaskStats, UserShard
+
+    sweep = db_for_user(user_id) == target
+    moved = 0
+    with transaction.atomic(using=source), connections[source].cursor() as read:
+        read.execute('UPDATE mainapp_taskstats SET user_id = user_id WHERE user_id = %s', [user_id])
+        with transaction.atomic(using=target), connections[target].cursor() as write:
+            reset_sequences(write, target)
+            write.execute('SELECT name, seq FROM sqlite_sequence')
+            sequences = write.fetchall()
+            for table, columns in _sharded_tables():
+                if sweep and table == TaskStats._meta.db_table:
+                    continue
+                if not sweep:
+                    write.execute(f'DELETE FROM {table} WHERE user_id = %s', [user_id])
+                if table == ChangeLogEntry._meta.db_table:
+                    columns = [column for column in columns if column != 'id']
+                names = ', '.join(columns)
+                read.execute(f'SELECT {names} FROM {table} WHERE user_id = %s ORDER BY id', [user_id])
+                while rows := read.fetchmany(MOVE_BATCH_SIZE):
+                    write.executemany(f'INSERT INTO {table} ({names}) '
+                                      f'VALUES ({", ".join(["%s"] * len(columns))})', rows)
+                    moved += len(rows)
+            # Copied ids from other ranges push the sequences past them; a
+            # sequence never goes back, since ids it handed out may live elsewhere
+            floor = shard_floor(target)
+            write.executemany('UPDATE sqlite_sequence SET seq = %s WHERE name = %s AND (seq < %s OR seq >= %s)',
+                              [(seq, name, floor, floor + SHARD_ID_RANGE) for name, seq in sequences])
+            if sweep:
+                with user_shard(user_id):
+                    TaskStats.recompute(User.objects.get(pk=user_id))
+        UserShard.objects.update_or_create(user_id=user_id, defaults={'alias': target})
+        delete_user_rows(user_id, source)
+    return moved
+
+
+class ShardMiddleware:
+    """Routes the request's sharded queries to the logged-in user's shard.
+
+    Goes after AuthenticationMiddleware. Does nothing with a single shard.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sharded = len(shard_aliases()) > 1
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sharded or not request.user.is_authenticated:
+            return self.get_response(request)
+        with user_shard(request.user):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        if not self.sharded:
+            return await self.get_response(request)
+        user = await request.auser()
+        if not user.is_authenticated:
+            return await self.get_response(request)
+        alias = await sync_to_async(db_for_user)(user.pk)
+        token = _current.set((user.pk, alias))
+        try:
+            return await self.get_response(request)
+        finally:
+            _current.reset(token)
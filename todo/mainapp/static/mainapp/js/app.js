@@ -0,0 +1,792 @@
+// Scripts of the signed-in pages, one cacheable file for all of them. Each
+// page's code runs only on the page whose <body> has its page-* class, and
+// gets the URLs it calls from the data-*-url attributes of <body>. Loaded
+// with defer, so it runs once the page is parsed, like the inline scripts
+// at the end of <body> it replaces.
+
+const pages = {};
+
+function getCookie(name) {
+    let cookieValue = null;
+    if (document.cookie && document.cookie !== '') {
+        const cookies = document.cookie.split(';');
+        for (let i = 0; i < cookies.length; i++) {
+            const cookie = cookies[i].trim();
+            if (cookie.substring(0, name.length + 1) === (name + '=')) {
+                cookieValue = decodeURIComponent(cookie.substring(name.length + 1));
+                break;
+            }
+        }
+    }
+    return cookieValue;
+}
+
+pages.dashboard = function (urls) {
+    // Function to get appropriate greeting based on time
+    function getGreeting() {
+        const now = new Date();
+        const hour = now.getHours();
+
+        if (hour >= 5 && hour < 12) {
+            return "Good Morning";
+        } else if (hour >= 12 && hour < 17) {
+            return "Good Afternoon";
+        } else if (hour >= 17 && hour < 21) {
+            return "Good Evening";
+        } else {
+            return "Good Night";
+        }
+    }
+
+    // Update greeting on page load
+    const greetingElement = document.getElementById('greeting');
+    greetingElement.textContent = `${getGreeting()}, ${greetingElement.dataset.username}!`;
+
+    // Pie Chart for Task Progress
+    const canvas = document.getElementById('taskPieChart');
+    const ctx = canvas.getContext('2d');
+
+    // Counts rendered into the canvas' data attributes
+    const completedTasks = parseInt(canvas.dataset.completed) || 0;
+    const pendingTasks = parseInt(canvas.dataset.pending) || 0;
+
+    // Only create chart if there are tasks
+    if (completedTasks > 0 || pendingTasks > 0) {
+        const taskPieChart = new Chart(ctx, {
+            type: 'pie',
+            data: {
+                labels: ['Completed Tasks', 'Pending Tasks'],
+                datasets: [{
+                    data: [completedTasks, pendingTasks],
+                    backgroundColor: [
+                        '#28a745',  // Green for completed
+                        '#ffc107'   // Yellow for pending
+                    ],
+                    borderColor: [
+                        '#1e7e34',  // Darker green
+                        '#d39e00'   // Darker yellow
+                    ],
+                    borderWidth: 2,
+                    hoverOffset: 10
+                }]
+            },
+            options: {
+                responsive: true,
+                maintainAspectRatio: false,
+                plugins: {
+                    legend: {
+                        position: 'bottom',
+                        labels: {
+                            padding: 20,
+                            usePointStyle: true,
+                            font: {
+                                size: 14
+                            }
+                        }
+                    },
+                    tooltip: {
+                        callbacks: {
+                            label: function(context) {
+                                const total = context.dataset.data.reduce((a, b) => a + b, 0);
+                                const percentage = ((context.raw / total) * 100).toFixed(1);
+                                return context.label + ': ' + context.raw + ' (' + percentage + '%)';
+                            }
+                        }
+                    }
+                },
+                animation: {
+                    duration: 2000,
+                    easing: 'easeInOutQuart'
+                }
+            }
+        });
+    } else {
+        // Show message when no tasks
+        document.querySelector('.chart-wrapper').innerHTML = `
+            <div style="text-align: center; color: #999;">
+                <i class="fas fa-chart-pie" style="font-size: 4rem; margin-bottom: 1rem; opacity: 0.3;"></i>
+                <h3>No Tasks Yet</h3>
+                <p>Create your first task to see the progress chart!</p>
+                <a href="${urls.todolistUrl}" class="button is-primary">
+                    <i class="fas fa-plus"></i>&nbsp;&nbsp;Add Task
+                </a>
+            </div>
+        `;
+    }
+};
+
+pages.todolist = function (urls) {
+    const taskInput = document.getElementById('task-input');
+    const addBtn = document.getElementById('add-btn');
+    const pendingTodoList = document.getElementById('pending-todo-list');
+
+    // Reload when another tab or device changes the task list, unless
+    // the user is in the middle of typing or dragging
+    const live = watchChanges({
+        kinds: ['task'],
+        streamUrl: urls.liveUrl,
+        pollUrl: urls.changesUrl,
+        onChange: () => {
+            if (taskInput.value.trim() === '' && !document.querySelector('.dragging')) {
+                window.location.reload();
+            }
+        }
+    });
+
+    taskInput.addEventListener('input', () => {
+        addBtn.disabled = taskInput.value.trim() === '';
+    });
+
+    // Search as you type: prefix-match the last word, newest answer wins
+    const searchInput = document.getElementById('search-input');
+    const searchResults = document.getElementById('search-results');
+    let searchTimer = null;
+    let searchSeq = 0;
+
+    searchInput.addEventListener('input', () => {
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(runSearch, 150);
+    });
+
+    function runSearch() {
+        const query = searchInput.value.trim();
+        const seq = ++searchSeq;
+        if (!query) {
+            searchResults.style.display = 'none';
+            return;
+        }
+        fetch(urls.searchUrl + "?prefix=1&q=" + encodeURIComponent(query))
+            .then(response => response.json())
+            .then(data => {
+                if (seq !== searchSeq) return;
+                searchResults.innerHTML = '';
+                data.results.forEach(result => {
+                    const li = document.createElement('li');
+                    // The snippet is escaped by the server apart from <mark>
+                    li.innerHTML = (result.kind === 'task' ? '📋 ' : '📅 ') + result.snippet;
+                    li.addEventListener('click', () => openSearchResult(result));
+                    searchResults.appendChild(li);
+                });
+                if (!data.results.length) {
+                    const li = document.createElement('li');
+                    li.textContent = 'No matches';
+                    searchResults.appendChild(li);
+                }
+                searchResults.style.display = 'block';
+            });
+    }
+
+    function openSearchResult(result) {
+        searchResults.style.display = 'none';
+        if (result.kind === 'event') {
+            window.location.href = urls.calendarUrl;
+            return;
+        }
+        const item = document.querySelector(`li[data-id="${result.id}"]`);
+        if (item) {
+            item.scrollIntoView({ behavior: 'smooth', block: 'center' });
+            item.classList.add('highlight');
+            setTimeout(() => item.classList.remove('highlight'), 2000);
+        }
+    }
+
+    // Pasting several lines adds one task per line in a single request
+    taskInput.addEventListener('paste', e => {
+        const text = (e.clipboardData || window.clipboardData).getData('text');
+        if (!text.includes('\n')) {
+            return;
+        }
+        e.preventDefault();
+        const formData = new FormData();
+        formData.append('format', 'lines');
+        formData.append('data', text);
+        fetch(urls.importUrl, {
+            method: 'POST',
+            headers: {
+                'X-CSRFToken': document.querySelector('#input-area [name=csrfmiddlewaretoken]').value
+            },
+            body: formData
+        })
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) {
+                console.error('Failed to import tasks:', data.error);
+                return;
+            }
+            window.location.reload();
+        })
+        .catch(error => {
+            console.error('Error importing tasks:', error);
+        });
+    });
+
+    // Load further completed tasks as the end of the list scrolls into view
+    const completedMore = document.getElementById('completed-more');
+    if (completedMore) {
+        const completedList = document.getElementById('completed-todo-list');
+        let loadingCompleted = false;
+        const completedObserver = new IntersectionObserver(entries => {
+            if (!entries[0].isIntersecting || loadingCompleted) {
+                return;
+            }
+            loadingCompleted = true;
+            const cursor = encodeURIComponent(completedMore.dataset.cursor);
+            fetch(urls.completedUrl + "?cursor=" + cursor)
+                .then(response => response.json())
+                .then(data => {
+                    completedList.insertAdjacentHTML('beforeend', data.html);
+                    if (data.next_cursor) {
+                        completedMore.dataset.cursor = data.next_cursor;
+                    } else {
+                        completedObserver.disconnect();
+                        completedMore.remove();
+                    }
+                    loadingCompleted = false;
+                })
+                .catch(error => {
+                    console.error('Error loading completed tasks:', error);
+                    loadingCompleted = false;
+                });
+        });
+        completedObserver.observe(completedMore);
+    }
+
+    // Archived tasks are only fetched when asked for, one page per click
+    const showArchived = document.getElementById('show-archived');
+    const archivedList = document.getElementById('archived-todo-list');
+    let archivedCursor = '';
+    showArchived.addEventListener('click', () => {
+        showArchived.disabled = true;
+        fetch(urls.archivedUrl + "?cursor=" + encodeURIComponent(archivedCursor))
+            .then(response => response.json())
+            .then(data => {
+                archivedList.insertAdjacentHTML('beforeend', data.html);
+                archivedCursor = data.next_cursor;
+                if (archivedCursor) {
+                    showArchived.textContent = '🗄️ Show more archived';
+                    showArchived.disabled = false;
+                } else {
+                    showArchived.remove();
+                }
+            })
+            .catch(error => {
+                console.error('Error loading archived tasks:', error);
+                showArchived.disabled = false;
+            });
+    });
+
+    // Drag and drop functionality
+    document.addEventListener('DOMContentLoaded', function() {
+        const draggableItems = document.querySelectorAll('#pending-todo-list li[draggable="true"]');
+
+        draggableItems.forEach(item => {
+            // Set up drag events for each item
+            item.addEventListener('dragstart', handleDragStart);
+            item.addEventListener('dragover', handleDragOver);
+            item.addEventListener('dragenter', handleDragEnter);
+            item.addEventListener('dragleave', handleDragLeave);
+            item.addEventListener('drop', handleDrop);
+            item.addEventListener('dragend', handleDragEnd);
+        });
+
+        let draggedItem = null;
+
+        function handleDragStart(e) {
+            draggedItem = this;
+            e.dataTransfer.effectAllowed = 'move';
+            e.dataTransfer.setData('text/plain', this.getAttribute('data-id'));
+
+            // Add visual feedback
+            this.classList.add('dragging');
+
+            // Set a custom drag image (optional)
+            // e.dataTransfer.setDragImage(this, 0, 0);
+        }
+
+        function handleDragOver(e) {
+            e.preventDefault();
+            e.dataTransfer.dropEffect = 'move';
+            return false;
+        }
+
+        function handleDragEnter(e) {
+            this.classList.add('drag-over');
+        }
+
+        function handleDragLeave(e) {
+            this.classList.remove('drag-over');
+        }
+
+        function handleDrop(e) {
+            e.preventDefault();
+            e.stopPropagation();
+
+            if (draggedItem !== this) {
+                // Remove the drag-over class from all items
+                document.querySelectorAll('#pending-todo-list li').forEach(item => {
+                    item.classList.remove('drag-over');
+                });
+
+                // Get all list items
+                const items = Array.from(pendingTodoList.querySelectorAll('li[draggable="true"]'));
+
+                // Find the index of the dragged item and the drop target
+                const draggedIndex = items.indexOf(draggedItem);
+                const targetIndex = items.indexOf(this);
+
+                if (draggedIndex !== -1 && targetIndex !== -1) {
+                    // Reorder the items in the DOM
+                    if (draggedIndex < targetIndex) {
+                        this.parentNode.insertBefore(draggedItem, this.nextSibling);
+                    } else {
+                        this.parentNode.insertBefore(draggedItem, this);
+                    }
+
+                    // Update the order in the database via AJAX
+                    updateTaskOrder(draggedItem);
+                }
+            }
+
+            return false;
+        }
+
+        function handleDragEnd(e) {
+            // Remove visual feedback classes
+            document.querySelectorAll('#pending-todo-list li').forEach(item => {
+                item.classList.remove('dragging');
+                item.classList.remove('drag-over');
+            });
+        }
+
+        function updateTaskOrder(movedItem) {
+            // Only send the move: which task now sits after which
+            const previous = movedItem.previousElementSibling;
+            const move = {
+                id: movedItem.getAttribute('data-id'),
+                after: previous ? previous.getAttribute('data-id') : null
+            };
+
+            // Send the move to the server via AJAX
+            live.quiet();
+            fetch(urls.reorderUrl, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'X-CSRFToken': getCookie('csrftoken')
+                },
+                body: JSON.stringify({
+                    moves: [move]
+                })
+            })
+            .then(response => response.json())
+            .then(data => {
+                if (!data.success) {
+                    console.error('Failed to update task order');
+                }
+            })
+            .catch(error => {
+                console.error('Error updating task order:', error);
+            });
+        }
+    });
+};
+
+pages.calendar = function (urls) {
+    let calendar;
+    let currentEvent = null;
+    let currentRule = {};
+
+    document.addEventListener('DOMContentLoaded', function() {
+        const calendarEl = document.getElementById('calendar');
+
+        calendar = new FullCalendar.Calendar(calendarEl, {
+            initialView: 'dayGridMonth',
+            headerToolbar: {
+                left: 'prev,next today',
+                center: 'title',
+                right: 'dayGridMonth,timeGridWeek,listWeek'
+            },
+            events: '/calendar/events/',
+            editable: true,
+            selectable: true,
+            selectMirror: true,
+            dayMaxEvents: true,
+            weekends: true,
+            height: 'auto',
+
+            select: function(arg) {
+                openAddEventModal(arg.startStr);
+                calendar.unselect();
+            },
+
+            eventClick: function(arg) {
+                editEvent(arg.event);
+            },
+
+            eventDrop: function(arg) {
+                updateEventDate(arg.event);
+            },
+
+            eventResize: function(arg) {
+                updateEventDate(arg.event);
+            }
+        });
+
+        calendar.render();
+
+        // Pick up events changed from another tab or device
+        watchChanges({
+            kinds: ['event'],
+            streamUrl: urls.liveUrl,
+            pollUrl: urls.changesUrl,
+            onChange: () => calendar.refetchEvents()
+        });
+
+        // Handle all day checkbox
+        document.getElementById('allDay').addEventListener('change', function() {
+            const timeFields = document.getElementById('timeFields');
+            timeFields.style.display = this.checked ? 'none' : 'grid';
+        });
+    });
+
+    function openAddEventModal(selectedDate = null) {
+        currentEvent = null;
+        currentRule = {};
+        document.getElementById('modalTitle').textContent = 'Add New Event';
+        document.getElementById('eventTitle').value = '';
+        document.getElementById('eventDescription').value = '';
+        document.getElementById('startDate').value = selectedDate || new Date().toISOString().split('T')[0];
+        document.getElementById('endDate').value = '';
+        document.getElementById('startTime').value = '';
+        document.getElementById('endTime').value = '';
+        document.getElementById('priority').value = 'medium';
+        document.getElementById('repeat').value = '';
+        document.getElementById('repeatUntil').value = '';
+        document.getElementById('allDay').checked = false;
+        document.getElementById('timeFields').style.display = 'grid';
+        document.getElementById('deleteButton').style.display = 'none';
+        document.getElementById('skipButton').style.display = 'none';
+        document.getElementById('saveButton').textContent = 'Add Event';
+        document.getElementById('eventModal').classList.add('is-active');
+    }
+
+    function editEvent(event) {
+        currentEvent = event;
+        document.getElementById('modalTitle').textContent = 'Edit Event';
+        document.getElementById('eventTitle').value = event.title;
+        document.getElementById('eventDescription').value = event.extendedProps.description || '';
+
+        // Handle dates
+        const startDate = new Date(event.start);
+        document.getElementById('startDate').value = startDate.toISOString().split('T')[0];
+
+        if (event.end) {
+            const endDate = new Date(event.end);
+            document.getElementById('endDate').value = endDate.toISOString().split('T')[0];
+        }
+
+        // An occurrence of a series edits the series, so show its dates
+        const rrule = event.extendedProps.rrule || '';
+        currentRule = Object.fromEntries(rrule.split(';').filter(Boolean).map(part => part.split('=')));
+        document.getElementById('repeat').value = currentRule.FREQ || '';
+        document.getElementById('repeatUntil').value = currentRule.UNTIL ?
+            `${currentRule.UNTIL.slice(0, 4)}-${currentRule.UNTIL.slice(4, 6)}-${currentRule.UNTIL.slice(6, 8)}` : '';
+        if (rrule) {
+            document.getElementById('startDate').value = event.extendedProps.seriesStart;
+            document.getElementById('endDate').value = event.extendedProps.seriesEnd || '';
+        }
+        document.getElementById('skipButton').style.display = rrule ? 'inline-block' : 'none';
+
+        // Handle times
+        if (event.allDay) {
+            document.getElementById('allDay').checked = true;
+            document.getElementById('timeFields').style.display = 'none';
+        } else {
+            document.getElementById('allDay').checked = false;
+            document.getElementById('timeFields').style.display = 'grid';
+
+            const startTime = startDate.toTimeString().slice(0, 5);
+            document.getElementById('startTime').value = startTime;
+
+            if (event.end) {
+                const endTime = new Date(event.end).toTimeString().slice(0, 5);
+                document.getElementById('endTime').value = endTime;
+            }
+        }
+
+        document.getElementById('priority').value = event.extendedProps.priority || 'medium';
+        document.getElementById('deleteButton').style.display = 'inline-block';
+        document.getElementById('saveButton').textContent = 'Update Event';
+        document.getElementById('eventModal').classList.add('is-active');
+    }
+
+    function closeEventModal() {
+        document.getElementById('eventModal').classList.remove('is-active');
+        currentEvent = null;
+    }
+
+    function saveEvent() {
+        const title = document.getElementById('eventTitle').value.trim();
+        const description = document.getElementById('eventDescription').value.trim();
+        const startDate = document.getElementById('startDate').value;
+        const endDate = document.getElementById('endDate').value;
+        const startTime = document.getElementById('startTime').value;
+        const endTime = document.getElementById('endTime').value;
+        const priority = document.getElementById('priority').value;
+        const allDay = document.getElementById('allDay').checked;
+        const repeat = document.getElementById('repeat').value;
+        const repeatUntil = document.getElementById('repeatUntil').value;
+
+        if (!title || !startDate) {
+            alert('Please fill in the required fields (Title and Start Date)');
+            return;
+        }
+
+        // Keep the parts of the rule the dialog does not show (INTERVAL, COUNT)
+        let rrule = '';
+        if (repeat) {
+            const rule = Object.assign({}, currentRule, { FREQ: repeat });
+            delete rule.UNTIL;
+            if (repeatUntil) {
+                rule.UNTIL = repeatUntil.replaceAll('-', '');
+                delete rule.COUNT;
+            }
+            rrule = Object.entries(rule).map(([name, value]) => `${name}=${value}`).join(';');
+        }
+
+        const eventData = {
+            title: title,
+            description: description,
+            start_date: startDate,
+            end_date: endDate || startDate,
+            start_time: allDay ? null : startTime,
+            end_time: allDay ? null : endTime,
+            priority: priority,
+            all_day: allDay,
+            rrule: rrule
+        };
+
+        const url = currentEvent ?
+            `/calendar/update-event/${currentEvent.id}/` :
+            '/calendar/add-event/';
+
+        fetch(url, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': getCookie('csrftoken')
+            },
+            body: JSON.stringify(eventData)
+        })
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                calendar.refetchEvents();
+                closeEventModal();
+                showNotification(data.message, 'success');
+            } else {
+                alert('Error: ' + data.error);
+            }
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            alert('Failed to save event');
+        });
+    }
+
+    function deleteEvent() {
+        if (!currentEvent) return;
+
+        if (confirm('Are you sure you want to delete this event?')) {
+            fetch(`/calendar/delete-event/${currentEvent.id}/`, {
+                method: 'DELETE',
+                headers: {
+                    'X-CSRFToken': getCookie('csrftoken')
+                }
+            })
+            .then(response => response.json())
+            .then(data => {
+                if (data.success) {
+                    calendar.refetchEvents();
+                    closeEventModal();
+                    showNotification(data.message, 'success');
+                } else {
+                    alert('Error: ' + data.error);
+                }
+            })
+            .catch(error => {
+                console.error('Error:', error);
+                alert('Failed to delete event');
+            });
+        }
+    }
+
+    function importCalendar(input) {
+        if (!input.files.length) return;
+
+        const formData = new FormData();
+        formData.append('file', input.files[0]);
+        input.value = '';
+        fetch(urls.importUrl, {
+            method: 'POST',
+            headers: {
+                'X-CSRFToken': getCookie('csrftoken')
+            },
+            body: formData
+        })
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                calendar.refetchEvents();
+                let message = `Imported ${data.created} events`;
+                if (data.duplicates) message += `, ${data.duplicates} already present`;
+                if (data.errors.length) message += `, ${data.errors.length} skipped`;
+                showNotification(message, data.errors.length ? 'warning' : 'success');
+            } else {
+                alert('Error: ' + data.error);
+            }
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            alert('Failed to import calendar');
+        });
+    }
+
+    function skipOccurrence() {
+        if (!currentEvent) return;
+
+        // Add the occurrence's date to the series' exception dates
+        const exdates = (currentEvent.extendedProps.exdates || []).concat([currentEvent.extendedProps.occurrence]);
+        fetch(`/calendar/update-event/${currentEvent.id}/`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': getCookie('csrftoken')
+            },
+            body: JSON.stringify({ exdates: exdates })
+        })
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                calendar.refetchEvents();
+                closeEventModal();
+                showNotification('Occurrence skipped', 'success');
+            } else {
+                alert('Error: ' + data.error);
+            }
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            alert('Failed to skip occurrence');
+        });
+    }
+
+    function updateEventDate(event) {
+        const eventData = {
+            start_date: event.startStr.split('T')[0],
+            end_date: event.endStr ? event.endStr.split('T')[0] : event.startStr.split('T')[0]
+        };
+
+        fetch(`/calendar/update-event/${event.id}/`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': getCookie('csrftoken')
+            },
+            body: JSON.stringify(eventData)
+        })
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) {
+                alert('Error updating event: ' + data.error);
+                calendar.refetchEvents();
+            }
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            calendar.refetchEvents();
+        });
+    }
+
+    function showNotification(message, type) {
+        // Simple notification system
+        const notification = document.createElement('div');
+        notification.className = `notification is-${type}`;
+        notification.style.position = 'fixed';
+        notification.style.top = '20px';
+        notification.style.right = '20px';
+        notification.style.zIndex = '9999';
+        notification.textContent = message;
+
+        document.body.appendChild(notification);
+
+        setTimeout(() => {
+            document.body.removeChild(notification);
+        }, 3000);
+    }
+
+    // Called from onclick/onchange attributes in the page
+    Object.assign(window, { openAddEventModal, closeEventModal, saveEvent, deleteEvent, importCalendar, skipOccurrence });
+};
+
+pages.profile = function (urls) {
+    function uploadPhoto() {
+        const fileInput = document.getElementById('photoInput');
+        const file = fileInput.files[0];
+
+        if (file) {
+            const formData = new FormData();
+            formData.append('profile_photo', file);
+
+            fetch(urls.uploadPhotoUrl, {
+                method: 'POST',
+                body: formData,
+                headers: {
+                    'X-CSRFToken': getCookie('csrftoken')
+                }
+            })
+            .then(response => response.json())
+            .then(data => {
+                if (data.success) {
+                    // Photo URLs are content-hashed, so a new photo is a new URL
+                    const photoImg = document.getElementById('profilePhotoImg');
+                    photoImg.srcset = data.photo_srcset;
+                    photoImg.src = data.photo_url;
+                    showNotification('Profile photo updated successfully!', 'success');
+                } else {
+                    showNotification('Error uploading photo: ' + data.error, 'error');
+                }
+            })
+            .catch(error => {
+                console.error('Error:', error);
+                showNotification('Failed to upload photo', 'error');
+            });
+        }
+    }
+
+    function showNotification(message, type) {
+        const notification = document.createElement('div');
+        notification.className = `message ${type}`;
+        notification.textContent = message;
+        notification.style.position = 'fixed';
+        notification.style.top = '20px';
+        notification.style.right = '20px';
+        notification.style.zIndex = '9999';
+        notification.style.minWidth = '300px';
+
+        document.body.appendChild(notification);
+
+        setTimeout(() => {
+            document.body.removeChild(notification);
+        }, 4000);
+    }
+
+    // Called from onclick/onchange attributes in the page
+    Object.assign(window, { uploadPhoto });
+};
+
+for (const name in pages) {
+    if (document.body.classList.contains('page-' + name)) {
+        pages[name](document.body.dataset);
+    }
+}
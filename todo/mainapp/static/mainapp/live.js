@@ -0,0 +1,73 @@
+// Live updates: calls onChange(kind) when another tab or device changes the
+// user's tasks or calendar events. Listens on the server-sent events stream
+// and falls back to polling the change feed when the stream is unavailable.
+function watchChanges(options) {
+    const kinds = options.kinds;
+    const pollInterval = options.pollInterval || 30000;
+    let quietUntil = 0;
+    let pollTimer = null;
+    let cursor = null;
+
+    function notify(kind) {
+        // Skip the echo of this tab's own writes
+        if (kinds.includes(kind) && Date.now() >= quietUntil) {
+            options.onChange(kind);
+        }
+    }
+
+    function poll() {
+        const url = options.pollUrl + (cursor === null ? '' : '?since=' + cursor);
+        fetch(url, { credentials: 'same-origin' })
+            .then(response => response.json())
+            .then(data => {
+                if (!data.success) return;
+                const first = cursor === null;
+                cursor = data.cursor;
+                if (data.reset && !first) {
+                    kinds.forEach(notify);
+                }
+                new Set(data.changes.map(change => change.kind)).forEach(notify);
+                if (data.has_more) poll();
+            })
+            .catch(() => {});
+    }
+
+    function startPolling() {
+        if (pollTimer !== null) return;
+        poll();
+        pollTimer = setInterval(poll, pollInterval);
+    }
+
+    function connect() {
+        if (!window.EventSource) {
+            startPolling();
+            return;
+        }
+        // Under WSGI the stream answers 204, which EventSource treats as
+        // "do not reconnect": its error handler then switches to polling.
+        const source = new EventSource(options.streamUrl);
+        source.addEventListener('change', event => {
+            notify(JSON.parse(event.data).kind);
+        });
+        source.addEventListener('evicted', () => {
+            // Messages were dropped: refresh everything, then listen again
+            source.close();
+            kinds.forEach(notify);
+            setTimeout(connect, 1000);
+        });
+        source.onerror = () => {
+            if (source.readyState === EventSource.CLOSED) {
+                startPolling();
+            }
+        };
+    }
+
+    connect();
+
+    return {
+        // Call before this tab writes, so the echo is not treated as news
+        quiet(ms) {
+            quietUntil = Date.now() + (ms || 2000);
+        }
+    };
+}
@@ -1,3 +1,943 @@
-from django.test import TestCase
+import datetime
+import gzip
+import io
+import json
+import os
+import re
+import struct
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+import zlib
+from importlib import import_module
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.templatetags.static import static
+from django.db import connections
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+
+from .metrics import _labels
+from .page_cache import stats as page_cache_stats
+from .models import ORDER_GAP, ArchivedTask, Tasks, CalendarEvent, ChangeLogEntry, TaskStats, UserProfile, UserShard, _longest_increasing_run
+from .management.commands.bench_views import VIEWS as BENCH_VIEWS
+from .ical import export_events, import_events, parse_events
+from .photos import PHOTO_SIZES, photo_name, save_profile_photo
+from .recurrence import occurrences
+from .sharding import SHARD_ID_RANGE, count_user_rows, db_for_user, home_shard, move_user, user_shard
+
+# A plain "SCAN <table>" (no index) in EXPLAIN QUERY PLAN output
+TABLE_SCAN = re.compile(r'\bSCAN (mainapp_\w+)(?! USING)')
+
+
+class QueryPlanTests(TestCase):
+    """Every query the hot views run on our tables must use an index"""
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('planner', password='secret')
+        other = User.objects.create_user('other', password='secret')
+        for owner in (cls.user, other):
+            with user_shard(owner):
+                for number in range(20):
+                    task = Tasks.objects.create(user=owner, task=f'Task {number}')
+                    if number % 3 == 0:
+                        task.completed = True
+                        task.completed_at = timezone.now()
+                        task.save()
+                    CalendarEvent.objects.create(
+                        user=owner, title=f'Event {number}',
+                        start_date=datetime.date(2025, 1, 1) + datetime.timedelta(days=number * 7))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def assertNoTableScans(self, url):
+        # The user's tables are on their shard
+        connection = connections[db_for_user(self.user)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        checked = 0
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT') or 'mainapp_' not in sql:
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                plan = '\n'.join(row[-1] for row in cursor.fetchall())
+                self.assertIsNone(TABLE_SCAN.search(plan), f'{url}: table scan in\n{sql}\n{plan}')
+                checked += 1
+        self.assertGreater(checked, 0)
+
+    def test_dashboard(self):
+        self.assertNoTableScans('/userin/')
+
+    def test_todo_list(self):
+        self.assertNoTableScans('/todo/')
+
+    def test_calendar_events(self):
+        self.assertNoTableScans('/calendar/events/?start=2025-02-01&end=2025-03-01')
+
+
+class LoginQueryBudgetTests(TestCase):
+    """Logging in must not read or write the user's profile"""
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = User.objects.create_user('walker', password='long-enough-secret')
+
+    def test_login_query_budget(self):
+        # User lookup, session insert, last_login update, session update, and
+        # the savepoints around the two session writes
+        with self.assertNumQueries(9):
+            response = self.client.post('/login/', {'username': 'walker', 'password': 'long-enough-secret'})
+        self.assertEqual(response.status_code, 302)
+        with user_shard(self.user):
+            self.assertFalse(UserProfile.objects.exists())
+
+    def test_unchanged_profile_save_writes_nothing(self):
+        with user_shard(self.user) as alias:
+            profile = UserProfile.objects.get(pk=UserProfile.for_user(self.user).pk)
+            with self.assertNumQueries(0, using=alias):
+                profile.save()
+
+
+class TaskStatsTests(TestCase):
+    """The dashboard counters follow every task write"""
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = User.objects.create_user('counter', password='secret')
+        self.enterContext(user_shard(self.user))
+
+    def assertCounters(self, total, completed, today):
+        stats = TaskStats.objects.get(user=self.user)
+        self.assertEqual((stats.total, stats.completed, stats.pending, stats.today),
+                         (total, completed, total - completed, today))
+        counts = TaskStats.count(self.user)
+        self.assertEqual((counts['total'], counts['completed'], counts['today_pending']), (total, completed, today))
+
+    def test_add_done_undo_remove(self):
+        first, second, third = [Tasks.add(self.user, f'Task {number}') for number in range(3)]
+        self.assertCounters(3, 0, 3)
+        first.mark_done()
+        first.mark_done()  # Already done: counted once
+        self.assertCounters(3, 1, 2)
+        first.mark_pending()
+        self.assertCounters(3, 0, 3)
+        second.mark_done()
+        second.remove()
+        self.assertCounters(2, 0, 2)
+        third.remove()
+        self.assertCounters(1, 0, 1)
+
+    def test_repair_drifted_counters(self):
+        for number in range(3):
+            Tasks.add(self.user, f'Task {number}')
+        Tasks.objects.filter(user=self.user).first().mark_done()
+        TaskStats.objects.filter(user=self.user).update(total=40, completed=30)
+
+        out = io.StringIO()
+        call_command('repair_task_stats', dry_run=True, stdout=out)
+        self.assertIn('counter: total/completed/today (40, 30, 2) -> (3, 1, 2)', out.getvalue())
+        self.assertEqual(TaskStats.objects.get(user=self.user).total, 40)
+
+        call_command('repair_task_stats', stdout=io.StringIO())
+        self.assertCounters(3, 1, 2)
+        out = io.StringIO()
+        call_command('repair_task_stats', stdout=out)
+        self.assertIn('repaired 0 with drift', out.getvalue())
+
+
+class ArchiveTasksTests(TestCase):
+    """archive_tasks moves only long-completed tasks and keeps the counters"""
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = User.objects.create_user('keeper', password='secret')
+        self.other = User.objects.create_user('hoarder', password='secret')
+        now = timezone.now()
+        for user in (self.user, self.other):
+            with user_shard(user):
+                for name, completed_at in (('old', now - datetime.timedelta(days=100)),
+                                           ('recent', now - datetime.timedelta(days=10)),
+                                           ('undated', None), ('pending', None)):
+                    task = Tasks.add(user, f'{name} task')
+                    if name != 'pending':
+                        Tasks.objects.filter(id=task.id).update(completed=True, completed_at=completed_at)
+                TaskStats.recompute(user)
+
+    def remaining(self, user):
+        with user_shard(user):
+            return set(Tasks.objects.filter(user=user).values_list('task', flat=True))
+
+    def test_archives_old_completed_tasks(self):
+        call_command('archive_tasks', days=90, user='keeper', stdout=io.StringIO())
+
+        self.assertEqual(self.remaining(self.user), {'recent task', 'undated task', 'pending task'})
+        self.assertEqual(len(self.remaining(self.other)), 4)
+        with user_shard(self.user):
+            archived = ArchivedTask.objects.get(user=self.user)
+            stats = TaskStats.objects.get(user=self.user)
+            counts = TaskStats.count(self.user)
+        self.assertEqual(archived.task, 'old task')
+        # Archived tasks still count as completed ones
+        self.assertEqual((stats.total, stats.completed), (4, 3))
+        self.assertEqual((counts['total'], counts['completed']), (4, 3))
+
+        self.client.force_login(self.user)
+        self.assertIn('old task', self.client.get('/todo/archived/').json()['html'])
+
+        # Running again finds nothing more to move
+        call_command('archive_tasks', days=90, stdout=io.StringIO())
+        self.assertEqual(self.remaining(self.other), {'recent task', 'undated task', 'pending task'})
+        with user_shard(self.user):
+            self.assertEqual(ArchivedTask.objects.filter(user=self.user).count(), 1)
+
+
+class TaskOrderTests(TestCase):
+    """Reordering rewrites only the moved tasks until the gaps run out"""
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = User.objects.create_user('sorter', password='secret')
+        self.enterContext(user_shard(self.user))
+        self.ids = [Tasks.add(self.user, f'Task {number}').id for number in range(5)]
+
+    def ranks(self):
+        return dict(Tasks.objects.filter(user=self.user).values_list('id', 'order_field'))
+
+    def pending(self):
+        return list(Tasks.objects.filter(user=self.user, completed=False)
+                    .order_by('order_field').values_list('id', flat=True))
+
+    def test_one_move_writes_one_row(self):
+        a, b, c, d, e = self.ids
+        before = self.ranks()
+        self.assertEqual(Tasks.apply_moves(self.user, [(e, a)]), 1)
+        self.assertEqual(self.pending(), [a, e, b, c, d])
+        after = self.ranks()
+        self.assertEqual({task_id for task_id in after if after[task_id] != before[task_id]}, {e})
+
+        self.assertEqual(Tasks.apply_moves(self.user, [(d, None)]), 1)
+        self.assertEqual(self.pending(), [d, a, e, b, c])
+
+    def test_order_keeps_the_longest_sorted_run(self):
+        a, b, c, d, e = self.ids
+        # b, c, d keep their ranks; a and e move around them
+        self.assertEqual(Tasks.apply_order(self.user, [e, b, c, d, a]), 2)
+        self.assertEqual(self.pending(), [e, b, c, d, a])
+        self.assertEqual(_longest_increasing_run([5, 1, 2, 3, 0]), {1, 2, 3})
+
+    def test_exhausted_gap_rebalances(self):
+        a, b, c, d, e = self.ids
+        for rank, task_id in enumerate(self.ids, start=1):
+            Tasks.objects.filter(id=task_id).update(order_field=rank)
+        self.assertEqual(Tasks.apply_moves(self.user, [(e, a)]), 5)
+        self.assertEqual(self.pending(), [a, e, b, c, d])
+        self.assertEqual(sorted(self.ranks().values()), [ORDER_GAP * n for n in range(1, 6)])
+
+    def test_unknown_task(self):
+        with self.assertRaises(Tasks.DoesNotExist):
+            Tasks.apply_order(self.user, self.ids + [self.ids[-1] + 1000])
+        with self.assertRaises(Tasks.DoesNotExist):
+            Tasks.apply_moves(self.user, [(self.ids[0], self.ids[-1] + 1000)])
+
+    def test_migration_spreads_old_ranks(self):
+        a, b, c, d, e = self.ids
+        for rank, task_id in zip([3, 1, 2, 5, 4], self.ids):
+            Tasks.objects.filter(id=task_id).update(order_field=rank)
+        Tasks.objects.filter(id=e).update(completed=True)
+
+        import_module('mainapp.migrations.0005_gap_task_order').spread_task_order(django_apps, None)
+        self.assertEqual(self.pending(), [b, c, a, d])
+        self.assertEqual(self.ranks(), {b: ORDER_GAP, c: 2 * ORDER_GAP, a: 3 * ORDER_GAP,
+                                        d: 4 * ORDER_GAP, e: 4})
+
+
+class PageCacheTests(TestCase):
+    """Cached pages are served until the user's data changes"""
+    databases = '__all__'
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('reader', password='secret')
+        self.client.force_login(self.user)
+
+    def get(self, path='/todo/'):
+        hits = page_cache_stats['hits']
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode(), page_cache_stats['hits'] > hits
+
+    def test_hit_until_a_write(self):
+        self.client.post('/todo/', {'task': 'Water the plants'})
+        self.assertFalse(self.get()[1])
+        page, hit = self.get()
+        self.assertTrue(hit)
+        self.assertIn('Water the plants', page)
+
+        self.client.post('/todo/', {'task': 'Feed the cat'})
+        page, hit = self.get()
+        self.assertFalse(hit)
+        self.assertIn('Feed the cat', page)
+
+    def test_write_from_another_process(self):
+        self.assertFalse(self.get('/userin/')[1])
+        self.assertTrue(self.get('/userin/')[1])
+        # Another worker's write leaves this process's cache untouched;
+        # the version comes from the database
+        with user_shard(self.user), self.captureOnCommitCallbacks(execute=False):
+            Tasks.add(self.user, 'Call the plumber')
+        page, hit = self.get('/userin/')
+        self.assertFalse(hit)
+        self.assertIn('Call the plumber', page)
+
+    def test_rename(self):
+        self.get('/userin/')
+        self.user.first_name = 'Robin'
+        self.user.save()
+        page, hit = self.get('/userin/')
+        self.assertFalse(hit)
+        self.assertIn('Robin', page)
+
+
+class CompletedPagingTests(TestCase):
+    """Completed tasks page by (completed_at, id), newest first"""
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = User.objects.create_user('finisher', password='secret')
+        self.client.force_login(self.user)
+        noon = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0)
+        with user_shard(self.user):
+            ids = [Tasks.add(self.user, f'Task {number}').id for number in range(7)]
+            done_at = [noon, noon, noon, noon - datetime.timedelta(hours=1), noon + datetime.timedelta(hours=1), None]
+            for task_id, completed_at in zip(ids, done_at):
+                Tasks.objects.filter(id=task_id).update(completed=True, completed_at=completed_at)
+        a, b, c, d, e, f, pending = ids
+        # Ties on the timestamp go by id, and tasks without one come last
+        self.expected = [e, c, b, a, d, f]
+
+    def walk(self, path, key, **params):
+        seen, cursor, pages = [], None, 0
+        with mock.patch('mainapp.views.COMPLETED_PAGE_SIZE', 2):
+            while True:
+                response = self.client.get(path, {**params, 'cursor': cursor} if cursor else params)
+                self.assertEqual(response.status_code, 200)
+                body = response.json()
+                seen += key(body)
+                pages += 1
+                cursor = body['next_cursor']
+                if cursor is None:
+                    return seen, pages
+
+    def test_api_pages(self):
+        seen, pages = self.walk('/api/tasks/', lambda body: [task['id'] for task in body['tasks']],
+                                list='completed')
+        self.assertEqual(seen, self.expected)
+        self.assertEqual(pages, 3)
+
+    def test_html_pages(self):
+        seen, pages = self.walk('/todo/completed/',
+                                lambda body: [int(task_id) for task_id in re.findall(r'/todo/undo/(\d+)/', body['html'])])
+        self.assertEqual(seen, self.expected)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/todo/completed/', {'cursor': 'yesterday_x'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/tasks/', {'list': 'completed', 'cursor': 'x_1'}).status_code, 400)
+
+
+class TaskApiETagTests(TestCase):
+    """Polling the task list gets a 304 until a write changes it"""
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = User.objects.create_user('poller', password='secret')
+        self.client.force_login(self.user)
+        self.first = self.create('Water the plants')
+        self.create('Feed the cat')
+
+    def create(self, text):
+        response = self.client.post('/api/tasks/', {'task': text}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()['task']['id']
+
+    def assertChanged(self, etag):
+        """The list no longer matches ``etag``; returns the new one"""
+        response = self.client.get('/api/tasks/', headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        return response['ETag']
+
+    def test_not_modified_until_a_write(self):
+        etag = self.client.get('/api/tasks/')['ETag']
+        # The version lives in the database, not in this process's cache
+        cache.clear()
+        self.assertEqual(self.client.get('/api/tasks/', headers={'if-none-match': etag}).status_code, 304)
+
+        self.create('Call the plumber')
+        etag = self.assertChanged(etag)
+        self.client.post(f'/api/tasks/{self.first}/complete/')
+        etag = self.assertChanged(etag)
+        pending = [task['id'] for task in self.client.get('/api/tasks/').json()['tasks']]
+        self.client.post('/api/tasks/reorder/', {'task_order': pending[::-1]}, content_type='application/json')
+        self.assertChanged(etag)
+
+
+class TaskImportTests(TestCase):
+    """Imports create the good rows and report the bad ones"""
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = User.objects.create_user('importer', password='secret')
+        self.client.force_login(self.user)
+
+    def upload(self, format, data):
+        response = self.client.post('/todo/import/', {'format': format, 'data': data})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def imported(self):
+        with user_shard(self.user):
+            return list(Tasks.objects.filter(user=self.user).order_by('completed', 'order_field')
+                        .values_list('task', 'completed'))
+
+    def test_lines(self):
+        body = self.upload('lines', 'Water the plants\n\n  Buy milk, 2 liters  \n')
+        self.assertEqual((body['created'], body['errors']), (2, []))
+        self.assertEqual(self.imported(), [('Water the plants', False), ('Buy milk, 2 liters', False)])
+
+    def test_csv_without_header_keeps_commas(self):
+        body = self.upload('csv', 'Buy milk, 2 liters\n"Call mum, dad"\nWater the plants\n')
+        self.assertEqual((body['created'], body['errors']), (3, []))
+        self.assertEqual([task for task, completed in self.imported()],
+                         ['Buy milk, 2 liters', 'Call mum, dad', 'Water the plants'])
+
+    def test_csv_with_header(self):
+        body = self.upload('csv', 'completed,task\nyes,Feed the cat\n,Water the plants\nmaybe,Call mum\n,\n')
+        self.assertEqual(body['created'], 2)
+        self.assertEqual(body['errors'], [{'row': 3, 'error': "Invalid completed value 'maybe'"}])
+        self.assertEqual(self.imported(), [('Water the plants', False), ('Feed the cat', True)])
+        with user_shard(self.user):
+            stats = TaskStats.objects.get(user=self.user)
+        self.assertEqual((stats.total, stats.completed), (2, 1))
+
+    def test_json(self):
+        body = self.upload('json', '["Water the plants", {"task": "Feed the cat", "completed": true}, '
+                                   '{"task": " "}, 42, {"task": "Call mum", "completed": "soon"}]')
+        self.assertEqual(body['created'], 2)
+        self.assertEqual([error['row'] for error in body['errors']], [3, 4, 5])
+        self.assertEqual(self.imported(), [('Water the plants', False), ('Feed the cat', True)])
+
+        self.assertEqual(self.upload('json', '{"task": "x"}'),
+                         {'success': False, 'error': 'JSON import must be a list'})
+        self.assertFalse(self.upload('json', '[')['success'])
+        self.assertFalse(self.upload('yaml', '- x')['success'])
+
+
+class ChangeFeedTests(TestCase):
+    """The change feed sends each object's last state once per cursor"""
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = User.objects.create_user('syncer', password='secret')
+        self.client.force_login(self.user)
+        self.cursor = self.changes()['cursor']
+
+    def create(self, text):
+        response = self.client.post('/api/tasks/', {'task': text}, content_type='application/json')
+        return response.json()['task']['id']
+
+    def changes(self, since=None):
+        query = {} if since is None else {'since': since}
+        response = self.client.get('/api/changes/', query)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_first_request_resets(self):
+        body = self.changes()
+        self.assertTrue(body['reset'])
+        self.assertEqual(body['changes'], [])
+        self.assertEqual(self.client.get('/api/changes/', {'since': 'x'}).status_code, 400)
+
+    def test_last_change_per_object_and_tombstones(self):
+        kept = self.create('Water the plants')
+        gone = self.create('Feed the cat')
+        self.client.post(f'/api/tasks/{kept}/complete/')
+        self.client.delete(f'/api/tasks/{gone}/')
+
+        body = self.changes(self.cursor)
+        self.assertFalse(body['reset'])
+        self.assertFalse(body['has_more'])
+        changes = {change['id']: change for change in body['changes']}
+        self.assertEqual(len(body['changes']), 2)
+        self.assertFalse(changes[kept]['deleted'])
+        self.assertTrue(changes[kept]['data']['completed'])
+        self.assertEqual(changes[gone], {'kind': 'task', 'id': gone, 'deleted': True, 'data': None})
+        self.assertEqual(self.changes(body['cursor'])['changes'], [])
+
+    def test_paging(self):
+        ids = [self.create(f'Task {number}') for number in range(5)]
+        seen, cursor = [], self.cursor
+        with mock.patch('mainapp.api.CHANGES_PAGE_SIZE', 2):
+            while True:
+                body = self.changes(cursor)
+                seen += [change['id'] for change in body['changes']]
+                cursor = body['cursor']
+                if not body['has_more']:
+                    break
+        self.assertEqual(seen, ids)
+
+    def test_reset_after_compaction(self):
+        self.create('Water the plants')
+        self.create('Feed the cat')
+        with user_shard(self.user):
+            first = ChangeLogEntry.objects.filter(user=self.user).first()
+            ChangeLogEntry.objects.filter(pk=first.pk).update(
+                created_at=timezone.now() - datetime.timedelta(days=60))
+        call_command('compact_changes', days=30, stdout=io.StringIO())
+
+        body = self.changes(self.cursor)
+        self.assertTrue(body['reset'])
+        # The entry just before the oldest kept one was seen, nothing is lost
+        body = self.changes(first.pk)
+        self.assertFalse(body['reset'])
+        self.assertEqual(len(body['changes']), 1)
+
+    def test_reset_when_cursor_is_past_the_newest_entry(self):
+        self.create('Water the plants')
+        latest = self.changes(self.cursor)['cursor']
+        body = self.changes(latest + 100)
+        self.assertTrue(body['reset'])
+        self.assertEqual(body['cursor'], latest)
+
+
+class RecurrenceTests(TestCase):
+    """Series expand only within the requested window"""
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = User.objects.create_user('repeater', password='secret')
+
+    def series(self, rrule, start=datetime.date(2025, 1, 1), **fields):
+        with user_shard(self.user):
+            return CalendarEvent.objects.create(user=self.user, title='Standup', start_date=start,
+                                                rrule=rrule, **fields)
+
+    def test_far_window_of_an_endless_series(self):
+        event = self.series('FREQ=DAILY')
+        days = occurrences(event, datetime.date(9000, 1, 1), datetime.date(9000, 2, 1))
+        self.assertEqual(len(days), 31)
+        self.assertEqual((days[0], days[-1]), (datetime.date(9000, 1, 1), datetime.date(9000, 1, 31)))
+        self.client.force_login(self.user)
+        response = self.client.get('/calendar/events/', {'start': '9000-01-01', 'end': '9000-02-01'})
+        self.assertEqual(len(response.json()), 31)
+
+    def test_interval_and_exdates(self):
+        event = self.series('FREQ=WEEKLY;INTERVAL=2', exdates=['2025-01-29'])
+        self.assertEqual(occurrences(event, datetime.date(2025, 1, 10), datetime.date(2025, 3, 1)),
+                         [datetime.date(2025, 1, 15), datetime.date(2025, 2, 12), datetime.date(2025, 2, 26)])
+
+    def test_until_and_count(self):
+        until = self.series('FREQ=MONTHLY;UNTIL=20250531', start=datetime.date(2025, 1, 31))
+        # Months without a 31st are skipped; UNTIL is inclusive
+        self.assertEqual(occurrences(until, datetime.date(2025, 1, 1), datetime.date(2026, 1, 1)),
+                         [datetime.date(2025, 1, 31), datetime.date(2025, 3, 31), datetime.date(2025, 5, 31)])
+        self.assertEqual(until.recurrence_end, datetime.date(2025, 5, 31))
+
+        count = self.series('FREQ=DAILY;COUNT=10')
+        self.assertEqual(occurrences(count, datetime.date(2025, 1, 8), datetime.date(2025, 2, 1)),
+                         [datetime.date(2025, 1, 8), datetime.date(2025, 1, 9), datetime.date(2025, 1, 10)])
+        self.assertEqual(count.recurrence_end, datetime.date(2025, 1, 10))
+
+    def test_edited_series_is_expanded_again(self):
+        event = self.series('FREQ=DAILY')
+        window = (datetime.date(2025, 1, 1), datetime.date(2025, 1, 8))
+        self.assertEqual(len(occurrences(event, *window)), 7)
+
+        event.rrule = 'FREQ=WEEKLY'
+        event.save()
+        self.assertEqual(occurrences(event, *window), [datetime.date(2025, 1, 1)])
+        # Another process's edit, seen only through the reloaded row
+        with user_shard(self.user):
+            CalendarEvent.objects.filter(pk=event.pk).update(exdates=['2025-01-01'])
+        event.refresh_from_db()
+        self.assertEqual(occurrences(event, *window), [])
+
+
+class SearchTests(TestCase):
+    """The FTS index finds tasks and events and follows every write"""
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = User.objects.create_user('seeker', password='secret')
+        self.other = User.objects.create_user('snooper', password='secret')
+        self.client.force_login(self.user)
+
+    def found(self, query, **params):
+        response = self.client.get('/search/', {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [(result['kind'], result['title']) for result in response.json()['results']]
+
+    def test_finds_tasks_and_events(self):
+        with user_shard(self.user):
+            Tasks.add(self.user, 'Renew passport')
+            CalendarEvent.objects.create(user=self.user, title='Embassy visit', start_date=datetime.date(2025, 3, 1),
+                                         description='Bring the old passport')
+            Tasks.add(self.user, 'Water plants')
+        with user_shard(self.other):
+            Tasks.add(self.other, 'Stolen passport')
+
+        # Title matches rank above description matches
+        self.assertEqual(self.found('passport'), [('task', 'Renew passport'), ('event', 'Embassy visit')])
+        self.assertEqual(self.found('pass'), [])
+        self.assertEqual(self.found('pass', prefix='1'), [('task', 'Renew passport'), ('event', 'Embassy visit')])
+        self.assertEqual(self.found('"passport" OR plants'), [])
+        snippet = self.client.get('/search/', {'q': 'old'}).json()['results'][0]['snippet']
+        self.assertIn('<mark>old</mark>', snippet)
+
+    def test_index_follows_updates_and_deletes(self):
+        with user_shard(self.user):
+            task = Tasks.add(self.user, 'Call the plumber')
+            event = CalendarEvent.objects.create(user=self.user, title='Dentist', start_date=datetime.date(2025, 3, 1))
+        self.assertEqual(self.found('plumber'), [('task', 'Call the plumber')])
+
+        with user_shard(self.user):
+            Tasks.objects.filter(pk=task.pk).update(task='Call the electrician')
+            event.description = 'Ask about the crown'
+            event.save()
+        self.assertEqual(self.found('plumber'), [])
+        self.assertEqual(self.found('electrician'), [('task', 'Call the electrician')])
+        self.assertEqual(self.found('crown'), [('event', 'Dentist')])
+
+        with user_shard(self.user):
+            Tasks.objects.filter(pk=task.pk).delete()
+            event.delete()
+        self.assertEqual(self.found('electrician'), [])
+        self.assertEqual(self.found('dentist'), [])
+
+    def test_rebuild_matches_triggers(self):
+        with user_shard(self.user):
+            Tasks.add(self.user, 'Sort receipts')
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(self.found('receipts'), [('task', 'Sort receipts')])
+
+
+class ICalendarTests(TestCase):
+    """Exported calendars import back unchanged, once"""
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = User.objects.create_user('planner', password='secret')
+        self.other = User.objects.create_user('copier', password='secret')
+        with user_shard(self.user):
+            self.meeting = CalendarEvent.objects.create(
+                user=self.user, title=' '.join(['Planning; budget, Q3 \\ Zürich'] * 4),
+                description='Agenda:\n1. Costs, travel; hotels', start_date=datetime.date(2025, 3, 3),
+                start_time=datetime.time(9, 30), end_date=datetime.date(2025, 3, 3),
+                end_time=datetime.time(10, 45), priority='high', rrule='FREQ=WEEKLY;COUNT=10',
+                exdates=['2025-03-17'])
+            self.holiday = CalendarEvent.objects.create(
+                user=self.user, title='Holiday', start_date=datetime.date(2025, 8, 1),
+                end_date=datetime.date(2025, 8, 3), all_day=True, priority='low')
+
+    def export(self, user):
+        with user_shard(user):
+            return ''.join(export_events(CalendarEvent.objects.filter(user=user).order_by('id')))
+
+    def test_round_trip(self):
+        text = self.export(self.user)
+        self.assertTrue(text.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertTrue(all(len(line.encode()) <= 75 for line in text.split('\r\n')))
+
+        parsed = [event for number, event in parse_events(text.splitlines(keepends=True))]
+        fields = ('title', 'description', 'start_date', 'start_time', 'end_date', 'end_time',
+                  'priority', 'all_day', 'rrule', 'exdates')
+        for original, event in zip([self.meeting, self.holiday], parsed):
+            self.assertEqual([getattr(event, field) or None for field in fields],
+                             [getattr(original, field) or None for field in fields])
+        self.assertEqual(parsed[0].uid, f'event-{self.meeting.pk}@webtodo')
+
+    def test_reimport_skips_known_uids(self):
+        lines = self.export(self.user).splitlines(keepends=True)
+        with user_shard(self.user):
+            self.assertEqual(import_events(self.user, parse_events(lines)), (0, 2, []))
+        with user_shard(self.other):
+            self.assertEqual(import_events(self.other, parse_events(lines)), (2, 0, []))
+            self.assertEqual(import_events(self.other, parse_events(lines)), (0, 2, []))
+            self.assertEqual(CalendarEvent.objects.filter(user=self.other).count(), 2)
+
+    def test_time_zones_and_errors(self):
+        lines = [
+            'BEGIN:VCALENDAR',
+            'BEGIN:VEVENT', 'UID:a@example.com', 'SUMMARY:New York',
+            'DTSTART;TZID=America/New_York:20250115T090000', 'END:VEVENT',
+            'BEGIN:VEVENT', 'UID:b@example.com', 'SUMMARY:UTC', 'DTSTART:20250115T140000Z',
+            'BEGIN:VALARM', 'TRIGGER:-PT15M', 'END:VALARM', 'END:VEVENT',
+            'BEGIN:VEVENT', 'UID:b@example.com', 'SUMMARY:UTC again', 'DTSTART:20250115T140000Z',
+            'END:VEVENT',
+            'BEGIN:VEVENT', 'UID:c@example.com', 'DTSTART:20250115', 'END:VEVENT',
+            'END:VCALENDAR',
+        ]
+        events = list(parse_events(lines))
+        self.assertEqual([(event.start_date, event.start_time) for number, event in events[:3]],
+                         [(datetime.date(2025, 1, 15), datetime.time(14))] * 3)
+        with user_shard(self.user):
+            created, duplicates, errors = import_events(self.user, events)
+        self.assertEqual((created, duplicates), (2, 1))
+        self.assertEqual(errors, [{'event': 4, 'error': 'Event has no SUMMARY'}])
+
+
+def png(width, height):
+    """PNG bytes whose header claims ``width`` x ``height``; only the header is real"""
+    buffer = io.BytesIO()
+    Image.new('RGB', (1, 1), 'teal').save(buffer, 'PNG')
+    data = bytearray(buffer.getvalue())
+    # Signature (8), chunk length and type (8), then width and height
+    data[16:24] = struct.pack('>II', width, height)
+    data[29:33] = struct.pack('>I', zlib.crc32(data[12:29]))
+    return bytes(data)
+
+
+class ProfilePhotoTests(TestCase):
+    """Uploads become hashed WebP renditions; oversized images are refused"""
+    databases = '__all__'
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, data, name='photo.png'):
+        return SimpleUploadedFile(name, data, content_type='image/png')
+
+    def test_renditions(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (640, 480), 'teal').save(buffer, 'PNG')
+        name = save_profile_photo(self.upload(buffer.getvalue()))
+
+        self.assertRegex(name, r'^profile_photos/[0-9a-f]{16}-300\.webp$')
+        for size, pixels in PHOTO_SIZES.items():
+            rendition = photo_name(name, size)
+            self.assertTrue(rendition.endswith(f'-{pixels}.webp'))
+            with default_storage.open(rendition) as f, Image.open(f) as image:
+                self.assertEqual(image.size, (pixels, pixels))
+        self.assertEqual(save_profile_photo(self.upload(buffer.getvalue())), name)
+
+    def test_invalid_and_oversized_images(self):
+        for data, error in [(b'not an image', 'Not a valid image'),
+                            (png(6000, 6000), 'Image is too large'),
+                            (png(20000, 20000), 'Image is too large')]:
+            with self.assertRaisesMessage(ValueError, error):
+                save_profile_photo(self.upload(data))
+
+        user = User.objects.create_user('poser', password='secret')
+        self.client.force_login(user)
+        response = self.client.post('/profile/upload-photo/', {'profile_photo': self.upload(png(20000, 20000))})
+        self.assertEqual(response.json(), {'success': False, 'error': 'Image is too large'})
+
+
+class MetricsTests(TestCase):
+    """Requests are timed and counted, and /metrics/ exports the totals"""
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = User.objects.create_user('watcher', password='secret')
+        self.client.force_login(self.user)
+
+    def scrape(self):
+        self.user.is_staff = True
+        self.user.save(update_fields=['is_staff'])
+        response = self.client.get('/metrics/')
+        self.user.is_staff = False
+        self.user.save(update_fields=['is_staff'])
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return response.content.decode()
+
+    def sample(self, text, name, view, method='GET'):
+        match = re.search(rf'^{name}{{view="{view}",method="{method}"}} (\S+)$', text, re.M)
+        return float(match[1]) if match else 0
+
+    def test_server_timing(self):
+        response = self.client.get('/todo/')
+        timing = re.fullmatch(r'app;dur=[\d.]+, db;dur=[\d.]+;desc="(\d+) queries", tpl;dur=([\d.]+)',
+                              response['Server-Timing'])
+        self.assertIsNotNone(timing)
+        self.assertGreater(int(timing[1]), 0)
+
+    def test_counters(self):
+        before = self.scrape()
+        self.client.get('/todo/')
+        self.client.get('/todo/')
+        after = self.scrape()
+        for name in ('todo_request_duration_seconds_count', 'todo_db_queries_total'):
+            self.assertGreaterEqual(self.sample(after, name, 'todolist') - self.sample(before, name, 'todolist'),
+                                    2, name)
+        self.assertGreater(self.sample(after, 'todo_db_query_seconds_total', 'todolist'), 0)
+        self.assertIn('# TYPE todo_request_duration_seconds histogram', after)
+        self.assertRegex(after, r'todo_request_duration_seconds_bucket\{view="todolist",method="GET",le="\+Inf"\} \d+')
+        self.assertTrue(after.endswith('\n'))
+
+    def test_staff_only(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 302)
+        self.client.logout()
+        self.assertEqual(self.client.get('/metrics/').status_code, 302)
+
+    def test_label_values_are_escaped(self):
+        self.assertEqual(_labels('say "hi"\\\n', 'GET'), r'view="say \"hi\"\\\n",method="GET"')
+
+
+class StaticAssetTests(TestCase):
+    """collectstatic output is fingerprinted, precompressed and cached forever"""
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        storages = {**settings.STORAGES, 'staticfiles': {
+            'BACKEND': 'mainapp.assets.CompressedManifestStaticFilesStorage'}}
+        settings_override = override_settings(STATIC_ROOT=root.name, STORAGES=storages)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    def test_hashed_asset_is_served_compressed(self):
+        url = static('mainapp/css/app.css')
+        self.assertRegex(url, r'/app\.[0-9a-f]{12}\.css$')
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        plain = self.client.get(url)
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)),
+                         b''.join(plain.streaming_content))
+
+    def test_templates_load_no_remote_assets(self):
+        remote = re.compile(r'(?:src|href)\s*=\s*["\']?(?:https?:)?//')
+        for template in (settings.BASE_DIR / 'templates').rglob('*.html'):
+            for number, line in enumerate(template.read_text(encoding='utf-8').splitlines(), start=1):
+                self.assertIsNone(remote.search(line), f'{template.name}:{number}: {line.strip()}')
+
+
+class BenchViewsTests(SimpleTestCase):
+    """bench_views seeds and measures in throwaway databases, sharded or not"""
+
+    def test_runs_with_shards(self):
+        shard_file = settings.BASE_DIR / 'db-shard1.sqlite3'
+        existed = shard_file.exists()
+        with tempfile.TemporaryDirectory() as root:
+            output = os.path.join(root, 'bench.json')
+            # In its own process: the shards come from the environment.
+            # With two shards the measured (first) user lives on shard1.
+            result = subprocess.run(
+                [sys.executable, 'manage.py', 'bench_views', '--sizes', '10', '--users', '1',
+                 '--repeat', '1', '--output', output],
+                cwd=settings.BASE_DIR, env={**os.environ, 'TODO_SHARDS': '2'},
+                capture_output=True, text=True, timeout=300)
+            self.assertEqual(result.returncode, 0, result.stderr)
+            with open(output) as f:
+                results = json.load(f)['results']
+        self.assertEqual(sorted(results), sorted(f'{view}@10' for view in BENCH_VIEWS))
+        self.assertTrue(all(result['queries'] > 0 for result in results.values()))
+        if not existed:
+            self.assertFalse(shard_file.exists())
+
+
+@unittest.skipUnless(len(getattr(settings, 'DATABASE_SHARDS', [])) > 1,
+                     'run with TODO_SHARDS=3 to test user shards')
+class ShardingTests(TestCase):
+    """Each user's data stays on one shard and can be moved to another"""
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = User.objects.create_user('mover', password='long-enough-secret')
+        self.client.force_login(self.user)
+        self.home = home_shard(self.user.pk)
+
+    def test_tasks_are_written_to_the_home_shard(self):
+        self.assertEqual(UserShard.objects.get(user=self.user).alias, self.home)
+        self.client.post('/todo/', {'task': 'Water the plants'})
+
+        task = Tasks.objects.using(self.home).get(user=self.user)
+        self.assertEqual(task.id // SHARD_ID_RANGE, settings.DATABASE_SHARDS.index(self.home))
+        for alias in settings.DATABASE_SHARDS:
+            if alias != self.home:
+                self.assertEqual(count_user_rows(self.user.pk, alias), 0)
+        self.assertContains(self.client.get('/todo/'), 'Water the plants')
+
+    def test_rebalance_moves_rows_with_their_ids(self):
+        self.client.post('/todo/', {'task': 'Water the plants'})
+        task = Tasks.objects.using(self.home).get(user=self.user)
+        cursor = self.client.get('/api/changes/', {'since': 0}).json()['cursor']
+        target = next(alias for alias in settings.DATABASE_SHARDS if alias != self.home)
+
+        call_command('rebalance_shards', user='mover', to=target, settle=0, stdout=io.StringIO())
+
+        self.assertEqual(UserShard.objects.get(user=self.user).alias, target)
+        self.assertEqual(count_user_rows(self.user.pk, self.home), 0)
+        moved = Tasks.objects.using(target).get(user=self.user)
+        self.assertEqual((moved.id, moved.created_at), (task.id, task.created_at))
+        self.assertContains(self.client.get('/todo/'), 'Water the plants')
+        # The feed either continues from the old cursor or asks for a reload,
+        # and then picks up writes on the new shard
+        cursor = self.client.get('/api/changes/', {'since': cursor}).json()['cursor']
+        self.client.post('/todo/', {'task': 'Feed the cat'})
+        changes = self.client.get('/api/changes/', {'since': cursor}).json()['changes']
+        self.assertEqual([change['data']['task'] for change in changes], ['Feed the cat'])
+
+    def test_move_down_and_back_keeps_every_row(self):
+        top, bottom = settings.DATABASE_SHARDS[-1], settings.DATABASE_SHARDS[0]
+        if self.home != top:
+            move_user(self.user.pk, self.home, top)
+        self.client.post('/todo/', {'task': 'Water the plants'})
+        move_user(self.user.pk, top, bottom)
+
+        # New rows on the lower shard stay in its own range
+        self.client.post('/todo/', {'task': 'Feed the cat'})
+        fed = Tasks.objects.using(bottom).get(user=self.user, task='Feed the cat')
+        self.assertLess(fed.id, SHARD_ID_RANGE)
+        neighbour = User.objects.create_user('neighbour', password='long-enough-secret')
+        with user_shard(neighbour):
+            if db_for_user(neighbour) != top:
+                move_user(neighbour.pk, db_for_user(neighbour), top)
+        self.client.force_login(neighbour)
+        self.client.post('/todo/', {'task': 'Neighbour task'})
+
+        move_user(self.user.pk, bottom, top)
+        self.assertEqual(count_user_rows(self.user.pk, bottom), 0)
+        self.assertEqual(sorted(Tasks.objects.using(top).filter(user=self.user).values_list('task', flat=True)),
+                         ['Feed the cat', 'Water the plants'])
+        self.assertEqual(TaskStats.objects.using(top).get(user=self.user).total, 2)
+        self.assertTrue(Tasks.objects.using(top).filter(user=neighbour).exists())
+
+    def test_deleting_a_user_deletes_their_sharded_data(self):
+        self.client.post('/todo/', {'task': 'Water the plants'})
+        if self.home == 'default':
+            self.home = settings.DATABASE_SHARDS[1]
+            move_user(self.user.pk, 'default', self.home)
+        user_id = self.user.pk
+
+        with self.captureOnCommitCallbacks(using='default', execute=True):
+            self.user.delete()
+        for alias in settings.DATABASE_SHARDS:
+            self.assertEqual(count_user_rows(user_id, alias), 0)
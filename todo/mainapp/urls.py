@@ -1,9 +1,12 @@
 from django.urls import path
 from django.contrib.auth import views as auth_views
-from . import views
+from . import views, api, async_views
 from django.conf import settings
 from django.conf.urls.static import static
 
+# Under ASGI the JSON endpoints can run natively async
+json_views = async_views if settings.ASYNC_JSON_VIEWS else views
+
 urlpatterns = [
     path('', views.landing_page, name='landing'),
     path('userin/', views.home, name='home'),
@@ -14,22 +17,43 @@ urlpatterns = [
     path('todo/delete/<int:pk>/', views.delete_task, name='delete_task'),
     path('todo/done/<int:pk>/', views.mark_task_done, name='mark_task_done'),
     path('todo/undo/<int:pk>/', views.undo_task, name='undo_task'),
-    path('todo/update-order/', views.update_task_order, name='update_task_order'),
+    path('todo/update-order/', json_views.update_task_order, name='update_task_order'),
+    path('todo/reorder/', views.reorder_tasks, name='reorder_tasks'),
+    path('todo/import/', views.import_tasks, name='import_tasks'),
+    path('todo/completed/', views.completed_tasks, name='completed_tasks'),
+    path('todo/archived/', views.archived_tasks, name='archived_tasks'),
     
     # Calendar URLs
     path('calendar/', views.calendar_view, name='calendar'),
-    path('calendar/events/', views.get_calendar_events, name='get_calendar_events'),
-    path('calendar/add-event/', views.add_calendar_event, name='add_calendar_event'),
-    path('calendar/update-event/<int:event_id>/', views.update_calendar_event, name='update_calendar_event'),
-    path('calendar/delete-event/<int:event_id>/', views.delete_calendar_event, name='delete_calendar_event'),
+    path('calendar/events/', json_views.get_calendar_events, name='get_calendar_events'),
+    path('calendar/add-event/', json_views.add_calendar_event, name='add_calendar_event'),
+    path('calendar/update-event/<int:event_id>/', json_views.update_calendar_event, name='update_calendar_event'),
+    path('calendar/delete-event/<int:event_id>/', json_views.delete_calendar_event, name='delete_calendar_event'),
+    path('calendar/export.ics', views.export_calendar, name='export_calendar'),
+    path('calendar/import/', views.import_calendar, name='import_calendar'),
     
     # Profile URLs
     path('profile/', views.profile_view, name='profile'),
     path('profile/update/', views.update_profile, name='update_profile'),
     path('profile/upload-photo/', views.upload_profile_photo, name='upload_profile_photo'),
     path('profile/change-password/', views.change_password, name='change_password'),
+    path('avatar/<int:color>/<str:initials>.svg', views.avatar, name='avatar'),
+
+    # JSON API
+    path('api/tasks/', api.tasks, name='api_tasks'),
+    path('api/tasks/reorder/', api.reorder_tasks, name='api_reorder_tasks'),
+    path('api/tasks/<int:pk>/', api.task_detail, name='api_task'),
+    path('api/tasks/<int:pk>/complete/', api.complete_task, name='api_complete_task'),
+    path('api/tasks/<int:pk>/undo/', api.undo_task, name='api_undo_task'),
+    path('api/changes/', api.changes, name='api_changes'),
+    path('live/', json_views.live_events, name='live_events'),
+    path('search/', views.search, name='search'),
+
+    # Staff-only diagnostics
+    path('cache/stats/', views.cache_stats, name='cache_stats'),
+    path('metrics/', views.metrics, name='metrics'),
 ]
 
 # Serve media files during development
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    urlpatterns += static(settings.MEDIA_URL, view=views.serve_media, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
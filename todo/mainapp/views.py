@@ -1,19 +1,36 @@
 from django.shortcuts import render, redirect
+from django.template.loader import render_to_string
 from django.contrib.auth import login, update_session_auth_hash
 from django.contrib.auth.forms import PasswordChangeForm
 from .forms import SignUpForm
-from django.http import HttpResponse, JsonResponse
-from django.contrib.auth.decorators import login_required
-from .models import Tasks, CalendarEvent, UserProfile
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.contrib.auth.decorators import login_required, user_passes_test
+from .models import Tasks, TaskStats, ArchivedTask, CalendarEvent, UserProfile
 from django.utils import timezone
 from django.shortcuts import get_object_or_404
 from .forms import ToDoForm
+from .page_cache import cached_page, stats as page_cache_stats
+from .metrics import metrics_text
+from .db import write_transaction
+from .photos import save_profile_photo, delete_profile_photo, is_hashed_photo
+from .avatars import render_avatar
+from .importers import IMPORT_FORMATS, parse_rows, import_tasks as import_task_rows
+from .recurrence import event_span, occurrences, parse_exdates, parse_rrule
+from .ical import ICS_CHUNK_SIZE, export_events, parse_events, import_events
+from .search import search as search_index
+from .sharding import db_for_user
+from django.http import Http404
 import json
+import copy
 from datetime import datetime, date
 from django.contrib import messages
 from django.contrib.auth.models import User
 from django.views.decorators.csrf import csrf_exempt
-from django.db import models
+from django.db.models import Q, Count, Max
+from django.views.decorators.cache import cache_control
+from django.utils.cache import patch_cache_control
+from django.views.static import serve
+from django.views.decorators.http import condition
 
 def landing_page(request):
     return render(request, 'mainapp/landing.html')
@@ -33,34 +50,33 @@ def home(request):
     else:
         greeting = "Good Night"
 
-    # Get task statistics for the dashboard
-    total_tasks = Tasks.objects.filter(user=user).count()
-    completed_tasks = Tasks.objects.filter(user=user, completed=True).count()
-    pending_tasks = Tasks.objects.filter(user=user, completed=False).count()
+    def render_dashboard():
+        # Get task statistics for the dashboard from the user's counter row
+        stats = TaskStats.for_user(user)
 
-    # Recent tasks
-    recent_tasks = Tasks.objects.filter(user=user).order_by('-created_at')[:5]
+        # Recent tasks
+        recent_tasks = Tasks.objects.filter(user=user).order_by('-created_at')[:5]
 
-    # Tasks created today
-    today_tasks = Tasks.objects.filter(user=user, completed=False, created_at__date=timezone.now().date()).count()
+        context = {
+            'username': user.get_full_name() or user.username,
+            'greeting': greeting,
+            'total_tasks': stats.total,
+            'completed_tasks': stats.completed,
+            'pending_tasks': stats.pending,
+            'recent_tasks': recent_tasks,
+            'today_tasks': stats.today,
+        }
+        return render(request, 'mainapp/dashboard.html', context)
 
-    context = {
-        'username': user.get_full_name() or user.username,
-        'greeting': greeting,
-        'total_tasks': total_tasks,
-        'completed_tasks': completed_tasks,
-        'pending_tasks': pending_tasks,
-        'recent_tasks': recent_tasks,
-        'today_tasks': today_tasks,
-    }
-    return render(request, 'mainapp/dashboard.html', context)
+    # The today count changes with the date even when no data does
+    return cached_page(request, 'dashboard', render_dashboard, greeting, timezone.localdate())
 
 # Profile Views
 @login_required
 def profile_view(request):
     """Display user profile"""
     user = request.user
-    profile, created = UserProfile.objects.get_or_create(user=user)
+    profile = UserProfile.for_user(user)
     
     context = {
         'username': user.get_full_name() or user.username,
@@ -74,21 +90,18 @@ def update_profile(request):
     """Update user profile information"""
     if request.method == 'POST':
         user = request.user
-        profile, created = UserProfile.objects.get_or_create(user=user)
-        
-        # Update user fields
-        first_name = request.POST.get('first_name', '').strip()
-        last_name = request.POST.get('last_name', '').strip()
-        email = request.POST.get('email', '').strip()
+        profile = UserProfile.for_user(user)
         
-        if first_name:
-            user.first_name = first_name
-        if last_name:
-            user.last_name = last_name
-        if email:
-            user.email = email
+        # Update user fields, writing only the ones that changed
+        changed = []
+        for field in ('first_name', 'last_name', 'email'):
+            value = request.POST.get(field, '').strip()
+            if value and value != getattr(user, field):
+                setattr(user, field, value)
+                changed.append(field)
         
-        user.save()
+        if changed:
+            user.save(update_fields=changed)
         
         # Update profile fields
         bio = request.POST.get('bio', '').strip()
@@ -105,6 +118,7 @@ def update_profile(request):
             except ValueError:
                 pass
         
+        # Only writes if a profile field actually changed
         profile.save()
         
         messages.success(request, 'Profile updated successfully!')
@@ -116,12 +130,26 @@ def update_profile(request):
 def upload_profile_photo(request):
     """Upload profile photo"""
     if request.method == 'POST' and request.FILES.get('profile_photo'):
-        profile, created = UserProfile.objects.get_or_create(user=request.user)
-        profile.profile_photo = request.FILES['profile_photo']
-        profile.save()
+        profile = UserProfile.for_user(request.user)
+        try:
+            name = save_profile_photo(request.FILES['profile_photo'])
+        except ValueError as e:
+            return JsonResponse({'success': False, 'error': str(e)})
+
+        old_name = profile.profile_photo.name
+        profile.profile_photo.name = name
+        profile.save(update_fields=['profile_photo', 'updated_at'])
+
+        # Renditions are shared by identical uploads, so only drop unused ones
+        if old_name and old_name != name and not UserProfile.objects.filter(profile_photo=old_name).exists():
+            delete_profile_photo(old_name)
         
         messages.success(request, 'Profile photo updated successfully!')
-        return JsonResponse({'success': True, 'photo_url': profile.get_profile_photo_url()})
+        return JsonResponse({
+            'success': True,
+            'photo_url': profile.get_profile_photo_url(),
+            'photo_srcset': profile.get_profile_photo_srcset(),
+        })
     
     return JsonResponse({'success': False, 'error': 'No photo uploaded'})
 
@@ -151,51 +179,226 @@ def calendar_view(request):
     }
     return render(request, 'mainapp/calendar.html', context)
 
-@login_required
-def get_calendar_events(request):
-    """API to get calendar events as JSON for FullCalendar"""
+def parse_window_date(value):
+    """Date part of a FullCalendar ``start``/``end`` parameter, or None"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace(' ', '+')).date()
+    except ValueError:
+        return None
+
+def calendar_events_in_window(user, params):
+    """The user's events overlapping the ``start``/``end`` query window"""
+    calendar_events = CalendarEvent.objects.filter(user=user)
+    window_start = parse_window_date(params.get('start'))
+    window_end = parse_window_date(params.get('end'))
+
+    # FullCalendar's end is exclusive; an event without end_date lasts one day.
+    # A recurring series reaches the window unless it ended before it.
+    if window_end:
+        calendar_events = calendar_events.filter(start_date__lt=window_end)
+    if window_start:
+        calendar_events = calendar_events.filter(
+            Q(end_date__gte=window_start) | Q(end_date__isnull=True, start_date__gte=window_start)
+            | Q(recurrence_end__gte=window_start) | (~Q(rrule='') & Q(recurrence_end__isnull=True)))
+    return calendar_events
+
+def calendar_events_json(calendar_events, params):
+    """FullCalendar events for the window, recurring series expanded"""
+    window_start = parse_window_date(params.get('start'))
+    window_end = parse_window_date(params.get('end'))
     events = []
-    calendar_events = CalendarEvent.objects.filter(user=request.user)
-    
     for event in calendar_events:
-        # Set color based on priority
-        color = '#3273dc'  # default blue
-        if event.priority == 'high':
-            color = '#dc3545'  # red
-        elif event.priority == 'medium':
-            color = '#ffc107'  # yellow
-        elif event.priority == 'low':
-            color = '#28a745'  # green
+        if event.rrule:
+            events.extend(occurrence_to_json(event, day)
+                          for day in occurrences(event, window_start, window_end))
+        else:
+            events.append(event_to_json(event))
+    return events
+
+def calendar_events_etag(request):
+    """ETag for the events in the requested window, from one aggregate query"""
+    if not request.user.is_authenticated:
+        return None
+    stats = calendar_events_in_window(request.user, request.GET).aggregate(**CALENDAR_ETAG_AGGREGATES)
+    return calendar_etag_from_stats(request.user, stats)
+
+CALENDAR_ETAG_AGGREGATES = {'count': Count('id'), 'last': Max('updated_at')}
+
+def calendar_etag_from_stats(user, stats):
+    last = stats['last'].timestamp() if stats['last'] else 0
+    return f"{user.pk}-{stats['count']}-{last}"
+
+def event_to_json(event):
+    """FullCalendar event object for a CalendarEvent"""
+    # Set color based on priority
+    color = '#3273dc'  # default blue
+    if event.priority == 'high':
+        color = '#dc3545'  # red
+    elif event.priority == 'medium':
+        color = '#ffc107'  # yellow
+    elif event.priority == 'low':
+        color = '#28a745'  # green
+    
+    # Build start and end datetime
+    if event.all_day:
+        start = event.start_date.isoformat()
+        end = (event.end_date or event.start_date).isoformat()
+    else:
+        start_datetime = datetime.combine(event.start_date, event.start_time or datetime.min.time())
+        start = start_datetime.isoformat()
         
-        # Build start and end datetime
-        if event.all_day:
-            start = event.start_date.isoformat()
-            end = (event.end_date or event.start_date).isoformat()
+        if event.end_date and event.end_time:
+            end_datetime = datetime.combine(event.end_date, event.end_time)
+            end = end_datetime.isoformat()
         else:
-            start_datetime = datetime.combine(event.start_date, event.start_time or datetime.min.time())
-            start = start_datetime.isoformat()
-            
-            if event.end_date and event.end_time:
-                end_datetime = datetime.combine(event.end_date, event.end_time)
-                end = end_datetime.isoformat()
-            else:
-                end = start
+            end = start
+    
+    return {
+        'id': event.id,
+        'title': event.title,
+        'start': start,
+        'end': end,
+        'allDay': event.all_day,
+        'color': color,
+        'extendedProps': {
+            'description': event.description,
+            'priority': event.priority,
+        }
+    }
+
+def occurrence_to_json(event, day):
+    """FullCalendar event for the occurrence of a series starting on ``day``"""
+    occurrence = copy.copy(event)
+    occurrence.start_date = day
+    occurrence.end_date = day + event_span(event) if event.end_date else None
+    data = event_to_json(occurrence)
+    # Dragging would move the whole series; edits go through the dialog
+    data.update(groupId=event.id, startEditable=False, durationEditable=False)
+    data['extendedProps'].update({
+        'rrule': event.rrule,
+        'exdates': event.exdates,
+        'occurrence': day.isoformat(),
+        'seriesStart': event.start_date.isoformat(),
+        'seriesEnd': event.end_date.isoformat() if event.end_date else None,
+    })
+    return data
+
+def new_calendar_event(user, data):
+    """Unsaved CalendarEvent from the add-event JSON; ValueError if invalid"""
+    # Parse the data
+    title = data.get('title', '').strip()
+    description = data.get('description', '').strip()
+    start_date_str = data.get('start_date')
+    start_time_str = data.get('start_time')
+    end_date_str = data.get('end_date')
+    end_time_str = data.get('end_time')
+    priority = data.get('priority', 'medium')
+    all_day = data.get('all_day', False)
+    rrule = data.get('rrule') or ''
+    exdates = parse_exdates(data.get('exdates') or [])
+    
+    if not title or not start_date_str:
+        raise ValueError('Title and start date are required')
+    
+    # Parse dates
+    start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
+    start_time = None
+    end_date = None
+    end_time = None
+    
+    if not all_day and start_time_str:
+        start_time = datetime.strptime(start_time_str, '%H:%M').time()
+    
+    if end_date_str:
+        end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
         
-        events.append({
-            'id': event.id,
-            'title': event.title,
-            'start': start,
-            'end': end,
-            'allDay': event.all_day,
-            'color': color,
-            'extendedProps': {
-                'description': event.description,
-                'priority': event.priority,
-            }
-        })
+    if not all_day and end_time_str:
+        end_time = datetime.strptime(end_time_str, '%H:%M').time()
+
+    if rrule:
+        parse_rrule(rrule)
+    
+    return CalendarEvent(
+        user=user,
+        title=title,
+        description=description,
+        start_date=start_date,
+        start_time=start_time,
+        end_date=end_date,
+        end_time=end_time,
+        priority=priority,
+        all_day=all_day,
+        rrule=rrule,
+        exdates=exdates
+    )
+
+def apply_calendar_event_update(event, data):
+    """Copy the fields present in the update-event JSON onto ``event``"""
+    # Update fields
+    event.title = data.get('title', event.title)
+    event.description = data.get('description', event.description)
+    event.priority = data.get('priority', event.priority)
+    event.all_day = data.get('all_day', event.all_day)
+    
+    # Update dates
+    if data.get('start_date'):
+        event.start_date = datetime.strptime(data['start_date'], '%Y-%m-%d').date()
+    
+    if data.get('start_time') and not event.all_day:
+        event.start_time = datetime.strptime(data['start_time'], '%H:%M').time()
+    
+    if data.get('end_date'):
+        event.end_date = datetime.strptime(data['end_date'], '%Y-%m-%d').date()
+        
+    if data.get('end_time') and not event.all_day:
+        event.end_time = datetime.strptime(data['end_time'], '%H:%M').time()
+
+    # Recurrence: an empty rrule turns a series back into a one-off event
+    if 'rrule' in data:
+        event.rrule = data['rrule'] or ''
+        if event.rrule:
+            parse_rrule(event.rrule)
+    if 'exdates' in data:
+        event.exdates = parse_exdates(data['exdates'] or [])
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=calendar_events_etag)
+def get_calendar_events(request):
+    """API to get calendar events as JSON for FullCalendar"""
+    calendar_events = calendar_events_in_window(request.user, request.GET)
+    events = calendar_events_json(calendar_events, request.GET)
     
     return JsonResponse(events, safe=False)
 
+@login_required
+def export_calendar(request):
+    """All of the user's events as an .ics download, streamed row by row"""
+    # Primary key order needs no sort; iterator() keeps memory flat. The rows
+    # are read after the view returns, so the shard is picked here.
+    events = CalendarEvent.objects.using(db_for_user(request.user)).filter(user=request.user).order_by('id')
+    response = StreamingHttpResponse(export_events(events.iterator(chunk_size=ICS_CHUNK_SIZE)),
+                                     content_type='text/calendar; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="calendar.ics"'
+    return response
+
+@login_required
+def import_calendar(request):
+    """Create events from an uploaded .ics file.
+
+    Events whose UID the user already has are skipped; events that can't be
+    imported are reported by their position in the file.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid request method'})
+    if not request.FILES.get('file'):
+        return JsonResponse({'success': False, 'error': 'Choose an .ics file to import'})
+
+    created, duplicates, errors = import_events(request.user, parse_events(request.FILES['file']))
+    return JsonResponse({'success': True, 'created': created, 'duplicates': duplicates, 'errors': errors})
+
 @login_required
 def add_calendar_event(request):
     """Add a new calendar event"""
@@ -203,46 +406,8 @@ def add_calendar_event(request):
         try:
             data = json.loads(request.body)
             
-            # Parse the data
-            title = data.get('title', '').strip()
-            description = data.get('description', '').strip()
-            start_date_str = data.get('start_date')
-            start_time_str = data.get('start_time')
-            end_date_str = data.get('end_date')
-            end_time_str = data.get('end_time')
-            priority = data.get('priority', 'medium')
-            all_day = data.get('all_day', False)
-            
-            if not title or not start_date_str:
-                return JsonResponse({'success': False, 'error': 'Title and start date are required'})
-            
-            # Parse dates
-            start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-            start_time = None
-            end_date = None
-            end_time = None
-            
-            if not all_day and start_time_str:
-                start_time = datetime.strptime(start_time_str, '%H:%M').time()
-            
-            if end_date_str:
-                end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-                
-            if not all_day and end_time_str:
-                end_time = datetime.strptime(end_time_str, '%H:%M').time()
-            
             # Create the event
-            CalendarEvent.objects.create(
-                user=request.user,
-                title=title,
-                description=description,
-                start_date=start_date,
-                start_time=start_time,
-                end_date=end_date,
-                end_time=end_time,
-                priority=priority,
-                all_day=all_day
-            )
+            new_calendar_event(request.user, data).save()
             
             return JsonResponse({'success': True, 'message': 'Event added successfully'})
             
@@ -258,26 +423,7 @@ def update_calendar_event(request, event_id):
         try:
             event = get_object_or_404(CalendarEvent, id=event_id, user=request.user)
             data = json.loads(request.body)
-            
-            # Update fields
-            event.title = data.get('title', event.title)
-            event.description = data.get('description', event.description)
-            event.priority = data.get('priority', event.priority)
-            event.all_day = data.get('all_day', event.all_day)
-            
-            # Update dates
-            if data.get('start_date'):
-                event.start_date = datetime.strptime(data['start_date'], '%Y-%m-%d').date()
-            
-            if data.get('start_time') and not event.all_day:
-                event.start_time = datetime.strptime(data['start_time'], '%H:%M').time()
-            
-            if data.get('end_date'):
-                event.end_date = datetime.strptime(data['end_date'], '%Y-%m-%d').date()
-                
-            if data.get('end_time') and not event.all_day:
-                event.end_time = datetime.strptime(data['end_time'], '%H:%M').time()
-            
+            apply_calendar_event_update(event, data)
             event.save()
             
             return JsonResponse({'success': True, 'message': 'Event updated successfully'})
@@ -305,8 +451,7 @@ def delete_calendar_event(request, event_id):
 def delete_task(request, pk):
     if request.method == "POST":
         task = get_object_or_404(Tasks, id=pk, user=request.user)
-        task.delete()
-        reorder_tasks(request.user)
+        task.remove()
         return redirect('todolist')
 
 @login_required
@@ -314,10 +459,7 @@ def mark_task_done(request, pk):
     """Mark task as completed"""
     if request.method == "POST":
         task = get_object_or_404(Tasks, id=pk, user=request.user)
-        task.completed = True
-        task.completed_at = timezone.now()
-        task.save()
-        reorder_pending_tasks(request.user)
+        task.mark_done()
         return redirect('todolist')
 
 @login_required
@@ -325,46 +467,121 @@ def undo_task(request, pk):
     """Mark completed task as pending again"""
     if request.method == "POST":
         task = get_object_or_404(Tasks, id=pk, user=request.user, completed=True)
-        task.completed = False
-        task.completed_at = None
-
-        # Give it a new order at the end of pending tasks
-        max_order = Tasks.objects.filter(user=request.user, completed=False).aggregate(
-            models.Max('order_field'))['order_field__max']
-        task.order_field = (max_order or 0) + 1
-        task.save()
-
+        task.mark_pending()
         return redirect('todolist')
 
 @login_required
 def todo_page_view(request):
     user = request.user
 
-    # Get pending and completed tasks separately
+    # Pending tasks in full; completed ones only as the first page
     pending_todos = Tasks.objects.filter(user=user, completed=False).order_by('order_field')
-    completed_todos = Tasks.objects.filter(user=user, completed=True).order_by('-completed_at')
 
     if request.method == 'POST':
         task_text = request.POST.get('task', '').strip()
         if task_text:
-            # Get the maximum order value for pending tasks
-            max_order = Tasks.objects.filter(user=user, completed=False).aggregate(
-                models.Max('order_field'))['order_field__max']
-            
-            # Create the new task with the next order value
-            Tasks.objects.create(
-                user=user, 
-                task=task_text, 
-                order_field=(max_order or 0) + 1
-            )
+            Tasks.add(user, task_text)
         return redirect('todolist')
 
-    context = {
-        'pending_todos': pending_todos,
-        'completed_todos': completed_todos,
-        'username': user.get_full_name() or user.username,
-    }
-    return render(request, 'mainapp/todolist.html', context)
+    def render_todolist():
+        completed_todos, next_cursor = completed_tasks_page(user)
+        context = {
+            'pending_todos': pending_todos,
+            'completed_todos': completed_todos,
+            'completed_count': TaskStats.for_user(user).completed,
+            'next_cursor': next_cursor,
+            'username': user.get_full_name() or user.username,
+        }
+        return render(request, 'mainapp/todolist.html', context)
+
+    return cached_page(request, 'todolist', render_todolist)
+
+@login_required
+def import_tasks(request):
+    """Create many tasks at once from pasted lines, CSV or JSON.
+
+    Takes ``format`` (lines, csv or json) and the content as either a
+    ``data`` field or an uploaded ``file``. Rows that can't be imported are
+    reported with their row number; the rest are still created.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid request method'})
+
+    format = request.POST.get('format', 'lines')
+    if format not in IMPORT_FORMATS:
+        return JsonResponse({'success': False, 'error': f'Format must be one of {", ".join(IMPORT_FORMATS)}'})
+
+    try:
+        if request.FILES.get('file'):
+            text = request.FILES['file'].read().decode('utf-8-sig')
+        else:
+            text = request.POST.get('data', '')
+        created, errors = import_task_rows(request.user, parse_rows(text, format))
+    except (UnicodeDecodeError, ValueError) as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+
+    return JsonResponse({'success': True, 'created': created, 'errors': errors})
+
+COMPLETED_PAGE_SIZE = 25
+
+def completed_tasks_page(user, cursor=None):
+    """One page of completed tasks, newest first, and the cursor for the next"""
+    return keyset_page(Tasks.objects.filter(user=user, completed=True), cursor)
+
+def keyset_page(tasks, cursor=None, fields=None):
+    """One page of ``tasks`` by descending (completed_at, id) and the next cursor.
+
+    Keyset pagination: the cursor is the last row's ``<completed_at>_<id>``,
+    so every page is an index seek however many tasks the user has
+    completed. Rows without completed_at sort last. With ``fields`` the page
+    holds ``.values()`` dicts of those fields instead of model instances.
+    """
+    tasks = tasks.order_by('-completed_at', '-id')
+    if cursor:
+        completed_at, _, last_id = cursor.rpartition('_')
+        last_id = int(last_id)
+        if completed_at:
+            completed_at = datetime.fromisoformat(completed_at)
+            tasks = tasks.filter(
+                Q(completed_at__lt=completed_at)
+                | Q(completed_at=completed_at, id__lt=last_id)
+                | Q(completed_at__isnull=True))
+        else:
+            tasks = tasks.filter(completed_at__isnull=True, id__lt=last_id)
+
+    if fields:
+        page = list(tasks.values(*fields)[:COMPLETED_PAGE_SIZE + 1])
+    else:
+        page = list(tasks.only('id', 'task', 'completed_at')[:COMPLETED_PAGE_SIZE + 1])
+    if len(page) <= COMPLETED_PAGE_SIZE:
+        return page, None
+    page = page[:COMPLETED_PAGE_SIZE]
+    last = page[-1]
+    last_id, completed_at = (last['id'], last['completed_at']) if fields else (last.id, last.completed_at)
+    return page, f"{completed_at.isoformat() if completed_at else ''}_{last_id}"
+
+@login_required
+def completed_tasks(request):
+    """Next page of completed tasks as an HTML fragment for lazy loading"""
+    try:
+        page, next_cursor = completed_tasks_page(request.user, request.GET.get('cursor'))
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid cursor'}, status=400)
+
+    html = render_to_string('mainapp/completed_tasks.html', {'completed_todos': page}, request=request)
+    return JsonResponse({'success': True, 'html': html, 'next_cursor': next_cursor})
+
+@login_required
+def archived_tasks(request):
+    """A page of archived tasks as an HTML fragment, loaded on demand"""
+    try:
+        page, next_cursor = keyset_page(
+            ArchivedTask.objects.filter(user=request.user), request.GET.get('cursor'))
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid cursor'}, status=400)
+
+    html = render_to_string('mainapp/archived_tasks.html', {'archived_todos': page}, request=request)
+    return JsonResponse({'success': True, 'html': html, 'next_cursor': next_cursor})
 
 @login_required
 @csrf_exempt
@@ -373,33 +590,95 @@ def update_task_order(request):
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
-            task_order = data.get('task_order', [])
             
-            # Update the order of each task
-            for index, task_id in enumerate(task_order):
-                task = Tasks.objects.get(id=task_id, user=request.user)
-                task.order_field = index + 1  # Start from 1 instead of 0
-                task.save()
-                
+            # Only the tasks that actually moved get a new rank
+            apply_reorder(request.user, {'task_order': data.get('task_order', [])})
+
             return JsonResponse({'success': True})
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)})
 
     return JsonResponse({'success': False, 'error': 'Invalid request'})
 
-def reorder_tasks(user):
-    """Reorder tasks sequentially after deletion"""
-    tasks = Tasks.objects.filter(user=user, completed=False).order_by('order_field')
-    for index, task in enumerate(tasks, start=1):
-        task.order_field = index
-        task.save()
-
-def reorder_pending_tasks(user):
-    """Reorder only pending tasks sequentially"""
-    tasks = Tasks.objects.filter(user=user, completed=False).order_by('order_field')
-    for index, task in enumerate(tasks, start=1):
-        task.order_field = index
-        task.save()
+@login_required
+def reorder_tasks(request):
+    """Reorder pending tasks from a full order or a list of moves.
+
+    Accepts either ``{"task_order": [id, ...]}`` or
+    ``{"moves": [{"id": X, "after": Y}, ...]}`` where ``after`` is the task
+    X should sit right after (``null`` for the top). Ownership is checked
+    with one query and all new ranks are written with one bulk UPDATE.
+    """
+    if request.method == 'POST':
+        try:
+            updated = apply_reorder(request.user, json.loads(request.body))
+            return JsonResponse({'success': True, 'updated': updated})
+        except Exception as e:
+            return JsonResponse({'success': False, 'error': str(e)})
+
+    return JsonResponse({'success': False, 'error': 'Invalid request'})
+
+@write_transaction
+def apply_reorder(user, data):
+    """Apply a task_order or moves payload atomically; returns rows written"""
+    if 'moves' in data:
+        moves = [(int(move['id']), None if move.get('after') is None else int(move['after']))
+                 for move in data['moves']]
+        return Tasks.apply_moves(user, moves)
+    task_order = [int(task_id) for task_id in data.get('task_order', [])]
+    return Tasks.apply_order(user, task_order)
+
+def serve_media(request, path, document_root=None):
+    """Development media server; content-hashed photos are cached forever"""
+    response = serve(request, path, document_root=document_root)
+    if is_hashed_photo(path):
+        patch_cache_control(response, public=True, max_age=60 * 60 * 24 * 365, immutable=True)
+    return response
+
+def avatar(request, color, initials):
+    """Generated default avatar; the URL determines the image, so cache it forever"""
+    try:
+        svg = render_avatar(color, initials)
+    except ValueError:
+        raise Http404('Unknown avatar')
+    response = HttpResponse(svg, content_type='image/svg+xml')
+    patch_cache_control(response, public=True, max_age=60 * 60 * 24 * 365, immutable=True)
+    return response
+
+@user_passes_test(lambda user: user.is_staff)
+def cache_stats(request):
+    """Page cache hit/miss counters of this worker process"""
+    hits, misses = page_cache_stats['hits'], page_cache_stats['misses']
+    return JsonResponse({
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / (hits + misses) if hits + misses else None,
+    })
+
+@user_passes_test(lambda user: user.is_staff)
+def metrics(request):
+    """Request metrics of this worker process for Prometheus"""
+    return HttpResponse(metrics_text(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@login_required
+def search(request):
+    """The user's tasks and events matching ``q``, best match first.
+
+    ``prefix=1`` also matches words starting with the last word typed;
+    ``page`` selects further pages.
+    """
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    results, has_more = search_index(request.user, request.GET.get('q', ''),
+                                     prefix=request.GET.get('prefix') == '1', page=page)
+    return JsonResponse({'success': True, 'results': results, 'page': page, 'has_more': has_more})
+
+@login_required
+def live_events(request):
+    """Live updates need the ASGI server; 204 tells the page to poll instead"""
+    return HttpResponse(status=204)
 
 def signup(request):
     if request.method == 'POST':
@@ -42,11 +42,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timing covers all other middleware (mainapp/metrics.py)
+    'mainapp.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'mainapp.assets.StaticAssetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'mainapp.sharding.ShardMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -55,7 +59,8 @@ ROOT_URLCONF = 'todo.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates with render time counted per request
+        'BACKEND': 'mainapp.metrics.TimedDjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -70,6 +75,22 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'todo.wsgi.application'
 
+# Request metrics (mainapp/metrics.py, scraped at /metrics/ by staff): send
+# the Server-Timing breakdown with every response, and log queries slower
+# than this many milliseconds (None turns the log off).
+METRICS_SERVER_TIMING = True
+METRICS_SLOW_QUERY_MS = None
+
+# Route the calendar and task-order JSON endpoints to their async variants
+# (mainapp/async_views.py). Turn on when serving through todo.asgi.
+ASYNC_JSON_VIEWS = os.environ.get('TODO_ASYNC_VIEWS') == '1'
+
+# Live updates (mainapp/live.py, served at /live/ when ASYNC_JSON_VIEWS is
+# on): messages buffered per open page before it is dropped as too slow,
+# and seconds between keep-alive comments on an idle stream.
+LIVE_QUEUE_SIZE = 100
+LIVE_HEARTBEAT_SECONDS = 15
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -81,6 +102,73 @@ DATABASES = {
     }
 }
 
+# User data can be split over several databases (mainapp/sharding.py).
+# TODO_SHARDS=N adds N-1 SQLite files next to db.sqlite3; 'default' is the
+# first shard and keeps the central tables. Migrate every alias
+# (manage.py migrate --database shard1 ...) and then run rebalance_shards
+# to move existing users to their home shard.
+DATABASE_SHARDS = ['default']
+for number in range(1, int(os.environ.get('TODO_SHARDS', '1'))):
+    DATABASES[f'shard{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / f'db-shard{number}.sqlite3',
+    }
+    DATABASE_SHARDS.append(f'shard{number}')
+DATABASE_ROUTERS = ['mainapp.sharding.UserShardRouter']
+
+# TODO_DB_PROFILE=production tunes SQLite for concurrent use. Pragmas are
+# applied when a connection opens (mainapp/db.py). WAL lets readers run
+# alongside the writer. Connections are kept for CONN_MAX_AGE seconds.
+# IMMEDIATE transactions take the write lock at BEGIN, so a competing
+# writer waits out busy_timeout; a deferred read-then-write transaction
+# would fail with "database is locked" instead.
+DB_PROFILE = os.environ.get('TODO_DB_PROFILE', 'development')
+SQLITE_PRAGMAS = {}
+if DB_PROFILE == 'production':
+    for database in DATABASES.values():
+        database.update({
+            'CONN_MAX_AGE': 600,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
+        })
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',  # Safe with WAL; fsync at checkpoints only
+        'cache_size': -32000,  # In KiB: 32 MB page cache per connection
+        'mmap_size': 256 * 1024 * 1024,
+        'busy_timeout': 5000,  # Milliseconds to wait for the write lock
+        'temp_store': 'MEMORY',
+    }
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Rendered pages are cached per user (mainapp/page_cache.py) and checked
+# against the user's change feed in the database, so a local memory cache
+# per worker process never serves a page another worker's write made stale.
+# Local memory evicts least recently used entries past MAX_ENTRIES; set
+# TODO_CACHE_BACKEND=file to share the rendered pages between processes.
+
+if os.environ.get('TODO_CACHE_BACKEND') == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(BASE_DIR, 'cache'),
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'todo-pages',
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+
+PAGE_CACHE_ALIAS = 'default'
+PAGE_CACHE_TIMEOUT = 60 * 60
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -117,6 +205,17 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
 STATIC_URL = '/static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# collectstatic fingerprints and precompresses everything for production;
+# StaticAssetMiddleware serves the result (mainapp/assets.py)
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {
+        'BACKEND': ('django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+                    else 'mainapp.assets.CompressedManifestStaticFilesStorage'),
+    },
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -130,5 +229,8 @@ LOGOUT_REDIRECT_URL = 'login'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
-# Install Pillow for image handling
-# pip install Pillow
\ No newline at end of file
+# Uploaded profile photos are processed with Pillow (mainapp/photos.py)
+# pip install Pillow
+
+# Static files get Brotli copies next to the gzip ones when it is installed
+# pip install brotli
\ No newline at end of file